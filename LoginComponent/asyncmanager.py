@@ -0,0 +1,269 @@
+"""
+asyncio versions of UserManager and UserGroupManager for use on an event
+loop such as Home Assistant's. Reading and writing the yaml configuration
+files and hashing passwords happen in an executor, and lookups are answered
+from memory without awaiting anything.
+"""
+
+import asyncio
+import functools
+
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+
+# Seconds to wait before saving passwords that were hashed again, so the
+# hashes of logins in that time are saved in one write.
+REHASH_FLUSH_DELAY = 1.0
+
+
+class _AsyncManager:
+    """
+    Runs the work of a manager in an executor. Mutations are run one at a
+    time; lookups are answered directly from the loaded manager.
+    """
+
+    def __init__(self, manager, executor=None):
+        """
+        :param manager: The manager to wrap.
+        :param executor: Optional. The executor to run blocking work in.
+        Defaults to the default executor of the event loop.
+        """
+        self.manager = manager
+        self.executor = executor
+        self.lock = asyncio.Lock()
+
+    def is_loaded(self):
+        """
+        Checks whether the manager has read its yaml configuration file.
+        :return: Returns true if it is loaded and false if not.
+        """
+        return self.manager.is_loaded()
+
+    def _check_loaded(self):
+        if not self.manager.is_loaded():
+            raise RuntimeError(type(self).__name__ + " is not loaded, "
+                               "await load() first!")
+
+    async def _run(self, function, *args):
+        """
+        Runs function in the executor.
+        :return: The return value of function.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(function, *args))
+
+    async def reload(self):
+        """
+        Reads the yaml configuration file again in the executor and applies
+        the differences to the loaded data, once no mutation is running.
+        :return: A set of the names that were added, changed or removed.
+        """
+        async with self.lock:
+            return await self._run(self.manager.reload)
+
+    async def _mutate(self, function, *args):
+        """
+        Runs a mutation of the manager in the executor once no other
+        mutation is running.
+        :return: The return value of the mutation.
+        """
+        self._check_loaded()
+        async with self.lock:
+            return await self._run(function, *args)
+
+
+class AsyncUserManager(_AsyncManager):
+    """Creates, updates, reads and deletes users without blocking the loop."""
+
+    def __init__(self, usermanager=None, executor=None):
+        """
+        :param usermanager: Optional. The UserManager to wrap.
+        :param executor: Optional. The executor to run blocking work in.
+        """
+        super().__init__(UserManager() if usermanager is None
+                         else usermanager, executor)
+        self._flush = None
+
+    async def load(self):
+        """
+        Reads users.yaml in the executor if it was not read yet.
+        """
+        if not self.manager.is_loaded():
+            async with self.lock:
+                await self._run(lambda: self.manager.users)
+
+    @property
+    def users(self):
+        """
+        The list of users.
+        """
+        self._check_loaded()
+        return self.manager.users
+
+    def get_users(self):
+        return self.users
+
+    def get_user(self, username):
+        self._check_loaded()
+        return self.manager.get_user(username)
+
+    def has_user(self, username):
+        self._check_loaded()
+        return self.manager.has_user(username)
+
+    def search_users(self, pattern=None, offset=0, limit=None):
+        self._check_loaded()
+        return self.manager.search_users(pattern, offset, limit)
+
+    async def verify_password(self, username, password):
+        """
+        Checks the password of a user in the executor, since hashing is slow
+        on purpose. Passwords that were hashed again are saved together
+        REHASH_FLUSH_DELAY seconds after the first of them.
+        :return: Returns true if the password is correct and false if not.
+        """
+        self._check_loaded()
+        result = await self._run(self.manager.verify_password, username,
+                                 password)
+        if self._flush is None and self.manager.has_rehashes():
+            self._flush = asyncio.get_running_loop().call_later(
+                REHASH_FLUSH_DELAY, self._start_flush)
+        return result
+
+    def _start_flush(self):
+        self._flush = asyncio.ensure_future(self.flush_rehashes())
+
+    async def flush_rehashes(self):
+        """
+        Saves the passwords that were hashed again once no other mutation
+        is running.
+        :return: Returns true if anything was saved and false if not.
+        """
+        try:
+            return await self._mutate(self.manager.flush_rehashes)
+        finally:
+            self._flush = None
+
+    async def create_user(self, username, password):
+        return await self._mutate(self.manager.create_user, username,
+                                  password)
+
+    async def create_users(self, users, workers=None):
+        return await self._mutate(self.manager.create_users, list(users),
+                                  workers)
+
+    async def delete_user(self, username, groupmanager=None):
+        """
+        Deletes a user.
+        :param groupmanager: Optional. The AsyncUserGroupManager whose
+        usergroups the user should be removed from as well.
+        """
+        if groupmanager is None:
+            return await self._mutate(self.manager.delete_user, username)
+        groupmanager._check_loaded()
+        async with groupmanager.lock:
+            return await self._mutate(self.manager.delete_user, username,
+                                      groupmanager.manager)
+
+    async def update_user_username(self, old_username, new_username):
+        return await self._mutate(self.manager.update_user_username,
+                                  old_username, new_username)
+
+    async def update_user_password(self, username, password):
+        return await self._mutate(self.manager.update_user_password,
+                                  username, password)
+
+    async def update_passwords(self, passwords, workers=None):
+        return await self._mutate(self.manager.update_passwords,
+                                  dict(passwords), workers)
+
+
+class AsyncUserGroupManager(_AsyncManager):
+    """
+    Creates, updates, reads and deletes usergroups without blocking the
+    loop.
+    """
+
+    def __init__(self, groupmanager=None, executor=None):
+        """
+        :param groupmanager: Optional. The UserGroupManager to wrap.
+        :param executor: Optional. The executor to run blocking work in.
+        """
+        super().__init__(UserGroupManager() if groupmanager is None
+                         else groupmanager, executor)
+
+    async def load(self):
+        """
+        Reads groups.yaml in the executor if it was not read yet.
+        """
+        if not self.manager.is_loaded():
+            async with self.lock:
+                await self._run(lambda: self.manager.user_groups)
+
+    @property
+    def user_groups(self):
+        """
+        The list of usergroups.
+        """
+        self._check_loaded()
+        return self.manager.user_groups
+
+    def get_usergroups(self):
+        return self.user_groups
+
+    def get_usergroup(self, name):
+        self._check_loaded()
+        return self.manager.get_usergroup(name)
+
+    def has_usergroup(self, name):
+        self._check_loaded()
+        return self.manager.has_usergroup(name)
+
+    def search_usergroups(self, pattern=None, offset=0, limit=None):
+        self._check_loaded()
+        return self.manager.search_usergroups(pattern, offset, limit)
+
+    def get_usergroups_for_user(self, username):
+        self._check_loaded()
+        return self.manager.get_usergroups_for_user(username)
+
+    async def create_group(self, group_name):
+        return await self._mutate(self.manager.create_group, group_name)
+
+    async def delete_usergroup(self, groupname):
+        return await self._mutate(self.manager.delete_usergroup, groupname)
+
+    async def add_user_to_usergroup(self, username, user_group, usermanager):
+        """
+        Adds a user to a usergroup.
+        :param usermanager: The AsyncUserManager the user is looked up in.
+        """
+        return await self._mutate(self.manager.add_user_to_usergroup,
+                                  username, user_group, usermanager.manager)
+
+    async def add_group_to_usergroup(self, groupname, user_group):
+        return await self._mutate(self.manager.add_group_to_usergroup,
+                                  groupname, user_group)
+
+    async def remove_user_from_usergroup(self, username, user_group):
+        return await self._mutate(self.manager.remove_user_from_usergroup,
+                                  username, user_group)
+
+    async def remove_group_from_usergroup(self, groupname, user_group):
+        return await self._mutate(self.manager.remove_group_from_usergroup,
+                                  groupname, user_group)
+
+    async def update_user_in_usergroup(self, old_username, new_username,
+                                       usermanager):
+        """
+        Replaces a username in every usergroup the user is a member of.
+        :param usermanager: The AsyncUserManager the new username is looked
+        up in.
+        """
+        return await self._mutate(self.manager.update_user_in_usergroup,
+                                  old_username, new_username,
+                                  usermanager.manager)
+
+    async def update_usergroup_name(self, old_name, new_name):
+        return await self._mutate(self.manager.update_usergroup_name,
+                                  old_name, new_name)
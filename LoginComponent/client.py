@@ -0,0 +1,229 @@
+"""
+Client for the user management server. RemoteUserManager and
+RemoteUserGroupManager offer the methods of UserManager and
+UserGroupManager that the cli uses, and answer them by asking a running
+server instead of reading the yaml configuration files.
+"""
+
+import json
+import socket
+from contextlib import contextmanager
+
+from LoginComponent.user import User
+from LoginComponent.usergroup import UserGroup
+
+DEFAULT_SOCKET = "user-management.sock"
+
+
+class ServerError(Exception):
+    """Raised when the server rejects a request or cannot be reached."""
+
+
+class Client:
+    """
+    Sends requests to a server over its Unix socket. Every request is one
+    line of JSON with the operation in "op", and every response is one line
+    of JSON with either a "result" or an "error".
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=None):
+        """
+        :param path: Optional. The path of the Unix socket of the server.
+        :param timeout: Optional. The number of seconds to wait for the
+        server.
+        """
+        self.path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(path)
+        except OSError as error:
+            self._socket.close()
+            raise ServerError("Could not connect to " + path + ": " +
+                              str(error))
+        self._file = self._socket.makefile("rb")
+
+    def request(self, op, **params):
+        """
+        Sends one request and waits for its response.
+        :param op: The name of the operation.
+        :param params: The parameters of the operation.
+        :return: The result of the operation.
+        :raises ServerError: If the server answered with an error.
+        """
+        params["op"] = op
+        try:
+            self._socket.sendall(json.dumps(params).encode("utf-8") + b"\n")
+            line = self._file.readline()
+        except OSError as error:
+            raise ServerError(str(error))
+        if not line:
+            raise ServerError("The server closed the connection!")
+        response = json.loads(line.decode("utf-8"))
+        if "error" in response:
+            raise ServerError(response["error"])
+        return response["result"]
+
+    def close(self):
+        """
+        Closes the connection to the server.
+        """
+        self._file.close()
+        self._socket.close()
+
+
+def _to_user(data):
+    return None if data is None else User(data["username"], data["password"])
+
+
+def _to_usergroup(data):
+    if data is None:
+        return None
+    return UserGroup(data["name"], data["users"], data["groups"])
+
+
+class RemoteUserManager:
+    """Creates, updates, reads and deletes users through a server."""
+
+    def __init__(self, client):
+        """
+        :param client: The Client connected to the server.
+        """
+        self.client = client
+
+    @property
+    def users(self):
+        """
+        The list of users, fetched from the server.
+        """
+        return [_to_user(data) for data in self.client.request("users")]
+
+    def get_users(self):
+        return self.users
+
+    def get_user(self, username):
+        return _to_user(self.client.request("get_user", username=username))
+
+    def has_user(self, username):
+        return self.get_user(username) is not None
+
+    def search_users(self, pattern=None, offset=0, limit=None):
+        return [_to_user(data) for data in self.client.request(
+            "search_users", pattern=pattern, offset=offset, limit=limit)]
+
+    def verify(self, username, password):
+        """
+        Checks the password of a user on the server.
+        :return: Returns true if the password is correct and false if not.
+        """
+        return self.client.request("verify", username=username,
+                                   password=password)
+
+    def verify_password(self, username, password):
+        return self.verify(username, password)
+
+    def create_user(self, username, password):
+        return self.client.request("create_user", username=username,
+                                   password=password)
+
+    def delete_user(self, username, groupmanager=None):
+        """
+        Deletes a user. The server always removes the user from its
+        usergroups as well.
+        """
+        return self.client.request("delete_user", username=username)
+
+    def update_user_username(self, old_username, new_username):
+        return self.client.request("update_user_username",
+                                   old_username=old_username,
+                                   new_username=new_username)
+
+    def update_user_password(self, username, password):
+        return self.client.request("update_user_password",
+                                   username=username, password=password)
+
+    @contextmanager
+    def batch(self):
+        """
+        The server saves every change on its own, so a batch does nothing.
+        """
+        yield self
+
+
+class RemoteUserGroupManager:
+    """Creates, updates, reads and deletes usergroups through a server."""
+
+    def __init__(self, client):
+        """
+        :param client: The Client connected to the server.
+        """
+        self.client = client
+
+    @property
+    def user_groups(self):
+        """
+        The list of usergroups, fetched from the server.
+        """
+        return [_to_usergroup(data) for data in
+                self.client.request("usergroups")]
+
+    def get_usergroups(self):
+        return self.user_groups
+
+    def get_usergroup(self, name):
+        return _to_usergroup(self.client.request("get_usergroup", name=name))
+
+    def has_usergroup(self, name):
+        return self.get_usergroup(name) is not None
+
+    def search_usergroups(self, pattern=None, offset=0, limit=None):
+        return [_to_usergroup(data) for data in self.client.request(
+            "search_usergroups", pattern=pattern, offset=offset,
+            limit=limit)]
+
+    def get_usergroups_for_user(self, username):
+        return [_to_usergroup(data) for data in
+                self.client.request("groups_for", username=username)]
+
+    def create_group(self, group_name):
+        return self.client.request("create_group", name=group_name)
+
+    def delete_usergroup(self, groupname):
+        return self.client.request("delete_usergroup", name=groupname)
+
+    def add_user_to_usergroup(self, username, user_group, usermanager):
+        return self.client.request("add_user_to_usergroup",
+                                   username=username,
+                                   name=user_group.get_name())
+
+    def add_group_to_usergroup(self, groupname, user_group):
+        return self.client.request("add_group_to_usergroup",
+                                   groupname=groupname,
+                                   name=user_group.get_name())
+
+    def remove_user_from_usergroup(self, username, user_group):
+        return self.client.request("remove_user_from_usergroup",
+                                   username=username,
+                                   name=user_group.get_name())
+
+    def remove_group_from_usergroup(self, groupname, user_group):
+        return self.client.request("remove_group_from_usergroup",
+                                   groupname=groupname,
+                                   name=user_group.get_name())
+
+    def update_user_in_usergroup(self, old_username, new_username,
+                                 usermanager):
+        return self.client.request("update_user_in_usergroup",
+                                   old_username=old_username,
+                                   new_username=new_username)
+
+    def update_usergroup_name(self, old_name, new_name):
+        return self.client.request("update_usergroup_name", name=old_name,
+                                   new_name=new_name)
+
+    @contextmanager
+    def batch(self):
+        """
+        The server saves every change on its own, so a batch does nothing.
+        """
+        yield self
@@ -0,0 +1,155 @@
+"""
+Name index files for shell completion. The managers keep a small JSON file
+beside their storage with the sorted usernames, usergroup names and Home
+Assistant group names, so completing a name only has to read that file
+instead of loading and parsing the yaml configuration files. A change
+of the names only marks the file stale, and the next read of the storage
+writes it again. This module only uses the standard library to keep
+completion fast.
+"""
+
+import bisect
+import json
+import logging
+import os
+import tempfile
+
+_LOGGER = logging.getLogger(__name__)
+NAMES_SUFFIX = ".names"
+USERS = "users"
+USERGROUPS = "usergroups"
+GROUPS = "groups"
+
+
+def names_path(location):
+    """
+    Returns the path of the name index file of a storage.
+    :param location: The yaml file, shard directory or database specific
+    name the storage is kept at.
+    """
+    return location + NAMES_SUFFIX
+
+
+def is_stale(path, sources):
+    """
+    Checks whether a name index file is missing or older than one of the
+    files it was made from. Nothing is stale while none of those files
+    exist.
+    :param path: The path of the name index file.
+    :param sources: The paths of the files the names are read from.
+    :return: Returns true if the file should be written again.
+    """
+    modified = []
+    for source in sources:
+        try:
+            modified.append(os.stat(source).st_mtime_ns)
+        except OSError:
+            pass
+    if not modified:
+        return False
+    try:
+        return os.stat(path).st_mtime_ns < max(modified)
+    except OSError:
+        return True
+
+
+def write_names(path, names):
+    """
+    Replaces a name index file. Every writer uses its own temporary file,
+    so a reader never sees a file that is written halfway. Failing to write
+    the file is not an error, completion just offers fewer names.
+    :param path: The path of the name index file.
+    :param names: A dict from USERS, USERGROUPS or GROUPS to the names.
+    """
+    data = {key: sorted(str(value) for value in values)
+            for key, values in names.items()}
+    directory, name = os.path.split(os.path.abspath(path))
+    try:
+        fd, temporary_path = tempfile.mkstemp(prefix=name + ".",
+                                              suffix=".tmp", dir=directory)
+    except OSError as error:
+        _LOGGER.warning("Could not write %s: %s", path, error)
+        return
+    try:
+        with os.fdopen(fd, 'w') as outfile:
+            json.dump(data, outfile, separators=(",", ":"))
+        os.replace(temporary_path, path)
+    except (OSError, ValueError) as error:
+        _LOGGER.warning("Could not write %s: %s", path, error)
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def touch(path):
+    """
+    Marks a name index file as up to date without writing it, if it exists
+    and was not marked stale.
+    :param path: The path of the name index file.
+    """
+    if is_marked_stale(path):
+        return
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def mark_stale(path):
+    """
+    Marks a name index file as older than the files it is made from, so the
+    next reader writes it again. The file is created empty if it does not
+    exist yet.
+    :param path: The path of the name index file.
+    """
+    try:
+        with open(path, 'a'):
+            pass
+        os.utime(path, ns=(0, 0))
+    except OSError as error:
+        _LOGGER.warning("Could not mark %s as stale: %s", path, error)
+
+
+def is_marked_stale(path):
+    """
+    Checks whether a name index file was marked stale by mark_stale, which
+    is cheaper than is_stale since the files the names are read from are
+    not needed.
+    :param path: The path of the name index file.
+    :return: Returns true if it was marked stale and not written since.
+    """
+    try:
+        return os.stat(path).st_mtime_ns == 0
+    except OSError:
+        return False
+
+
+def read_names(path, key):
+    """
+    Reads one kind of names from a name index file.
+    :param path: The path of the name index file.
+    :param key: USERS, USERGROUPS or GROUPS.
+    :return: The sorted names, or an empty list if the file does not exist
+    or can not be read.
+    """
+    try:
+        with open(path, 'r') as infile:
+            names = json.load(infile).get(key, [])
+    except (OSError, ValueError, AttributeError):
+        return []
+    return names if isinstance(names, list) else []
+
+
+def complete(path, key, incomplete):
+    """
+    Returns the names of one kind starting with what was typed so far.
+    :param path: The path of the name index file.
+    :param key: USERS, USERGROUPS or GROUPS.
+    :param incomplete: The part of the name typed so far.
+    :return: A sorted list of names.
+    """
+    names = read_names(path, key)
+    start = bisect.bisect_left(names, incomplete)
+    end = start
+    while end < len(names) and names[end].startswith(incomplete):
+        end += 1
+    return names[start:end]
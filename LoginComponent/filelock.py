@@ -0,0 +1,119 @@
+import logging
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_LOGGER = logging.getLogger(__name__)
+LOCK_SUFFIX = ".lock"
+GENERATION_SIZE = 32
+
+
+class FileLock:
+    """
+    Reader/writer lock shared between processes, kept in a lock file beside
+    a yaml file. Any number of processes can hold the shared lock at once,
+    while the exclusive lock is held by one process at a time. The lock
+    file also stores a generation counter that writers increase, so a
+    process can tell whether the yaml file was written by someone else
+    since it last read it. Where fcntl is not available the locks do
+    nothing, but the generation counter is still kept. The shared lock
+    opens the lock file read-only and does not create it, so reading works
+    in a read-only directory. While the lock file does not exist nothing
+    was written through it yet, and the generation is 0.
+    """
+
+    def __init__(self, yaml_file):
+        self.path = yaml_file + LOCK_SUFFIX
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+
+    @contextmanager
+    def shared(self):
+        """
+        Holds the shared lock for the with block. Inside an exclusive lock
+        the exclusive lock is kept.
+        """
+        self._acquire(False)
+        try:
+            yield self
+        finally:
+            self._release()
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Holds the exclusive lock for the with block.
+        :raises RuntimeError: If only the shared lock is held, since two
+        processes upgrading at once would wait for each other forever.
+        """
+        if self._depth and not self._exclusive:
+            raise RuntimeError("A shared lock can not be upgraded to an "
+                               "exclusive lock!")
+        self._acquire(True)
+        try:
+            yield self
+        finally:
+            self._release()
+
+    def _acquire(self, exclusive):
+        if self._depth == 0:
+            if exclusive:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            else:
+                try:
+                    self._fd = os.open(self.path, os.O_RDONLY)
+                except FileNotFoundError:
+                    self._fd = None
+            if fcntl is not None and self._fd is not None:
+                try:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive
+                                else fcntl.LOCK_SH)
+                except BaseException:
+                    os.close(self._fd)
+                    self._fd = None
+                    raise
+            self._exclusive = exclusive
+        self._depth += 1
+
+    def _release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            self._exclusive = False
+            if fd is not None:
+                os.close(fd)
+
+    def generation(self):
+        """
+        Returns the generation counter. The lock must be held.
+        :return: The number of writes recorded in the lock file.
+        """
+        if self._depth == 0:
+            raise RuntimeError("The lock is not held!")
+        if self._fd is None:
+            return 0
+        data = os.pread(self._fd, GENERATION_SIZE, 0).strip()
+        try:
+            return int(data) if data else 0
+        except ValueError:
+            _LOGGER.warning("Ignoring the damaged generation in %s",
+                            self.path)
+            return 0
+
+    def increment(self):
+        """
+        Increases the generation counter. The exclusive lock must be held.
+        :return: The new generation.
+        """
+        if not self._exclusive:
+            raise RuntimeError("The exclusive lock is not held!")
+        generation = self.generation() + 1
+        data = str(generation).encode("ascii")
+        os.pwrite(self._fd, data, 0)
+        os.ftruncate(self._fd, len(data))
+        return generation
@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+
+_LOGGER = logging.getLogger(__name__)
+JOURNAL_SUFFIX = ".journal"
+DEFAULT_MAX_RECORDS = 1000
+DEFAULT_MAX_BYTES = 1024 * 1024
+
+
+class Journal:
+    """
+    Append-only log of mutation records stored beside a yaml file. Each
+    record is a dict written as a single line of JSON.
+    """
+
+    def __init__(self, yaml_file, max_records=DEFAULT_MAX_RECORDS,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.path = yaml_file + JOURNAL_SUFFIX
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.record_count = 0
+        self.size = 0
+
+    def read(self):
+        """
+        Reads all records from the journal file. A trailing line that was
+        only partially written is ignored.
+        :return: Returns the list of records in the order they were
+        appended, or an empty list if there is no journal.
+        """
+        records = []
+        self.record_count = 0
+        self.size = 0
+        if not os.path.isfile(self.path):
+            return records
+
+        with open(self.path, 'rb') as infile:
+            data = infile.read()
+        self.size = len(data)
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line.decode("utf-8")))
+            except ValueError:
+                _LOGGER.warning("Ignoring a damaged record in %s", self.path)
+        self.record_count = len(records)
+        return records
+
+    def append(self, records):
+        """
+        Appends the given records to the journal file with a single write.
+        :param records: A list of records to append.
+        """
+        if not records:
+            return
+
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n"
+                       for record in records).encode("utf-8")
+        with open(self.path, 'ab') as outfile:
+            outfile.write(data)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        self.record_count += len(records)
+        self.size += len(data)
+
+    def needs_compaction(self):
+        """
+        Checks whether the journal has grown past its record or size limit.
+        :return: Returns true if the journal should be folded back into the
+        yaml file and false if it should not.
+        """
+        return self.record_count >= self.max_records or \
+            self.size >= self.max_bytes
+
+    def clear(self):
+        """
+        Removes the journal file. Call this after the yaml file has been
+        rewritten with all records applied.
+        """
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+        self.record_count = 0
+        self.size = 0
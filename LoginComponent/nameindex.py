@@ -0,0 +1,110 @@
+import bisect
+from fnmatch import fnmatchcase
+
+GLOB_CHARACTERS = "*?["
+MAX_CHARACTER = chr(0x10FFFF)
+
+
+def is_glob(pattern):
+    """
+    Checks whether a search pattern is a glob pattern rather than a prefix.
+    :param pattern: The search pattern.
+    :return: Returns true if the pattern contains *, ? or [.
+    """
+    return any(character in pattern for character in GLOB_CHARACTERS)
+
+
+def _literal_prefix(pattern):
+    """
+    Returns the part of a glob pattern before its first wildcard.
+    """
+    for position, character in enumerate(pattern):
+        if character in GLOB_CHARACTERS:
+            return pattern[:position]
+    return pattern
+
+
+def _prefix_end(prefix):
+    """
+    Returns the smallest string that sorts after every string starting with
+    prefix, or None if there is no such string.
+    """
+    while prefix and prefix[-1] == MAX_CHARACTER:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class NameIndex:
+    """
+    Sorted list of usernames or usergroup names. The names starting with a
+    prefix are found with bisect, and a glob pattern is only matched against
+    the names starting with the part of the pattern before its first
+    wildcard.
+    """
+
+    def __init__(self, names=()):
+        self._names = sorted(names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def add(self, name):
+        """
+        Adds a name, keeping the names sorted.
+        :param name: The name to add.
+        """
+        bisect.insort(self._names, name)
+
+    def remove(self, name):
+        """
+        Removes a name if it is in the index.
+        :param name: The name to remove.
+        """
+        position = bisect.bisect_left(self._names, name)
+        if position < len(self._names) and self._names[position] == name:
+            del self._names[position]
+
+    def _prefix_range(self, prefix):
+        """
+        Returns the start and end position of the names starting with prefix.
+        """
+        start = bisect.bisect_left(self._names, prefix)
+        end = _prefix_end(prefix)
+        if end is None:
+            return start, len(self._names)
+        return start, bisect.bisect_left(self._names, end, start)
+
+    def search(self, pattern=None, offset=0, limit=None):
+        """
+        Returns the sorted names starting with pattern, or matching it if it
+        is a glob pattern.
+        :param pattern: Optional. A prefix or glob pattern. All names match
+        when it is not given.
+        :param offset: Optional. The number of matching names to skip.
+        :param limit: Optional. The maximum number of names to return.
+        :return: A list of names.
+        :raises ValueError: If offset or limit is negative.
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("The offset and limit can not be negative!")
+        start, end = self._prefix_range(_literal_prefix(pattern or ""))
+        if pattern and is_glob(pattern):
+            wanted = None if limit is None else offset + limit
+            matches = []
+            for position in range(start, end):
+                if len(matches) == wanted:
+                    break
+                if fnmatchcase(self._names[position], pattern):
+                    matches.append(self._names[position])
+            start, end = 0, len(matches)
+        else:
+            matches = self._names
+        start = min(start + offset, end)
+        if limit is not None:
+            end = min(start + limit, end)
+        return matches[start:end]
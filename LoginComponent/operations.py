@@ -0,0 +1,250 @@
+"""
+Non-interactive versions of the cli commands, used to run scripts of
+operations against one UserManager and UserGroupManager.
+"""
+
+import json
+import shlex
+
+OPTIONS = {
+    "-u": "username", "--username": "username",
+    "-p": "password", "--password": "password",
+    "-ug": "user_group", "--user-group": "user_group",
+    "-g": "groupname", "--groupname": "groupname",
+    "-n": "new_name", "--new-name": "new_name",
+    "--new-username": "new_username",
+}
+
+
+class OperationError(Exception):
+    """Raised when an operation is invalid or could not be performed."""
+
+
+class _DryRun(Exception):
+    """Raised to roll back the managers after a dry run."""
+
+
+def _get_usergroup(groupmanager, name):
+    usergroup = groupmanager.get_usergroup(name)
+    if usergroup is None:
+        raise OperationError("There is no usergroup with the name " +
+                             str(name) + "!")
+    return usergroup
+
+
+def _require_user(usermanager, username):
+    if not usermanager.has_user(username):
+        raise OperationError("The user " + str(username) +
+                             " does not exist!")
+
+
+def create_user(usermanager, groupmanager, username, password):
+    if not usermanager.create_user(username, password):
+        raise OperationError("Could not create the user " + str(username) +
+                             ", the username is taken or invalid!")
+    return "Created the user " + username + "."
+
+
+def update_user(usermanager, groupmanager, username, new_username=None,
+                password=None):
+    if new_username is None and password is None:
+        raise OperationError("Give a new username, a new password or both!")
+    _require_user(usermanager, username)
+    if new_username is not None:
+        if not usermanager.update_user_username(username, new_username):
+            raise OperationError("Could not rename " + username + " to " +
+                                 str(new_username) + "!")
+        groupmanager.update_user_in_usergroup(username, new_username,
+                                              usermanager)
+        username = new_username
+    if password is not None:
+        usermanager.update_user_password(username, password)
+    return "Updated the user " + username + "."
+
+
+def delete_user(usermanager, groupmanager, username):
+    if not usermanager.delete_user(username, groupmanager):
+        raise OperationError("The user " + str(username) +
+                             " does not exist!")
+    return "Deleted the user " + username + "."
+
+
+def create_usergroup(usermanager, groupmanager, user_group):
+    if not groupmanager.create_group(user_group):
+        raise OperationError("Could not create the usergroup " +
+                             str(user_group) +
+                             ", the name is taken or invalid!")
+    return "Created the usergroup " + user_group + "."
+
+
+def update_usergroup_name(usermanager, groupmanager, user_group, new_name):
+    _get_usergroup(groupmanager, user_group)
+    if not groupmanager.update_usergroup_name(user_group, new_name):
+        raise OperationError("Could not rename " + user_group + " to " +
+                             str(new_name) + "!")
+    return "Renamed the usergroup " + user_group + " to " + new_name + "."
+
+
+def delete_usergroup(usermanager, groupmanager, user_group):
+    if not groupmanager.delete_usergroup(user_group):
+        raise OperationError("There is no usergroup with the name " +
+                             str(user_group) + "!")
+    return "Deleted the usergroup " + user_group + "."
+
+
+def add_user_to_usergroup(usermanager, groupmanager, username, user_group):
+    _require_user(usermanager, username)
+    usergroup = _get_usergroup(groupmanager, user_group)
+    if not groupmanager.add_user_to_usergroup(username, usergroup,
+                                              usermanager):
+        raise OperationError("The user " + username + " is already in the "
+                             "usergroup " + user_group + "!")
+    return "Added the user " + username + " to " + user_group + "."
+
+
+def remove_user_from_usergroup(usermanager, groupmanager, username,
+                               user_group):
+    usergroup = _get_usergroup(groupmanager, user_group)
+    if not groupmanager.remove_user_from_usergroup(username, usergroup):
+        raise OperationError("The user " + str(username) + " is not in the "
+                             "usergroup " + user_group + "!")
+    return "Removed the user " + username + " from " + user_group + "."
+
+
+def add_group_to_usergroup(usermanager, groupmanager, groupname, user_group):
+    usergroup = _get_usergroup(groupmanager, user_group)
+    if not groupmanager.add_group_to_usergroup(groupname, usergroup):
+        raise OperationError("The group " + str(groupname) + " is already "
+                             "in the usergroup " + user_group + "!")
+    return "Added the group " + groupname + " to " + user_group + "."
+
+
+def remove_group_from_usergroup(usermanager, groupmanager, groupname,
+                                user_group):
+    usergroup = _get_usergroup(groupmanager, user_group)
+    if not groupmanager.remove_group_from_usergroup(groupname, usergroup):
+        raise OperationError("The group " + str(groupname) + " is not in "
+                             "the usergroup " + user_group + "!")
+    return "Removed the group " + groupname + " from " + user_group + "."
+
+
+# Maps every operation to its function, required and optional parameters.
+OPERATIONS = {
+    "create-user": (create_user, ("username", "password"), ()),
+    "update-user": (update_user, ("username",), ("new_username",
+                                                 "password")),
+    "delete-user": (delete_user, ("username",), ()),
+    "create-usergroup": (create_usergroup, ("user_group",), ()),
+    "update-usergroup-name": (update_usergroup_name,
+                              ("user_group", "new_name"), ()),
+    "delete-usergroup": (delete_usergroup, ("user_group",), ()),
+    "add-user-to-usergroup": (add_user_to_usergroup,
+                              ("username", "user_group"), ()),
+    "remove-user-from-usergroup": (remove_user_from_usergroup,
+                                   ("username", "user_group"), ()),
+    "add-group-to-usergroup": (add_group_to_usergroup,
+                               ("groupname", "user_group"), ()),
+    "remove-group-from-usergroup": (remove_group_from_usergroup,
+                                    ("groupname", "user_group"), ()),
+}
+
+
+def parse_line(line):
+    """
+    Parses one line of a script. A line is either a JSON object with the
+    operation in "op" and its parameters as the other keys, or a command
+    as typed on the command line, for example
+    "add-user-to-usergroup -u john -ug admins".
+    :param line: The line to parse.
+    :return: A tuple of the operation name and a dict of parameters.
+    :raises OperationError: If the line can not be parsed or a JSON value
+    is not a string.
+    """
+    line = line.strip()
+    if line.startswith("{"):
+        try:
+            params = json.loads(line)
+        except ValueError as error:
+            raise OperationError("Invalid JSON: " + str(error))
+        if not isinstance(params, dict) or "op" not in params:
+            raise OperationError("A JSON operation needs an \"op\" key!")
+        for key, value in params.items():
+            if not isinstance(value, str):
+                raise OperationError("The value of \"" + key +
+                                     "\" must be a string!")
+        params = dict(params)
+        return params.pop("op"), params
+
+    try:
+        words = shlex.split(line)
+    except ValueError as error:
+        raise OperationError(str(error))
+    name, words, params = words[0], words[1:], {}
+    while words:
+        option, words = words[0], words[1:]
+        value = None
+        if option.startswith("--") and "=" in option:
+            option, value = option.split("=", 1)
+        if option not in OPTIONS:
+            raise OperationError("Unknown option " + option + "!")
+        if value is None:
+            if not words:
+                raise OperationError("The option " + option +
+                                     " needs a value!")
+            value, words = words[0], words[1:]
+        params[OPTIONS[option]] = value
+    return name, params
+
+
+def run_operation(usermanager, groupmanager, name, params):
+    """
+    Runs one operation.
+    :param name: The name of the operation, one of OPERATIONS.
+    :param params: A dict with the parameters of the operation.
+    :return: A message describing what was done.
+    :raises OperationError: If the operation is invalid or failed.
+    """
+    if name not in OPERATIONS:
+        raise OperationError("Unknown operation " + str(name) + "!")
+    function, required, optional = OPERATIONS[name]
+    missing = [param for param in required if param not in params]
+    if missing:
+        raise OperationError("Missing " + ", ".join(missing) + " for " +
+                             name + "!")
+    unknown = [param for param in params
+               if param not in required and param not in optional]
+    if unknown:
+        raise OperationError("Unknown parameter " + ", ".join(unknown) +
+                             " for " + name + "!")
+    return function(usermanager, groupmanager, **params)
+
+
+def apply_script(usermanager, groupmanager, lines, dry_run=False):
+    """
+    Runs every operation in lines against the given managers. Empty lines
+    and lines starting with # are skipped. Failed operations do not stop
+    the script. users.yaml and groups.yaml are each written at most once,
+    after the last operation, and not at all for a dry run.
+    :param lines: An iterable of lines, for example an open file.
+    :param dry_run: Optional. Validate the operations without saving them.
+    :return: A list of (line number, success, message) tuples.
+    """
+    results = []
+    try:
+        with usermanager.batch(), groupmanager.batch():
+            for number, line in enumerate(lines, 1):
+                if not line.strip() or line.lstrip().startswith("#"):
+                    continue
+                try:
+                    name, params = parse_line(line)
+                    message = run_operation(usermanager, groupmanager, name,
+                                            params)
+                except OperationError as error:
+                    results.append((number, False, str(error)))
+                else:
+                    results.append((number, True, message))
+            if dry_run:
+                raise _DryRun()
+    except _DryRun:
+        pass
+    return results
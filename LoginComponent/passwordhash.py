@@ -0,0 +1,222 @@
+"""
+Salted PBKDF2 password hashes whose cost can be tuned. A hash is stored as
+pbkdf2_sha256$<iterations>$<salt>$<hash> with the salt and hash base64
+encoded, so it says how it was made and stays valid when the number of
+iterations changes. Unsalted SHA-512 hashes made by older versions are
+still accepted and are reported as outdated. Only the standard library is
+imported here, since the client uses User without loading yaml.
+"""
+
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import time
+
+_LOGGER = logging.getLogger(__name__)
+ALGORITHM = "pbkdf2_sha256"
+DIGEST = "sha256"
+SEPARATOR = "$"
+SALT_SIZE = 16
+DEFAULT_ITERATIONS = 100000
+MIN_ITERATIONS = 1000
+ITERATION_STEP = 1000
+CALIBRATION_ITERATIONS = 20000
+CALIBRATION_ROUNDS = 3
+DEFAULT_TARGET_MS = 50
+HASHING_YAML_FILE = "hashing.yaml"
+# The number of passwords a worker process hashes per task.
+HASH_CHUNK_SIZE = 64
+# How the worker processes are started, in order of preference. Forking
+# would copy the loaded users and the locks held by other threads into the
+# workers, which only need the passwords.
+POOL_START_METHODS = ("forkserver", "spawn")
+
+
+def _encode(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def _sha512(password):
+    return hashlib.sha512(str(password).encode("utf-8")).digest()
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac(DIGEST, str(password).encode("utf-8"), salt,
+                               iterations)
+
+
+def _parse(stored_password):
+    """
+    Splits a PBKDF2 hash into its iterations, salt and hash.
+    :return: A tuple of the three, or None if stored_password is not a
+    PBKDF2 hash.
+    """
+    if not isinstance(stored_password, str) or \
+            not stored_password.startswith(ALGORITHM + SEPARATOR):
+        return None
+    parts = stored_password.split(SEPARATOR)
+    if len(parts) != 4:
+        return None
+    try:
+        return (int(parts[1]), base64.b64decode(parts[2], validate=True),
+                base64.b64decode(parts[3], validate=True))
+    except ValueError:
+        return None
+
+
+def verify(password, stored_password):
+    """
+    Checks a password against a stored hash in constant time.
+    :param password: The password to check.
+    :param stored_password: A PBKDF2 hash, or an SHA-512 hash as raw digest
+    or hex string.
+    :return: Returns true if the password is correct and false if not.
+    """
+    parsed = _parse(stored_password)
+    if parsed is not None:
+        iterations, salt, expected = parsed
+        if iterations < 1:
+            return False
+        return hmac.compare_digest(_pbkdf2(password, salt, iterations),
+                                   expected)
+    digest = _sha512(password)
+    if isinstance(stored_password, bytes):
+        return hmac.compare_digest(stored_password, digest)
+    return hmac.compare_digest(str(stored_password).encode("utf-8"),
+                               digest.hex().encode("utf-8"))
+
+
+class PasswordHasher:
+    """
+    Makes PBKDF2 hashes with a fixed number of iterations.
+    """
+
+    def __init__(self, iterations=DEFAULT_ITERATIONS):
+        """
+        :param iterations: Optional. The number of PBKDF2 iterations.
+        """
+        self.iterations = max(int(iterations), MIN_ITERATIONS)
+
+    def hash(self, password):
+        """
+        Hashes a password with a new random salt. Before hashing the password
+        is converted to a string and encoded utf-8.
+        :param password: The password to hash.
+        :return: The hash string.
+        """
+        salt = os.urandom(SALT_SIZE)
+        return SEPARATOR.join((ALGORITHM, str(self.iterations), _encode(salt),
+                               _encode(_pbkdf2(password, salt,
+                                               self.iterations))))
+
+    def needs_rehash(self, stored_password):
+        """
+        Checks whether a stored hash was made differently than this hasher
+        would make it now.
+        :param stored_password: The stored hash.
+        :return: Returns true if it should be replaced by a new hash.
+        """
+        parsed = _parse(stored_password)
+        return parsed is None or parsed[0] != self.iterations
+
+
+DEFAULT_HASHER = PasswordHasher()
+
+
+def _hash_chunk(iterations, passwords):
+    """
+    Hashes a chunk of passwords in a worker process.
+    """
+    hasher = PasswordHasher(iterations)
+    return [hasher.hash(password) for password in passwords]
+
+
+def hash_passwords(hasher, passwords, workers=None,
+                   chunk_size=HASH_CHUNK_SIZE):
+    """
+    Hashes many passwords on all cores. The passwords are split into chunks
+    that are hashed by a pool of worker processes. If there is only one
+    chunk or one worker, they are hashed in this process instead, which
+    saves starting the pool.
+    :param hasher: The PasswordHasher to hash with.
+    :param passwords: A list of passwords.
+    :param workers: Optional. The number of worker processes. Defaults to
+    the number of CPUs.
+    :param chunk_size: Optional. The number of passwords per chunk.
+    :return: A list of the hashes in the order of the passwords.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = [passwords[start:start + chunk_size]
+              for start in range(0, len(passwords), chunk_size)]
+    if len(chunks) <= 1 or workers <= 1:
+        return [hasher.hash(password) for password in passwords]
+    # Imported here since they load multiprocessing, which would slow down
+    # the start of every command.
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    start_method = next(method for method in POOL_START_METHODS if method
+                        in multiprocessing.get_all_start_methods())
+    context = multiprocessing.get_context(start_method)
+    with ProcessPoolExecutor(min(workers, len(chunks)),
+                             mp_context=context) as executor:
+        hashes = []
+        for chunk_hashes in executor.map(_hash_chunk,
+                                         [hasher.iterations] * len(chunks),
+                                         chunks):
+            hashes.extend(chunk_hashes)
+    return hashes
+
+
+def calibrate(target_ms=DEFAULT_TARGET_MS, clock=time.perf_counter):
+    """
+    Measures how fast this host hashes and picks the number of iterations
+    that takes about target_ms milliseconds per hash.
+    :param target_ms: Optional. The time one hash should take.
+    :param clock: Optional. The function returning the time in seconds.
+    :return: The number of iterations, rounded to ITERATION_STEP.
+    """
+    seconds = None
+    salt = os.urandom(SALT_SIZE)
+    for _ in range(CALIBRATION_ROUNDS):
+        start = clock()
+        _pbkdf2("calibration", salt, CALIBRATION_ITERATIONS)
+        elapsed = clock() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    per_iteration = max(seconds, 1e-9) / CALIBRATION_ITERATIONS
+    iterations = int(target_ms / 1000.0 / per_iteration)
+    iterations = int(round(iterations / ITERATION_STEP)) * ITERATION_STEP
+    return max(iterations, MIN_ITERATIONS)
+
+
+def read_hasher(path=HASHING_YAML_FILE):
+    """
+    Returns a PasswordHasher with the iterations saved in the hashing yaml
+    file, or the default hasher if there is no such file.
+    :param path: Optional. The path of the hashing yaml file.
+    :return: A PasswordHasher.
+    """
+    if not os.path.isfile(path):
+        return DEFAULT_HASHER
+    # yamlio is imported here so importing User does not load yaml.
+    from LoginComponent import yamlio
+    data = yamlio.read_yaml_file(path, cache=False)
+    try:
+        return PasswordHasher(data["iterations"])
+    except (KeyError, TypeError, ValueError):
+        _LOGGER.error("Ignoring %s, it has no valid iterations!", path)
+        return DEFAULT_HASHER
+
+
+def write_hasher(hasher, path=HASHING_YAML_FILE):
+    """
+    Saves the iterations of a PasswordHasher to the hashing yaml file.
+    :param hasher: The PasswordHasher.
+    :param path: Optional. The path of the hashing yaml file.
+    """
+    from LoginComponent import yamlio
+    yamlio.write_yaml_file(path, {"algorithm": ALGORITHM,
+                                  "iterations": hasher.iterations},
+                           cache=False)
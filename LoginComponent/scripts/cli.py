@@ -2,10 +2,12 @@
 LoginComponent cli
 """
 
+import os
+
 import click
 
-from LoginComponent.usermanager import UserManager
-from LoginComponent.usergroupmanager import UserGroupManager
+from LoginComponent.passwordhash import DEFAULT_TARGET_MS, HASHING_YAML_FILE
+from LoginComponent.stats import STATS
 from LoginComponent.scripts import utils
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
@@ -62,12 +64,265 @@ LONG_ARGUMENT_USERGROUP_NAME = "--new-name"
 METAVAR_USERGROUP_NAME = "<name>"
 HELP_USERGROUP_NAME = "The new name of this usergroup."
 
+SHORT_ARGUMENT_MATCH = "-m"
+LONG_ARGUMENT_MATCH = "--match"
+METAVAR_MATCH = "<pattern>"
+HELP_MATCH = "Only show the names starting with this prefix, or matching " \
+             "it if it contains *, ? or [."
+LONG_ARGUMENT_LIMIT = "--limit"
+METAVAR_LIMIT = "<count>"
+HELP_LIMIT = "Show at most this many matches."
+LONG_ARGUMENT_OFFSET = "--offset"
+METAVAR_OFFSET = "<count>"
+HELP_OFFSET = "Skip this many matches first."
+
+# The number of lines written with a single echo, and the number of names a
+# selection menu shows before asking to narrow the search.
+OUTPUT_CHUNK = 500
+MENU_SIZE = 20
+
+SHORT_HELP_SHELL = "Runs commands interactively and saves them at once."
+
+SHORT_HELP_APPLY = "Runs a script of commands and saves them at once."
+METAVAR_SCRIPT = "<script>"
+LONG_ARGUMENT_DRY_RUN = "--dry-run"
+HELP_DRY_RUN = "Check every command of the script without saving anything."
+
+SHORT_HELP_SERVE = "Runs a server that keeps all users and usergroups loaded."
+LONG_ARGUMENT_SOCKET = "--socket"
+# The same as client.DEFAULT_SOCKET, which is not imported here since the
+# client is only needed with --server.
+DEFAULT_SOCKET = "user-management.sock"
+METAVAR_SOCKET = "<socket>"
+HELP_SOCKET = "The path of the Unix socket of the server."
+LONG_ARGUMENT_WATCH = "--watch/--no-watch"
+HELP_WATCH = "Reload the users and usergroups when the yaml configuration " \
+             "files are changed by someone else."
+
+LONG_ARGUMENT_CLEAR = "--clear"
+HELP_CLEAR = "Clear the screen before running the command."
+
+LONG_ARGUMENT_PROFILE = "--profile"
+HELP_PROFILE = "Print how much time was spent loading, converting, " \
+               "mutating, serializing and writing after the command."
+
+LONG_ARGUMENT_SERVER = "--server"
+HELP_SERVER = "Send the command to a running server instead of reading the " \
+              "yaml configuration files."
+HELP_SERVER_SOCKET = "The path of the Unix socket of the server used with " + \
+                     LONG_ARGUMENT_SERVER + ". Defaults to " + \
+                     DEFAULT_SOCKET + "."
+
+LONG_ARGUMENT_DATABASE = "--database"
+METAVAR_DATABASE = "<database>"
+HELP_DATABASE = "Keep the users and usergroups in this SQLite database " \
+                "instead of the yaml configuration files."
+
+LONG_ARGUMENT_SHARDED = "--sharded"
+METAVAR_DIRECTORY = "<directory>"
+HELP_SHARDED = "Keep the users and usergroups in this directory of yaml " \
+               "files instead, which are changed one small file at a time."
+HELP_MIGRATE_SHARDED = "Copy to this directory of yaml files instead of a " \
+                       "SQLite database."
+
+SHORT_HELP_MIGRATE = "Copies the yaml configuration files to a SQLite " \
+                     "database or a sharded directory."
+USERS_DIRECTORY = "users"
+GROUPS_DIRECTORY = "groups"
+# The yaml configuration file and the database suffix the name index file
+# of each kind of storage is named after. The manager modules are not
+# imported for them to keep completion fast.
+NAMES_LOCATIONS = {USERS_DIRECTORY: ("users.yaml", "-users"),
+                   GROUPS_DIRECTORY: ("groups.yaml", "-usergroups")}
+
+SHORT_HELP_CALIBRATE_HASH = "Picks the cost of password hashes for this " \
+                            "host."
+SHORT_ARGUMENT_TARGET = "-t"
+LONG_ARGUMENT_TARGET = "--target-ms"
+METAVAR_TARGET = "<milliseconds>"
+HELP_TARGET = "The time one password hash should take. Defaults to " + \
+              str(DEFAULT_TARGET_MS) + "."
+HELP_CALIBRATE_DRY_RUN = "Only print the result without saving it."
+
 
 @click.group(context_settings=CONTEXT_SETTINGS)
-def cli():
-    """ Creates, updates, reads and deletes users and groups. """
-    click.clear()
-    pass
+@click.option(LONG_ARGUMENT_CLEAR, is_flag=True, help=HELP_CLEAR)
+@click.option(LONG_ARGUMENT_PROFILE, is_flag=True, help=HELP_PROFILE)
+@click.option(LONG_ARGUMENT_SERVER, is_flag=True, help=HELP_SERVER)
+@click.option(LONG_ARGUMENT_SOCKET, metavar=METAVAR_SOCKET,
+              default=DEFAULT_SOCKET, help=HELP_SERVER_SOCKET)
+@click.option(LONG_ARGUMENT_DATABASE, metavar=METAVAR_DATABASE,
+              type=click.Path(dir_okay=False), help=HELP_DATABASE)
+@click.option(LONG_ARGUMENT_SHARDED, metavar=METAVAR_DIRECTORY,
+              type=click.Path(file_okay=False), help=HELP_SHARDED)
+@click.pass_context
+def cli(ctx, clear, profile, server, socket, database, sharded):
+    """
+    Creates, updates, reads and deletes users and groups. Usernames and
+    group names are completed by bash after running:
+
+    \b
+    eval "$(_USER_MANAGEMENT_HOME_ASSISTANT_COMPLETE=bash_source \\
+        user-management-home-assistant)"
+    """
+    if database is not None and sharded is not None:
+        raise click.UsageError(LONG_ARGUMENT_DATABASE + " and " +
+                               LONG_ARGUMENT_SHARDED + " can not be used "
+                               "together.")
+    if clear:
+        click.clear()
+    if profile:
+        STATS.reset()
+        ctx.call_on_close(print_profile)
+    if server and ctx.obj is None:
+        from LoginComponent.client import Client, ServerError, \
+            RemoteUserGroupManager, RemoteUserManager
+        from LoginComponent.scripts.shell import Session
+        try:
+            client = Client(socket)
+        except ServerError as error:
+            click.secho(str(error) + ", using the yaml configuration files "
+                        "instead.", fg="yellow", err=True)
+        else:
+            ctx.call_on_close(client.close)
+            ctx.obj = Session(RemoteUserManager(client),
+                              RemoteUserGroupManager(client))
+
+
+def get_session():
+    """
+    Returns the Session of the shell or server the command runs against, or
+    None if there is none. The shell module, and readline with it, is only
+    imported when there is a session.
+    """
+    ctx = click.get_current_context()
+    if ctx.find_root().obj is None:
+        return None
+    from LoginComponent.scripts.shell import Session
+    return ctx.find_object(Session)
+
+
+def get_usermanager():
+    """
+    Returns the UserManager of the shell session or server the command runs
+    against, or a new UserManager otherwise. The manager modules, and PyYAML
+    with them, are only imported by commands that use them to keep the
+    startup fast.
+    """
+    session = get_session()
+    if session is not None:
+        return session.usermanager
+    from LoginComponent.usermanager import UserManager
+    return UserManager(storage=get_storage(USERS_DIRECTORY))
+
+
+def get_groupmanager():
+    """
+    Returns the UserGroupManager of the shell session or server the command
+    runs against, or a new UserGroupManager otherwise. The manager modules, and
+    PyYAML with them, are only imported by commands that use them to keep
+    the startup fast.
+    """
+    session = get_session()
+    if session is not None:
+        return session.groupmanager
+    from LoginComponent.usergroupmanager import UserGroupManager
+    return UserGroupManager(storage=get_storage(GROUPS_DIRECTORY))
+
+
+def get_storage(kind):
+    """
+    Returns the storage chosen with --database or --sharded, or None to
+    keep the default yaml configuration files.
+    :param kind: USERS_DIRECTORY or GROUPS_DIRECTORY.
+    """
+    ctx = click.get_current_context()
+    params = ctx.find_root().params
+    if params.get("database") is not None:
+        from LoginComponent.sqlitestorage import SqliteGroupStorage, \
+            SqliteUserStorage
+        storage_class = SqliteUserStorage if kind == USERS_DIRECTORY \
+            else SqliteGroupStorage
+        storage = storage_class(params["database"])
+        ctx.call_on_close(storage.close)
+        return storage
+    if params.get("sharded") is not None:
+        from LoginComponent.storage import ShardedYamlStorage
+        return ShardedYamlStorage(os.path.join(params["sharded"], kind))
+    return None
+
+
+def get_names_file(ctx, kind):
+    """
+    Returns the name index file the managers keep for the storage chosen
+    with --database or --sharded.
+    :param ctx: The click context.
+    :param kind: USERS_DIRECTORY or GROUPS_DIRECTORY.
+    """
+    from LoginComponent.completion import names_path
+    yaml_file, database_suffix = NAMES_LOCATIONS[kind]
+    params = ctx.find_root().params
+    if params.get("database") is not None:
+        return names_path(params["database"] + database_suffix)
+    if params.get("sharded") is not None:
+        return names_path(os.path.normpath(os.path.join(params["sharded"],
+                                                        kind)))
+    return names_path(yaml_file)
+
+
+def complete_names(ctx, kind, key, incomplete):
+    """
+    Completes names of one kind from the name index file. If a change
+    marked the file stale, the manager reads the storage once to write it
+    again, and later completions only read the file.
+    :param ctx: The click context.
+    :param kind: USERS_DIRECTORY or GROUPS_DIRECTORY.
+    :param key: USERS, USERGROUPS or GROUPS of the completion module.
+    :param incomplete: The part of the name typed so far.
+    """
+    from LoginComponent import completion
+    path = get_names_file(ctx, kind)
+    if completion.is_marked_stale(path):
+        with ctx:
+            if kind == USERS_DIRECTORY:
+                get_usermanager().read_users()
+            else:
+                get_groupmanager().read_groups()
+    return completion.complete(path, key, incomplete)
+
+
+def complete_usernames(ctx, param, incomplete):
+    """
+    Completes usernames from the name index file without loading the users.
+    """
+    from LoginComponent import completion
+    return complete_names(ctx, USERS_DIRECTORY, completion.USERS, incomplete)
+
+
+def complete_usergroups(ctx, param, incomplete):
+    """
+    Completes usergroup names from the name index file without loading the
+    usergroups.
+    """
+    from LoginComponent import completion
+    return complete_names(ctx, GROUPS_DIRECTORY, completion.USERGROUPS,
+                          incomplete)
+
+
+def complete_groups(ctx, param, incomplete):
+    """
+    Completes the Home Assistant groups used in any usergroup from the name
+    index file without loading the usergroups.
+    """
+    from LoginComponent import completion
+    return complete_names(ctx, GROUPS_DIRECTORY, completion.GROUPS, incomplete)
+
+
+def print_profile():
+    """
+    Prints the time spent per phase as recorded in the shared stats.
+    """
+    click.echo(STATS.report(), err=True)
 
 
 @cli.command(options_metavar=METAVAR_COMMAND,
@@ -84,7 +339,7 @@ def create_user(username, password):
     :param username: The username of the user you'd like to add.
     :param password: The password of the user you'd like to add.
     """
-    usermanager = UserManager()
+    usermanager = get_usermanager()
     if usermanager.create_user(username, password):
         click.secho("Successfully created the user " + username,
                     fg="green", bold=True)
@@ -101,7 +356,7 @@ def create_usergroup(user_group):
     \b
     :param group_name: The name of the group you'd like to add.
     """
-    groupmanager = UserGroupManager()
+    groupmanager = get_groupmanager()
     if groupmanager.create_group(user_group):
         click.secho("Successfully created a group with the name " +
                     user_group, fg="green", bold=True)
@@ -113,7 +368,8 @@ def create_usergroup(user_group):
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_UPDATE_USER)
 @click.option(SHORT_ARGUMENT_USERNAME, LONG_ARGUMENT_USERNAME,
-              metavar=METAVAR_USERNAME, help=HELP_USERNAME, default=None)
+              metavar=METAVAR_USERNAME, help=HELP_USERNAME, default=None,
+              shell_complete=complete_usernames)
 def update_user(username):
     """
     Edit a user. The username is an optional argument. If not entered,
@@ -121,13 +377,12 @@ def update_user(username):
     \b
     :param username: The name of the user you'd like to edit.
     """
-    usermanager = UserManager()
-    groupmanager = UserGroupManager()
+    usermanager = get_usermanager()
+    groupmanager = get_groupmanager()
     if username is None:
         username = select_user_from_list(usermanager)
 
-    if username not in (username.get_username() for username in
-                        usermanager.users):
+    if not usermanager.has_user(username):
         click.secho("The given user does not exist!", fg="red", bold=True)
         return
 
@@ -169,28 +424,10 @@ def select_user_from_list(usermanager):
     :param usermanager: The usermanager object
     :return: Returns the username of the selected user.
     """
-    if len(usermanager.users) > 0:
-        print_users(usermanager)
-        while True:
-            username = click.prompt("Please type the name of the user "
-                                    "you'd like to use.", type=str)
-            if utils.parse_int(username) is None:
-                if username not in (username.get_username() for username in
-                                    usermanager.users):
-                    click.secho("The given user does not exist!", fg="red",
-                                bold=True)
-                else:
-                    return username
-            else:
-                try:
-                    return usermanager.users[utils.parse_int(
-                            username)-1].get_username()
-                except IndexError:
-                    click.secho(username + " is not a valid number!",
-                                fg="red", bold=True)
-    else:
-        click.secho("There are no users!", fg="red", bold=True)
-        exit()
+    return select_from_list(
+        lambda pattern, limit: [user.get_username() for user in
+                                usermanager.search_users(pattern, 0, limit)],
+        usermanager.has_user, "user", "users")
 
 
 def select_usergroup_from_list(groupmanager):
@@ -199,35 +436,105 @@ def select_usergroup_from_list(groupmanager):
     :param groupmanager: The groupmanager object
     :return: Returns the name of the selected usergroup.
     """
-    if len(groupmanager.user_groups) > 0:
-        print_groups(groupmanager)
-        while True:
-            groupname = click.prompt("Please type the name of the group "
-                                     "you'd like to use.", type=str)
-            if utils.parse_int(groupname) is None:
-                if groupname not in (usergroup.get_name() for usergroup in
-                                     groupmanager.user_groups):
-                    click.secho("The given usergroup does not exist!",
-                                fg="red", bold=True)
-                else:
-                    return groupname
-            else:
-                try:
-                    return groupmanager.user_groups[utils.parse_int(
-                            groupname)-1].get_name()
-                except IndexError:
-                    click.secho(groupname+" is not a valid number!",
-                                fg="red", bold=True)
-    else:
-        click.secho("There are no usergroups!", fg="red", bold=True)
+    return select_from_list(
+        lambda pattern, limit: [user_group.get_name() for user_group in
+                                groupmanager.search_usergroups(pattern, 0,
+                                                               limit)],
+        groupmanager.has_usergroup, "usergroup", "usergroups")
+
+
+def select_from_list(search, exists, noun, plural):
+    """
+    Shows the first MENU_SIZE names and prompts for one. A number picks a
+    name from the list shown and an existing name is picked as is. Anything
+    else is searched for as a prefix or glob pattern, which picks the only
+    match or shows the matches to choose from.
+    :param search: A function returning at most limit sorted names for a
+    pattern, or all names if the pattern is None.
+    :param exists: A function checking whether a name exists.
+    :param noun: What a name is the name of, such as "user".
+    :param plural: The plural of noun.
+    :return: Returns the selected name.
+    """
+    names = search(None, MENU_SIZE + 1)
+    if not names:
+        click.secho("There are no " + plural + "!", fg="red", bold=True)
         exit()
 
+    print_menu(names)
+    while True:
+        answer = click.prompt("Please type the name of the " + noun +
+                              " you'd like to use, or a prefix or pattern "
+                              "to search for.", type=str)
+        number = utils.parse_int(answer)
+        if number is not None:
+            if 0 < number <= min(len(names), MENU_SIZE):
+                return names[number - 1]
+            click.secho(answer + " is not a valid number!", fg="red",
+                        bold=True)
+            continue
+        if exists(answer):
+            return answer
+        matches = search(answer, MENU_SIZE + 1)
+        if len(matches) == 1:
+            return matches[0]
+        if not matches:
+            click.secho("The given " + noun + " does not exist!", fg="red",
+                        bold=True)
+            continue
+        names = matches
+        print_menu(names)
+
+
+def print_menu(names):
+    """
+    Prints up to MENU_SIZE numbered names, and a hint if there are more.
+    :param names: The names to print.
+    """
+    lines = [click.style("[" + str(i + 1) + "] ", fg='cyan') + name
+             for i, name in enumerate(names[:MENU_SIZE])]
+    if len(names) > MENU_SIZE:
+        lines.append("... type a prefix or pattern to see the others.")
+    click.echo("\n".join(lines))
+
+
+def echo_lines(lines):
+    """
+    Writes lines in chunks of OUTPUT_CHUNK lines, so a long listing is not
+    written one line at a time.
+    :param lines: An iterable of lines without line endings.
+    """
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == OUTPUT_CHUNK:
+            click.echo("\n".join(chunk))
+            chunk = []
+    if chunk:
+        click.echo("\n".join(chunk))
+
+
+def search_options(command):
+    """
+    Adds the --match, --limit and --offset options to a command.
+    """
+    command = click.option(LONG_ARGUMENT_OFFSET, metavar=METAVAR_OFFSET,
+                           type=click.IntRange(min=0), default=0,
+                           help=HELP_OFFSET)(command)
+    command = click.option(LONG_ARGUMENT_LIMIT, metavar=METAVAR_LIMIT,
+                           type=click.IntRange(min=0), default=None,
+                           help=HELP_LIMIT)(command)
+    return click.option(SHORT_ARGUMENT_MATCH, LONG_ARGUMENT_MATCH,
+                        metavar=METAVAR_MATCH, default=None,
+                        help=HELP_MATCH)(command)
+
 
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_ADD_USER_TO_USERGROUP)
 @click.option(SHORT_ARGUMENT_USERGROUP, LONG_ARGUMENT_USERGROUP,
               metavar=METAVAR_USERGROUP, help=HELP_UPDATE_USERGROUP,
-              default=None)
+              default=None,
+              shell_complete=complete_usergroups)
 @click.option(SHORT_ARGUMENT_USERGROUP_NAME, LONG_ARGUMENT_USERGROUP_NAME,
               metavar=METAVAR_USERGROUP_NAME, help=HELP_USERGROUP_NAME,
               prompt=True)
@@ -238,13 +545,12 @@ def update_usergroup_name(user_group, new_name):
     :param user_group: The name of the usergroup you'd like to add a user to.
     :param new_name: The new name of this usergroup.
     """
-    groupmanager = UserGroupManager()
+    groupmanager = get_groupmanager()
 
     if user_group is None:
         user_group = select_usergroup_from_list(groupmanager)
 
-    if user_group in (usergroup.get_name() for usergroup in
-                      groupmanager.user_groups):
+    if groupmanager.has_usergroup(user_group):
         if groupmanager.update_usergroup_name(user_group, new_name):
             click.secho("The group " + user_group + " has succesfully "
                         "been renamed to " + new_name + ".", fg="green",
@@ -260,10 +566,12 @@ def update_usergroup_name(user_group, new_name):
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_ADD_USER_TO_USERGROUP)
 @click.option(SHORT_ARGUMENT_USERNAME, LONG_ARGUMENT_USERNAME,
-              metavar=METAVAR_USERNAME, help=HELP_USERNAME, default=None)
+              metavar=METAVAR_USERNAME, help=HELP_USERNAME, default=None,
+              shell_complete=complete_usernames)
 @click.option(SHORT_ARGUMENT_USERGROUP, LONG_ARGUMENT_USERGROUP,
               metavar=METAVAR_USERGROUP, help=HELP_UPDATE_USERGROUP,
-              default=None)
+              default=None,
+              shell_complete=complete_usergroups)
 def add_user_to_usergroup(username, user_group):
     """
     Adds a user to a usergroup.
@@ -273,8 +581,8 @@ def add_user_to_usergroup(username, user_group):
     :param user_group: Optional. The name of the usergroup you'd like to
     add a user to.
     """
-    usermanager = UserManager()
-    groupmanager = UserGroupManager()
+    usermanager = get_usermanager()
+    groupmanager = get_groupmanager()
 
     if username is None:
         username = select_user_from_list(usermanager)
@@ -282,22 +590,20 @@ def add_user_to_usergroup(username, user_group):
     if user_group is None:
         user_group = select_usergroup_from_list(groupmanager)
 
-    if username in (user.get_username() for user in usermanager.users):
-        for usergroup in groupmanager.user_groups:
-            if usergroup.name == user_group:
-                if groupmanager.add_user_to_usergroup(username, usergroup,
-                                                      usermanager):
-                    click.secho("The user " + username + " has succesfully "
-                                "been added to the usergroup " +
-                                user_group + ".", fg="green", bold=True)
-                else:
-                    click.secho("The user " + username + " is already in the "
-                                "usergroup " + user_group + "!", fg="red",
-                                bold=True)
-                break
-        else:
+    if usermanager.has_user(username):
+        usergroup = groupmanager.get_usergroup(user_group)
+        if usergroup is None:
             click.secho("There is no usergroup with the name " +
                         user_group + "!", fg="red", bold=True)
+        elif groupmanager.add_user_to_usergroup(username, usergroup,
+                                                usermanager):
+            click.secho("The user " + username + " has succesfully "
+                        "been added to the usergroup " +
+                        user_group + ".", fg="green", bold=True)
+        else:
+            click.secho("The user " + username + " is already in the "
+                        "usergroup " + user_group + "!", fg="red",
+                        bold=True)
     else:
         click.secho("The user " + username + " does not exist!", fg="red",
                     bold=True)
@@ -306,10 +612,12 @@ def add_user_to_usergroup(username, user_group):
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_ADD_GROUP_TO_USERGROUP)
 @click.option(SHORT_ARGUMENT_GROUP, LONG_ARGUMENT_GROUP,
-              metavar=METAVAR_GROUP, help=HELP_CREATE_GROUP, prompt=True)
+              metavar=METAVAR_GROUP, help=HELP_CREATE_GROUP, prompt=True,
+              shell_complete=complete_groups)
 @click.option(SHORT_ARGUMENT_USERGROUP, LONG_ARGUMENT_USERGROUP,
               metavar=METAVAR_USERGROUP, help=HELP_UPDATE_USERGROUP,
-              default=None)
+              default=None,
+              shell_complete=complete_usergroups)
 def add_group_to_usergroup(groupname, user_group):
     """
     Add a Home Assistant group to a usergroup.
@@ -319,34 +627,34 @@ def add_group_to_usergroup(groupname, user_group):
     :param user_group: Optional. The name of the usergroup you'd like to
     add a user to.
     """
-    groupmanager = UserGroupManager()
+    groupmanager = get_groupmanager()
 
     if user_group is None:
         user_group = select_usergroup_from_list(groupmanager)
 
-    for usergroup in groupmanager.user_groups:
-        if usergroup.name == user_group:
-            if groupmanager.add_group_to_usergroup(groupname, usergroup):
-                click.secho("The group " + groupname + " has succesfully been "
-                            "added to the usergroup " + user_group + ".",
-                            fg="green", bold=True)
-            else:
-                click.secho("The group " + groupname + " is already in the "
-                            "usergroup " + user_group + "!", fg="red",
-                            bold=True)
-            break
-    else:
-        click.secho("There is no usergroup with the name " + groupname + "!",
+    usergroup = groupmanager.get_usergroup(user_group)
+    if usergroup is None:
+        click.secho("There is no usergroup with the name " + user_group + "!",
                     fg="red", bold=True)
+    elif groupmanager.add_group_to_usergroup(groupname, usergroup):
+        click.secho("The group " + groupname + " has succesfully been "
+                    "added to the usergroup " + user_group + ".",
+                    fg="green", bold=True)
+    else:
+        click.secho("The group " + groupname + " is already in the "
+                    "usergroup " + user_group + "!", fg="red",
+                    bold=True)
 
 
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_REMOVE_USER_FROM_USERGROUP)
 @click.option(SHORT_ARGUMENT_USERNAME, LONG_ARGUMENT_USERNAME,
-              metavar=METAVAR_USERNAME, help=HELP_USERNAME, default=None)
+              metavar=METAVAR_USERNAME, help=HELP_USERNAME, default=None,
+              shell_complete=complete_usernames)
 @click.option(SHORT_ARGUMENT_USERGROUP, LONG_ARGUMENT_USERGROUP,
               metavar=METAVAR_USERGROUP, help=HELP_UPDATE_USERGROUP,
-              default=None)
+              default=None,
+              shell_complete=complete_usergroups)
 def remove_user_from_usergroup(username, user_group):
     """
     Remove a user from a usergroup.
@@ -356,8 +664,8 @@ def remove_user_from_usergroup(username, user_group):
     :param user_group: Optional. The name of the usergroup you'd like to
     remove a user from.
     """
-    usermanager = UserManager()
-    groupmanager = UserGroupManager()
+    usermanager = get_usermanager()
+    groupmanager = get_groupmanager()
 
     if username is None:
         username = select_user_from_list(usermanager)
@@ -365,22 +673,19 @@ def remove_user_from_usergroup(username, user_group):
     if user_group is None:
         user_group = select_usergroup_from_list(groupmanager)
 
-    if username in (user.get_username() for user in usermanager.users):
-        for usergroup in groupmanager.user_groups:
-            if usergroup.name == user_group:
-                if groupmanager.remove_user_from_usergroup(username,
-                                                           usergroup):
-                    click.secho("The user " + username + " has succesfully "
-                                "been removed from the usergroup " +
-                                user_group + ".", fg="green", bold=True)
-                else:
-                    click.secho("The user " + username + " is not in the "
-                                "usergroup " + user_group + "!", fg="red",
-                                bold=True)
-                break
-        else:
+    if usermanager.has_user(username):
+        usergroup = groupmanager.get_usergroup(user_group)
+        if usergroup is None:
             click.secho("There is no usergroup with the name " + user_group +
                         "!", fg="red", bold=True)
+        elif groupmanager.remove_user_from_usergroup(username, usergroup):
+            click.secho("The user " + username + " has succesfully "
+                        "been removed from the usergroup " +
+                        user_group + ".", fg="green", bold=True)
+        else:
+            click.secho("The user " + username + " is not in the "
+                        "usergroup " + user_group + "!", fg="red",
+                        bold=True)
     else:
         click.secho("The user " + username + " does not exist!", fg="red",
                     bold=True)
@@ -389,10 +694,12 @@ def remove_user_from_usergroup(username, user_group):
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_REMOVE_GROUP_FROM_USERGROUP)
 @click.option(SHORT_ARGUMENT_GROUP, LONG_ARGUMENT_GROUP,
-              metavar=METAVAR_GROUP, help=HELP_CREATE_GROUP, prompt=True)
+              metavar=METAVAR_GROUP, help=HELP_CREATE_GROUP, prompt=True,
+              shell_complete=complete_groups)
 @click.option(SHORT_ARGUMENT_USERGROUP, LONG_ARGUMENT_USERGROUP,
               metavar=METAVAR_USERGROUP, help=HELP_UPDATE_USERGROUP,
-              default=None)
+              default=None,
+              shell_complete=complete_usergroups)
 def remove_group_from_usergroup(groupname, user_group):
     """
     Remove a Home Assistant group from a usergroup.
@@ -402,41 +709,48 @@ def remove_group_from_usergroup(groupname, user_group):
     :param usergroupname: Optional. The name of the usergroup you'd like to
     remove a user from.
     """
-    groupmanager = UserGroupManager()
+    groupmanager = get_groupmanager()
 
     if user_group is None:
         user_group = select_usergroup_from_list(groupmanager)
 
-    for usergroup in groupmanager.user_groups:
-        if usergroup.name == user_group:
-            if groupmanager.remove_group_from_usergroup(groupname, usergroup):
-                click.secho("The group " + groupname + " has succesfully been "
-                            "removed from the usergroup " + user_group + ".",
-                            fg="green", bold=True)
-            else:
-                click.secho("The group " + groupname + " is not in the "
-                            "usergroup " + user_group + "!", fg="red",
-                            bold=True)
-            break
-    else:
+    usergroup = groupmanager.get_usergroup(user_group)
+    if usergroup is None:
         click.secho("There is no usergroup with the name " + user_group + "!",
                     fg="red", bold=True)
+    elif groupmanager.remove_group_from_usergroup(groupname, usergroup):
+        click.secho("The group " + groupname + " has succesfully been "
+                    "removed from the usergroup " + user_group + ".",
+                    fg="green", bold=True)
+    else:
+        click.secho("The group " + groupname + " is not in the "
+                    "usergroup " + user_group + "!", fg="red",
+                    bold=True)
 
 
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_READ_USERS)
-def read_users():
-    """ Prints all user's username and password. """
-    usermanager = UserManager()
-    for user in usermanager.users:
-        click.echo("Username: " + user.get_username() +
-                   " & Password: " + user.get_password())
+@search_options
+def read_users(match, limit, offset):
+    """
+    Prints the username and password of all users, sorted by username.
+    \b
+    :param match: Only print the users whose username starts with this
+    prefix or matches this glob pattern.
+    :param limit: Print at most this many users.
+    :param offset: Skip this many users first.
+    """
+    usermanager = get_usermanager()
+    echo_lines("Username: " + user.get_username() + " & Password: " +
+               user.get_password() for user in
+               usermanager.search_users(match, offset, limit))
 
 
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_READ_USER)
 @click.option(SHORT_ARGUMENT_USERNAME, LONG_ARGUMENT_USERNAME,
-              metavar=METAVAR_USERNAME, help=HELP_USERNAME)
+              metavar=METAVAR_USERNAME, help=HELP_USERNAME,
+              shell_complete=complete_usernames)
 def read_user(username):
     """
     Prints the username and password of the user that matches the given
@@ -444,91 +758,84 @@ def read_user(username):
     :param username: The username of which you'd like to see the username
     and password.
     """
-    usermanager = UserManager()
+    usermanager = get_usermanager()
 
     if username is None:
         username = select_user_from_list(usermanager)
 
-    for user in usermanager.users:
-        if username == user.get_username():
-                click.echo("Username: " + user.get_username() +
-                           " & Password: " + user.get_password())
-                break
-        else:
-            click.secho("There is no user by the username: " + username,
-                        fg="red", bold=True)
-
-
-def print_users(usermanager):
-    """
-    Prints the users stored in a UserManager.
-    :param usermanager: an instance of UserManager.
-    """
-    for i in range(len(usermanager.users)):
-        click.echo(click.style("[" + str(i+1) + "] ", fg='cyan') +
-                   usermanager.users[i].get_username())
+    user = usermanager.get_user(username)
+    if user is not None:
+        click.echo("Username: " + user.get_username() +
+                   " & Password: " + user.get_password())
+    else:
+        click.secho("There is no user by the username: " + username,
+                    fg="red", bold=True)
 
 
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_READ_GROUPS)
-def read_groups():
-    """ Prints all usergroups. """
-    usergroupmanager = UserGroupManager()
-    for user_group in usergroupmanager.user_groups:
-        click.echo("------")
-        click.echo("Name of the usergroup: " + user_group.get_name())
-        click.echo("Users in this usergroup: ")
-        click.echo(user_group.get_users())
-        click.echo("Home Assistant groups in this usergroup: ")
-        click.echo(user_group.get_groups())
+@search_options
+def read_groups(match, limit, offset):
+    """
+    Prints all usergroups, sorted by name.
+    \b
+    :param match: Only print the usergroups whose name starts with this
+    prefix or matches this glob pattern.
+    :param limit: Print at most this many usergroups.
+    :param offset: Skip this many usergroups first.
+    """
+    usergroupmanager = get_groupmanager()
+    echo_lines(line for user_group in
+               usergroupmanager.search_usergroups(match, offset, limit)
+               for line in usergroup_lines(user_group))
 
 
-@cli.command(options_metavar=METAVAR_COMMAND,
+@cli.command("read-group", options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_READ_GROUP)
 @click.option(SHORT_ARGUMENT_USERGROUP, LONG_ARGUMENT_USERGROUP,
-              metavar=METAVAR_USERGROUP, help=HELP_READ_USERGROUP)
+              metavar=METAVAR_USERGROUP, help=HELP_READ_USERGROUP,
+              shell_complete=complete_usergroups)
 def read_group(user_group):
     """ Prints a group based on the given groupname. """
-    usergroupmanager = UserGroupManager()
+    usergroupmanager = get_groupmanager()
 
     if user_group is None:
         user_group = select_usergroup_from_list(usergroupmanager)
 
-    for usergroup in usergroupmanager.user_groups:
-        if usergroup.get_name() == user_group:
-            click.echo("------")
-            click.echo("Name of the usergroup: " + usergroup.get_name())
-            click.echo("Users in this usergroup: ")
-            click.echo(usergroup.get_users())
-            click.echo("Home Assistant groups in this usergroup: ")
-            click.echo(usergroup.get_groups())
-            break
-        else:
-            click.secho("There is no group by the groupname: " + user_group,
-                        fg="red", bold=True)
+    usergroup = usergroupmanager.get_usergroup(user_group)
+    if usergroup is not None:
+        echo_lines(usergroup_lines(usergroup))
+    else:
+        click.secho("There is no group by the groupname: " + user_group,
+                    fg="red", bold=True)
 
 
-def print_groups(usergroupmanager):
+def usergroup_lines(user_group):
     """
-    Prints all groups stored in a UserGroupManager.
-    :param usergroupmanager: an instance of UserGroupManager.
+    Returns the lines read-groups and read-group print for a usergroup.
+    :param user_group: The usergroup to describe.
+    :return: A list of lines.
     """
-    for i in range(len(usergroupmanager.user_groups)):
-        click.echo(click.style("[" + str(i+1) + "] ", fg='cyan') +
-                   usergroupmanager.user_groups[i].get_name())
+    return ["------",
+            "Name of the usergroup: " + user_group.get_name(),
+            "Users in this usergroup: ",
+            str(user_group.get_users()),
+            "Home Assistant groups in this usergroup: ",
+            str(user_group.get_groups())]
 
 
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_DELETE_USER)
 @click.option(SHORT_ARGUMENT_USERNAME, LONG_ARGUMENT_USERNAME,
-              metavar=METAVAR_USERNAME, help=HELP_USERNAME)
+              metavar=METAVAR_USERNAME, help=HELP_USERNAME,
+              shell_complete=complete_usernames)
 def delete_user(username):
     """
     Deletes a user by given username.
     :param username: The username of the user you'd like to delete.
     """
-    usermanager = UserManager()
-    groupmanager = UserGroupManager()
+    usermanager = get_usermanager()
+    groupmanager = get_groupmanager()
 
     if username is None:
         username = select_user_from_list(usermanager)
@@ -543,13 +850,14 @@ def delete_user(username):
 @cli.command(options_metavar=METAVAR_COMMAND,
              short_help=SHORT_HELP_DELETE_GROUP)
 @click.option(SHORT_ARGUMENT_USERGROUP, LONG_ARGUMENT_USERGROUP,
-              metavar=METAVAR_USERGROUP, help=HELP_DELETE_USERGROUP)
+              metavar=METAVAR_USERGROUP, help=HELP_DELETE_USERGROUP,
+              shell_complete=complete_usergroups)
 def delete_usergroup(user_group):
     """
     Deletes a group by given usergroup name.
     :param groupname: The name of the usergroup you'd like to delete.
     """
-    groupmanager = UserGroupManager()
+    groupmanager = get_groupmanager()
 
     if user_group is None:
         user_group = select_usergroup_from_list(groupmanager)
@@ -562,3 +870,159 @@ def delete_usergroup(user_group):
         else:
             click.secho("The usergroup "+user_group+" does not exist!",
                         fg="red", bold=True)
+
+
+@cli.command(options_metavar=METAVAR_COMMAND, short_help=SHORT_HELP_SHELL)
+@click.pass_context
+def shell(ctx):
+    """
+    Starts an interactive shell that keeps all users and usergroups loaded.
+    Type the commands without the program name, for example
+    "create-user -u john". Usernames and group names are completed with
+    tab. Changes are saved with "commit" and when leaving with "exit".
+    """
+    from LoginComponent.scripts.shell import Session, run_shell
+    session = ctx.find_object(Session)
+    if session is not None and session.is_active():
+        click.secho("The shell is already running!", fg="red", bold=True)
+        return
+    if session is None:
+        session = Session(get_usermanager(), get_groupmanager())
+    run_shell(cli, session)
+
+
+@cli.command(options_metavar=METAVAR_COMMAND, short_help=SHORT_HELP_APPLY)
+@click.argument("script", type=click.File("r"), default="-",
+                metavar=METAVAR_SCRIPT)
+@click.option(LONG_ARGUMENT_DRY_RUN, is_flag=True, help=HELP_DRY_RUN)
+@click.pass_context
+def apply(ctx, script, dry_run):
+    """
+    Runs the commands in a script, or standard input when no script is
+    given. Every line is either a command without the program name, for
+    example "create-user -u john -p secret", or a JSON object such as
+    {"op": "create-user", "username": "john", "password": "secret"}.
+    Empty lines and lines starting with # are skipped. The yaml
+    configuration files are loaded and written only once.
+    \b
+    :param script: The file with one command per line.
+    :param dry_run: Check the commands without saving them.
+    """
+    from LoginComponent import operations
+    if dry_run and get_session() is not None:
+        click.secho("A dry run is not possible in the shell or with a "
+                    "server!", fg="red", bold=True)
+        return
+    results = operations.apply_script(get_usermanager(), get_groupmanager(),
+                                      script, dry_run)
+    failures = 0
+    for number, success, message in results:
+        if success:
+            click.secho("Line " + str(number) + ": " + message, fg="green")
+        else:
+            failures += 1
+            click.secho("Line " + str(number) + ": " + message, fg="red",
+                        bold=True)
+    click.echo(str(len(results) - failures) + " succeeded, " +
+               str(failures) + " failed" +
+               (", nothing was saved." if dry_run else "."))
+    if failures:
+        ctx.exit(1)
+
+
+@cli.command(options_metavar=METAVAR_COMMAND, short_help=SHORT_HELP_SERVE)
+@click.option(LONG_ARGUMENT_SOCKET, metavar=METAVAR_SOCKET,
+              default=DEFAULT_SOCKET, help=HELP_SOCKET)
+@click.option(LONG_ARGUMENT_WATCH, default=True, help=HELP_WATCH)
+def serve(socket, watch):
+    """
+    Runs a server that keeps all users and usergroups loaded and answers
+    password checks, lookups and changes over a Unix socket until it is
+    stopped with Ctrl+C. Other commands use it when they are given
+    --server.
+    \b
+    :param socket: The path of the Unix socket to listen on.
+    :param watch: Reload when the yaml configuration files change.
+    """
+    from LoginComponent import server
+    click.secho("Listening on " + socket, fg="green", bold=True)
+    server.serve(socket, get_usermanager(), get_groupmanager(), watch)
+
+
+@cli.command(options_metavar=METAVAR_COMMAND, short_help=SHORT_HELP_MIGRATE)
+@click.argument("database", type=click.Path(dir_okay=False), required=False,
+                metavar=METAVAR_DATABASE)
+@click.option(LONG_ARGUMENT_SHARDED, metavar=METAVAR_DIRECTORY,
+              type=click.Path(file_okay=False), help=HELP_MIGRATE_SHARDED)
+def migrate(database, sharded):
+    """
+    Copies all users and usergroups from the yaml configuration files to a
+    SQLite database or a sharded directory of yaml files, replacing the
+    users and usergroups stored there before. Afterwards they can be used
+    with --database or --sharded.
+    \b
+    :param database: The path of the database, which is created if it does
+    not exist.
+    :param sharded: The directory to copy to instead.
+    """
+    if (database is None) == (sharded is None):
+        raise click.UsageError("Give either a database or " +
+                               LONG_ARGUMENT_SHARDED + ".")
+    from LoginComponent.usermanager import UserManager
+    from LoginComponent.usergroupmanager import UserGroupManager
+    if database is not None:
+        from LoginComponent.sqlitestorage import SqliteGroupStorage, \
+            SqliteUserStorage
+        storages = (SqliteUserStorage(database), SqliteGroupStorage(database))
+        target = database
+    else:
+        from LoginComponent.storage import ShardedYamlStorage
+        storages = (ShardedYamlStorage(os.path.join(sharded,
+                                                    USERS_DIRECTORY)),
+                    ShardedYamlStorage(os.path.join(sharded,
+                                                    GROUPS_DIRECTORY)))
+        target = sharded
+    usermanager = UserManager()
+    groupmanager = UserGroupManager()
+    for storage, data in zip(storages, (
+            usermanager.convert_users_to_dict(usermanager.users),
+            groupmanager.convert_groups_to_dict(groupmanager.user_groups))):
+        try:
+            storage.write(data)
+        finally:
+            storage.close()
+    click.secho("Migrated " + str(len(usermanager.users)) + " users and " +
+                str(len(groupmanager.user_groups)) + " usergroups to " +
+                target + ".", fg="green", bold=True)
+
+
+@cli.command(options_metavar=METAVAR_COMMAND,
+             short_help=SHORT_HELP_CALIBRATE_HASH)
+@click.option(SHORT_ARGUMENT_TARGET, LONG_ARGUMENT_TARGET,
+              metavar=METAVAR_TARGET, type=click.IntRange(min=1),
+              default=DEFAULT_TARGET_MS, help=HELP_TARGET)
+@click.option(LONG_ARGUMENT_DRY_RUN, is_flag=True,
+              help=HELP_CALIBRATE_DRY_RUN)
+def calibrate_hash(target_ms, dry_run):
+    """
+    Measures how fast this host hashes passwords and saves the number of
+    PBKDF2 iterations that makes one hash take about the target time to
+    hashing.yaml. New passwords are hashed with it, and older hashes are
+    replaced the next time their password is verified.
+    \b
+    :param target_ms: The time one hash should take in milliseconds.
+    :param dry_run: Only print the number of iterations.
+    """
+    import time
+    from LoginComponent import passwordhash
+    hasher = passwordhash.PasswordHasher(passwordhash.calibrate(target_ms))
+    start = time.perf_counter()
+    hasher.hash("calibration")
+    elapsed = (time.perf_counter() - start) * 1000
+    click.echo(str(hasher.iterations) + " iterations take " +
+               str(round(elapsed, 1)) + " ms per hash.")
+    if dry_run:
+        return
+    passwordhash.write_hasher(hasher)
+    click.secho("Saved the iterations to " + HASHING_YAML_FILE + ".",
+                fg="green", bold=True)
@@ -0,0 +1,183 @@
+"""
+Interactive shell that runs cli commands against managers that stay loaded
+between commands.
+"""
+
+import shlex
+from contextlib import ExitStack
+
+import click
+
+try:
+    import readline
+except ImportError:
+    readline = None
+
+PROMPT = "user-management> "
+EXIT_COMMANDS = ("exit", "quit")
+COMMIT_COMMAND = "commit"
+HELP_COMMAND = "help"
+USERNAME_OPTIONS = ("-u", "--username")
+USERGROUP_OPTIONS = ("-ug", "--user-group")
+GROUP_OPTIONS = ("-g", "--groupname")
+
+
+class Session:
+    """
+    Holds the UserManager and UserGroupManager shared by all commands run in
+    one shell, or the remote managers of a server. Changes made in a shell
+    are kept in memory until they are committed.
+    """
+
+    def __init__(self, usermanager=None, groupmanager=None):
+        if usermanager is None:
+            from LoginComponent.usermanager import UserManager
+            usermanager = UserManager()
+        if groupmanager is None:
+            from LoginComponent.usergroupmanager import UserGroupManager
+            groupmanager = UserGroupManager()
+        self.usermanager = usermanager
+        self.groupmanager = groupmanager
+        self._batches = None
+
+    def is_active(self):
+        """
+        Checks whether a shell is running in this session.
+        :return: Returns true if writes are being deferred and false if not.
+        """
+        return self._batches is not None
+
+    def begin(self):
+        """
+        Starts deferring writes of both managers.
+        """
+        self._batches = ExitStack()
+        self._batches.enter_context(self.usermanager.batch())
+        self._batches.enter_context(self.groupmanager.batch())
+
+    def commit(self):
+        """
+        Writes all changes made since the last commit and keeps deferring
+        writes afterwards.
+        """
+        self.close()
+        self.begin()
+
+    def close(self):
+        """
+        Writes all changes made since the last commit and stops deferring
+        writes.
+        """
+        if self._batches is not None:
+            batches, self._batches = self._batches, None
+            batches.close()
+
+
+class Completer:
+    """
+    Completes command names, and usernames, usergroup names and Home
+    Assistant group names after the options that take them.
+    """
+
+    def __init__(self, commands, session):
+        self.commands = sorted(commands + [COMMIT_COMMAND, HELP_COMMAND] +
+                               list(EXIT_COMMANDS))
+        self.session = session
+        self._matches = []
+
+    def candidates(self, line, text):
+        """
+        Returns the completions of text, the word being typed at the end of
+        line.
+        :param line: The line up to the cursor.
+        :param text: The word being completed.
+        :return: A sorted list of completions.
+        """
+        words = line[:len(line) - len(text)].split()
+        if not words:
+            names = self.commands
+        elif words[-1] in USERNAME_OPTIONS:
+            names = (user.get_username() for user in
+                     self.session.usermanager.users)
+        elif words[-1] in USERGROUP_OPTIONS:
+            names = (user_group.get_name() for user_group in
+                     self.session.groupmanager.user_groups)
+        elif words[-1] in GROUP_OPTIONS:
+            names = {group for user_group in
+                     self.session.groupmanager.user_groups
+                     for group in user_group.get_groups()}
+        else:
+            return []
+        return sorted(name for name in names if str(name).startswith(text))
+
+    def complete(self, text, state):
+        """
+        The readline completer function.
+        """
+        if state == 0:
+            self._matches = self.candidates(
+                readline.get_line_buffer()[:readline.get_endidx()], text)
+        if state < len(self._matches):
+            return self._matches[state]
+        return None
+
+
+def run_shell(group, session, read_line=input):
+    """
+    Reads commands until exit or end of input and runs them with the
+    managers of session. Everything that was changed is written once on
+    commit and once more when the shell exits.
+    :param group: The click group holding the commands.
+    :param session: The Session to run the commands in.
+    :param read_line: Optional. The function used to read a line.
+    """
+    commands = [name for name in group.commands if name != "shell"]
+    if readline is not None:
+        readline.set_completer(Completer(commands, session).complete)
+        readline.set_completer_delims(" \t")
+        readline.parse_and_bind("tab: complete")
+
+    session.begin()
+    try:
+        while True:
+            try:
+                line = read_line(PROMPT)
+            except EOFError:
+                click.echo()
+                break
+            except KeyboardInterrupt:
+                click.echo()
+                continue
+
+            try:
+                arguments = shlex.split(line)
+            except ValueError as error:
+                click.secho(str(error), fg="red", bold=True)
+                continue
+            if not arguments:
+                continue
+            if arguments[0] in EXIT_COMMANDS:
+                break
+            if arguments[0] == COMMIT_COMMAND:
+                session.commit()
+                click.secho("Committed all changes.", fg="green", bold=True)
+                continue
+            if arguments[0] == HELP_COMMAND:
+                click.echo("Commands: " + ", ".join(sorted(commands)))
+                click.echo("Type '<command> --help' for its options, "
+                           "'commit' to save and 'exit' to save and quit.")
+                continue
+            if arguments[0] not in commands:
+                click.secho("Unknown command " + arguments[0] + "!",
+                            fg="red", bold=True)
+                continue
+
+            try:
+                group.main(arguments, prog_name="", standalone_mode=False,
+                           obj=session)
+            except click.ClickException as error:
+                error.show()
+            except (click.Abort, SystemExit, KeyboardInterrupt):
+                click.echo()
+    finally:
+        session.close()
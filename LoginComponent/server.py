@@ -0,0 +1,328 @@
+"""
+Server that keeps the users and usergroups loaded and answers password
+checks, lookups and changes over a Unix socket, so Home Assistant does not
+have to read the yaml configuration files for every request.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import stat
+
+from LoginComponent.asyncmanager import AsyncUserGroupManager, \
+    AsyncUserManager
+from LoginComponent.client import DEFAULT_SOCKET
+from LoginComponent.verifycache import VerificationCache
+from LoginComponent.watcher import FileWatcher
+
+_LOGGER = logging.getLogger(__name__)
+
+# Requests longer than this are refused.
+MAX_REQUEST_SIZE = 64 * 1024
+
+
+def _user_to_dict(user):
+    if user is None:
+        return None
+    return {"username": user.get_username(), "password": user.get_password()}
+
+
+def _usergroup_to_dict(user_group):
+    if user_group is None:
+        return None
+    return {"name": user_group.get_name(),
+            "users": list(user_group.get_users()),
+            "groups": list(user_group.get_groups())}
+
+
+class Server:
+    """
+    Answers requests with a UserManager and UserGroupManager that stay
+    loaded. Lookups are answered directly on the event loop, while changes
+    are made and saved in an executor, one at a time, before they are
+    answered. Changes other processes make to the yaml configuration files
+    can be picked up while the server runs.
+    """
+
+    def __init__(self, usermanager=None, groupmanager=None, executor=None,
+                 on_change=None):
+        """
+        :param usermanager: Optional. The UserManager to use. It is given a
+        VerificationCache if it has none, since the same users log in over
+        and over.
+        :param groupmanager: Optional. The UserGroupManager to use.
+        :param executor: Optional. The executor to make changes in.
+        :param on_change: Optional. A function called with the set of
+        changed usernames and the set of changed usergroup names after the
+        yaml configuration files changed on disk.
+        """
+        self.usermanager = AsyncUserManager(usermanager, executor)
+        if self.usermanager.manager.verify_cache is None:
+            self.usermanager.manager.verify_cache = VerificationCache()
+        self.groupmanager = AsyncUserGroupManager(groupmanager, executor)
+        self.on_change = on_change
+        self.watcher = None
+        self._handlers = {
+            "verify": self.verify,
+            "groups_for": self.groups_for,
+            "users": self.users,
+            "get_user": self.get_user,
+            "search_users": self.search_users,
+            "usergroups": self.usergroups,
+            "get_usergroup": self.get_usergroup,
+            "search_usergroups": self.search_usergroups,
+            "create_user": self.create_user,
+            "delete_user": self.delete_user,
+            "update_user_username": self.update_user_username,
+            "update_user_password": self.update_user_password,
+            "create_group": self.create_group,
+            "delete_usergroup": self.delete_usergroup,
+            "update_usergroup_name": self.update_usergroup_name,
+            "add_user_to_usergroup": self.add_user_to_usergroup,
+            "remove_user_from_usergroup": self.remove_user_from_usergroup,
+            "add_group_to_usergroup": self.add_group_to_usergroup,
+            "remove_group_from_usergroup": self.remove_group_from_usergroup,
+            "update_user_in_usergroup": self.update_user_in_usergroup,
+        }
+
+    async def verify(self, username, password):
+        """
+        Checks the password of a user.
+        :return: Returns true if the password is correct and false if not.
+        """
+        return await self.usermanager.verify_password(username, password)
+
+    def groups_for(self, username):
+        return [_usergroup_to_dict(user_group) for user_group in
+                self.groupmanager.get_usergroups_for_user(username)]
+
+    def users(self):
+        return [_user_to_dict(user) for user in self.usermanager.users]
+
+    def get_user(self, username):
+        return _user_to_dict(self.usermanager.get_user(username))
+
+    def search_users(self, pattern=None, offset=0, limit=None):
+        return [_user_to_dict(user) for user in
+                self.usermanager.search_users(pattern, offset, limit)]
+
+    def usergroups(self):
+        return [_usergroup_to_dict(user_group) for user_group in
+                self.groupmanager.user_groups]
+
+    def get_usergroup(self, name):
+        return _usergroup_to_dict(self.groupmanager.get_usergroup(name))
+
+    def search_usergroups(self, pattern=None, offset=0, limit=None):
+        return [_usergroup_to_dict(user_group) for user_group in
+                self.groupmanager.search_usergroups(pattern, offset, limit)]
+
+    async def create_user(self, username, password):
+        return await self.usermanager.create_user(username, password)
+
+    async def delete_user(self, username):
+        return await self.usermanager.delete_user(username, self.groupmanager)
+
+    async def update_user_username(self, old_username, new_username):
+        return await self.usermanager.update_user_username(old_username,
+                                                           new_username)
+
+    async def update_user_password(self, username, password):
+        return await self.usermanager.update_user_password(username, password)
+
+    async def create_group(self, name):
+        return await self.groupmanager.create_group(name)
+
+    async def delete_usergroup(self, name):
+        return await self.groupmanager.delete_usergroup(name)
+
+    async def update_usergroup_name(self, name, new_name):
+        return await self.groupmanager.update_usergroup_name(name, new_name)
+
+    async def add_user_to_usergroup(self, username, name):
+        user_group = self.groupmanager.get_usergroup(name)
+        return user_group is not None and \
+            await self.groupmanager.add_user_to_usergroup(username, user_group,
+                                                          self.usermanager)
+
+    async def remove_user_from_usergroup(self, username, name):
+        user_group = self.groupmanager.get_usergroup(name)
+        return user_group is not None and \
+            await self.groupmanager.remove_user_from_usergroup(username,
+                                                               user_group)
+
+    async def add_group_to_usergroup(self, groupname, name):
+        user_group = self.groupmanager.get_usergroup(name)
+        return user_group is not None and \
+            await self.groupmanager.add_group_to_usergroup(groupname,
+                                                           user_group)
+
+    async def remove_group_from_usergroup(self, groupname, name):
+        user_group = self.groupmanager.get_usergroup(name)
+        return user_group is not None and \
+            await self.groupmanager.remove_group_from_usergroup(groupname,
+                                                                user_group)
+
+    async def update_user_in_usergroup(self, old_username, new_username):
+        return await self.groupmanager.update_user_in_usergroup(
+            old_username, new_username, self.usermanager)
+
+    def watched_files(self):
+        """
+        Returns the files the users and usergroups are read from.
+        :return: A dict from the absolute path of each file to the list of
+        async managers that read it.
+        """
+        files = {}
+        for manager in (self.usermanager, self.groupmanager):
+            for path in manager.manager.storage.paths():
+                files.setdefault(os.path.abspath(path), []).append(manager)
+        return files
+
+    async def reload(self, paths):
+        """
+        Reloads the managers whose files changed and calls on_change if
+        anything was different.
+        :param paths: The absolute paths of the changed files.
+        :return: A tuple of the set of changed usernames and the set of
+        changed usergroup names.
+        """
+        files = self.watched_files()
+        managers = [manager for path in paths
+                    for manager in files.get(path, ())]
+        changed_users = await self.usermanager.reload() \
+            if self.usermanager in managers else set()
+        changed_groups = await self.groupmanager.reload() \
+            if self.groupmanager in managers else set()
+        if changed_users or changed_groups:
+            _LOGGER.info("Reloaded %d users and %d usergroups",
+                         len(changed_users), len(changed_groups))
+            if self.on_change is not None:
+                self.on_change(changed_users, changed_groups)
+        return changed_users, changed_groups
+
+    def watch(self):
+        """
+        Starts reloading the users and usergroups when their files change.
+        Must be called from the event loop the server runs on.
+        """
+        loop = asyncio.get_running_loop()
+
+        def changed(paths):
+            loop.call_soon_threadsafe(asyncio.ensure_future,
+                                      self.reload(paths))
+        self.watcher = FileWatcher(list(self.watched_files()), changed)
+        self.watcher.start()
+
+    def stop_watching(self):
+        """
+        Stops reloading the users and usergroups when their files change.
+        """
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    async def handle(self, request):
+        """
+        Answers one request.
+        :param request: The decoded request, a dict with the operation in
+        "op" and its parameters as the other keys.
+        :return: A dict with either the "result" or an "error".
+        """
+        if not isinstance(request, dict) or \
+                not isinstance(request.get("op"), str):
+            return {"error": "A request needs an \"op\" key!"}
+        params = dict(request)
+        op = params.pop("op")
+        handler = self._handlers.get(op)
+        if handler is None:
+            return {"error": "Unknown operation " + op + "!"}
+        try:
+            inspect.signature(handler).bind(**params)
+        except TypeError as error:
+            return {"error": "Invalid parameters for " + op + ": " +
+                    str(error)}
+        try:
+            result = handler(**params)
+            if inspect.isawaitable(result):
+                result = await result
+            return {"result": result}
+        except Exception as error:
+            _LOGGER.exception("Could not handle %s", op)
+            return {"error": str(error)}
+
+    async def handle_connection(self, reader, writer):
+        """
+        Answers the requests of one client until it disconnects.
+        """
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(b'{"error": "The request is too long!"}\n')
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    response = {"error": "The request is not valid JSON!"}
+                else:
+                    response = await self.handle(request)
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, path=DEFAULT_SOCKET, watch=False):
+        """
+        Loads the users and usergroups and starts listening on path. A
+        socket left behind by a server that did not stop cleanly is
+        replaced.
+        :param path: Optional. The path of the Unix socket.
+        :param watch: Optional. Whether to reload the users and usergroups
+        when their files change.
+        :return: The asyncio server.
+        """
+        await self.usermanager.load()
+        await self.groupmanager.load()
+        if watch:
+            self.watch()
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        return await asyncio.start_unix_server(self.handle_connection,
+                                               path=path,
+                                               limit=MAX_REQUEST_SIZE)
+
+
+def serve(path=DEFAULT_SOCKET, usermanager=None, groupmanager=None,
+          watch=True):
+    """
+    Runs a server until it is interrupted and removes its socket afterwards.
+    :param path: Optional. The path of the Unix socket.
+    :param watch: Optional. Whether to reload the users and usergroups when
+    their files change.
+    """
+    server = Server(usermanager, groupmanager)
+
+    async def run():
+        listener = await server.start(path, watch)
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop_watching()
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,299 @@
+"""
+SQLite storage backends for UserManager and UserGroupManager. Users,
+usergroups, their members and their Home Assistant groups are kept in
+indexed tables of one database, so saving a mutation changes only the rows
+it is about instead of rewriting every user or usergroup.
+"""
+
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from LoginComponent import completion
+
+_LOGGER = logging.getLogger(__name__)
+DEFAULT_DATABASE = "user-management.db"
+BUSY_TIMEOUT = 30.0
+USERS = "users"
+USERGROUPS = "usergroups"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    kind TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usergroups (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    id INTEGER PRIMARY KEY,
+    usergroup_id INTEGER NOT NULL
+        REFERENCES usergroups (id) ON DELETE CASCADE,
+    username TEXT NOT NULL,
+    UNIQUE (usergroup_id, username)
+);
+CREATE INDEX IF NOT EXISTS memberships_username ON memberships (username);
+CREATE TABLE IF NOT EXISTS grants (
+    id INTEGER PRIMARY KEY,
+    usergroup_id INTEGER NOT NULL
+        REFERENCES usergroups (id) ON DELETE CASCADE,
+    ha_group TEXT NOT NULL,
+    UNIQUE (usergroup_id, ha_group)
+);
+"""
+
+USERGROUP_ID = "(SELECT id FROM usergroups WHERE name = ?)"
+
+
+class _SqliteStorage:
+    """
+    Keeps one kind of data in a SQLite database in WAL mode, so readers are
+    not blocked by a writer. Every kind has a generation in the meta table
+    that is incremented on each save, which tells whether another process
+    saved since the data was last read here.
+    """
+
+    kind = None
+
+    def __init__(self, path=DEFAULT_DATABASE):
+        """
+        :param path: Optional. The path of the database file.
+        """
+        self.path = path
+        self.names_path = completion.names_path(path + "-" + self.kind)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._generation = None
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT,
+                                          isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute("INSERT OR IGNORE INTO meta VALUES (?, 0)",
+                                (self.kind,))
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.connection.close()
+
+    def _read_generation(self):
+        return self.connection.execute(
+            "SELECT generation FROM meta WHERE kind = ?",
+            (self.kind,)).fetchone()[0]
+
+    def _increment(self):
+        self.connection.execute(
+            "UPDATE meta SET generation = generation + 1 WHERE kind = ?",
+            (self.kind,))
+        self._generation = self._read_generation()
+
+    def read(self, apply_record):
+        """
+        Reads all rows in one read transaction and remembers which
+        generation was read.
+        :param apply_record: Unused, there is no journal to replay.
+        :return: The dict in the shape of the yaml file.
+        """
+        with self._lock, self.transaction(write=False):
+            self._generation = self._read_generation()
+            return self._read_rows()
+
+    @contextmanager
+    def transaction(self, write=True):
+        """
+        Runs the with block in a transaction, which is committed when the
+        outermost transaction exits and rolled back on an exception.
+        :param write: Optional. Whether the outermost transaction should
+        keep other processes from writing until it ends.
+        :return: Yields true if another process saved since the data was
+        last read or saved here, and false if not.
+        """
+        with self._lock:
+            if self._depth == 0:
+                self.connection.execute("BEGIN IMMEDIATE" if write else
+                                        "BEGIN")
+            self._depth += 1
+            try:
+                yield self._read_generation() != self._generation
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.connection.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.connection.execute("COMMIT")
+
+    def commit(self, records, write_all):
+        """
+        Stores the records with one statement each.
+        :param records: The journal records describing the mutations.
+        :param write_all: Unused, the rows are changed one by one.
+        """
+        with self.transaction():
+            for record in records:
+                statements = self._statements(record)
+                if statements is None:
+                    _LOGGER.warning("Ignoring unknown journal record %s",
+                                    record["op"])
+                    continue
+                for statement, parameters in statements:
+                    self.connection.execute(statement, parameters)
+            self._increment()
+
+    def write(self, data):
+        """
+        Replaces all rows with data.
+        :param data: The dict in the shape of the yaml file.
+        """
+        with self.transaction():
+            self._write_rows(data)
+            self._increment()
+
+    def paths(self):
+        """
+        Returns the files other processes write to when they save.
+        :return: A list of paths.
+        """
+        return [self.path, self.path + "-wal"]
+
+    def _read_rows(self):
+        raise NotImplementedError
+
+    def _write_rows(self, data):
+        raise NotImplementedError
+
+    def _statements(self, record):
+        raise NotImplementedError
+
+
+class SqliteUserStorage(_SqliteStorage):
+    """
+    Keeps the users of a UserManager in the users table.
+    """
+
+    kind = USERS
+
+    def _read_rows(self):
+        return {username: {"password": password} for username, password in
+                self.connection.execute(
+                    "SELECT username, password FROM users ORDER BY id")}
+
+    def _write_rows(self, data):
+        self.connection.execute("DELETE FROM users")
+        self.connection.executemany(
+            "INSERT INTO users (username, password) VALUES (?, ?)",
+            [(username, user_information["password"]) for
+             username, user_information in data.items()])
+
+    def _statements(self, record):
+        op = record["op"]
+        username = record["username"]
+        if op == "create":
+            # Fails instead of overwriting a user created by another process.
+            return [("INSERT INTO users (username, password) VALUES (?, ?)",
+                     (username, record["password"]))]
+        if op == "password":
+            # A user deleted by another process is not created again.
+            return [("UPDATE users SET password = ? WHERE username = ?",
+                     (record["password"], username))]
+        if op == "rehash":
+            return [("UPDATE users SET password = ? WHERE username = ? AND "
+                     "password = ?", (record["password"], username,
+                                      record["previous"]))]
+        if op == "delete":
+            return [("DELETE FROM users WHERE username = ?", (username,))]
+        if op == "rename":
+            return [("UPDATE OR IGNORE users SET username = ? "
+                     "WHERE username = ?", (record["new_username"],
+                                            username))]
+        return None
+
+
+class SqliteGroupStorage(_SqliteStorage):
+    """
+    Keeps the usergroups of a UserGroupManager in the usergroups table, with
+    their users in the memberships table and their Home Assistant groups in
+    the grants table.
+    """
+
+    kind = USERGROUPS
+
+    def _read_rows(self):
+        groups_dict = {}
+        ids = {}
+        for usergroup_id, name in self.connection.execute(
+                "SELECT id, name FROM usergroups ORDER BY id"):
+            groups_dict[name] = {"users": [], "groups": []}
+            ids[usergroup_id] = groups_dict[name]
+        for usergroup_id, username in self.connection.execute(
+                "SELECT usergroup_id, username FROM memberships ORDER BY id"):
+            ids[usergroup_id]["users"].append(username)
+        for usergroup_id, ha_group in self.connection.execute(
+                "SELECT usergroup_id, ha_group FROM grants ORDER BY id"):
+            ids[usergroup_id]["groups"].append(ha_group)
+        return groups_dict
+
+    def _write_rows(self, data):
+        self.connection.execute("DELETE FROM usergroups")
+        for name, user_group in data.items():
+            usergroup_id = self.connection.execute(
+                "INSERT INTO usergroups (name) VALUES (?)", (name,)).lastrowid
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO memberships (usergroup_id, username) "
+                "VALUES (?, ?)", [(usergroup_id, username) for username in
+                                  user_group["users"]])
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO grants (usergroup_id, ha_group) "
+                "VALUES (?, ?)", [(usergroup_id, group) for group in
+                                  user_group["groups"]])
+
+    def _statements(self, record):
+        op = record["op"]
+        name = record["usergroup"]
+        if op == "create":
+            # Fails instead of taking over a usergroup created by another
+            # process.
+            return [("INSERT INTO usergroups (name) VALUES (?)", (name,))]
+        if op == "delete":
+            return [("DELETE FROM usergroups WHERE name = ?", (name,))]
+        if op == "rename":
+            return [("UPDATE OR IGNORE usergroups SET name = ? "
+                     "WHERE name = ?", (record["new_name"], name))]
+        if op == "add_user":
+            return [("INSERT OR IGNORE INTO memberships (usergroup_id, "
+                     "username) SELECT id, ? FROM usergroups WHERE name = ?",
+                     (record["username"], name))]
+        if op == "remove_user":
+            return [("DELETE FROM memberships WHERE usergroup_id = " +
+                     USERGROUP_ID + " AND username = ?",
+                     (name, record["username"]))]
+        if op == "rename_user":
+            # If the new username is a member already, the update is ignored
+            # and the old username is removed like in the yaml file.
+            return [("UPDATE OR IGNORE memberships SET username = ? WHERE "
+                     "usergroup_id = " + USERGROUP_ID + " AND username = ?",
+                     (record["new_username"], name, record["username"])),
+                    ("DELETE FROM memberships WHERE usergroup_id = " +
+                     USERGROUP_ID + " AND username = ?",
+                     (name, record["username"]))]
+        if op == "add_group":
+            return [("INSERT OR IGNORE INTO grants (usergroup_id, ha_group) "
+                     "SELECT id, ? FROM usergroups WHERE name = ?",
+                     (record["group"], name))]
+        if op == "remove_group":
+            return [("DELETE FROM grants WHERE usergroup_id = " +
+                     USERGROUP_ID + " AND ha_group = ?",
+                     (name, record["group"]))]
+        return None
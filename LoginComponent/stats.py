@@ -0,0 +1,149 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+PHASES = ("load", "convert", "mutate", "serialize", "write")
+
+
+class Stats:
+    """
+    Records how often and how long the managers spend in each phase of
+    their work. Phases can be nested; time spent in a nested phase only
+    counts towards the nested phase. Nesting is tracked per thread, so
+    managers working in different threads do not mix up their phases.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+        self._subscribers = []
+        self._local = threading.local()
+
+    @property
+    def _active(self):
+        """
+        The phases that are running in the current thread, innermost last.
+        """
+        try:
+            return self._local.active
+        except AttributeError:
+            self._local.active = []
+            return self._local.active
+
+    @property
+    def _depths(self):
+        """
+        How many outermost_phase blocks of each phase are running in the
+        current thread.
+        """
+        try:
+            return self._local.depths
+        except AttributeError:
+            self._local.depths = {}
+            return self._local.depths
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times the with block as the given phase.
+        :param name: The name of the phase, usually one of PHASES.
+        """
+        entry = [time.perf_counter(), 0.0]
+        self._active.append(entry)
+        try:
+            yield
+        finally:
+            self._active.pop()
+            elapsed = time.perf_counter() - entry[0]
+            if self._active:
+                self._active[-1][1] += elapsed
+            self.record(name, elapsed - entry[1])
+
+    @contextmanager
+    def outermost_phase(self, name):
+        """
+        Times the with block as the given phase unless it runs inside
+        another outermost_phase block of the same phase in this thread, so
+        a mutation calling other mutations is counted once.
+        :param name: The name of the phase, usually one of PHASES.
+        """
+        depths = self._depths
+        depth = depths.get(name, 0)
+        depths[name] = depth + 1
+        try:
+            if depth:
+                yield
+            else:
+                with self.phase(name):
+                    yield
+        finally:
+            depths[name] = depth
+
+    def record(self, name, seconds):
+        """
+        Adds a duration to a phase and notifies the subscribers.
+        :param name: The name of the phase.
+        :param seconds: The time spent in the phase.
+        """
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+        for subscriber in list(self._subscribers):
+            subscriber(name, seconds)
+
+    def subscribe(self, callback):
+        """
+        Calls callback with the phase name and duration in seconds every
+        time a phase is recorded.
+        :param callback: The function to call.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        Stops calling a callback added with subscribe.
+        :param callback: The function to stop calling.
+        """
+        self._subscribers.remove(callback)
+
+    def reset(self):
+        """
+        Forgets all recorded durations and counts.
+        """
+        self.durations = {}
+        self.counts = {}
+
+    def report(self):
+        """
+        Returns a table with the count and time spent per phase.
+        :return: The table as a string.
+        """
+        names = [name for name in PHASES if name in self.counts] + \
+            sorted(name for name in self.counts if name not in PHASES)
+        lines = ["{:<10} {:>7} {:>11}".format("phase", "count", "total (ms)")]
+        for name in names:
+            lines.append("{:<10} {:>7} {:>11.3f}".format(
+                name, self.counts[name], self.durations[name] * 1000))
+        lines.append("{:<10} {:>7} {:>11.3f}".format(
+            "total", sum(self.counts.values()),
+            sum(self.durations.values()) * 1000))
+        return "\n".join(lines)
+
+
+STATS = Stats()
+
+
+def timed(name):
+    """
+    Decorates a manager method so that calls to it are timed as the given
+    phase in the manager's stats. Calls made by another method timed as
+    the same phase are part of the outer call.
+    :param name: The name of the phase.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.stats.outermost_phase(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,313 @@
+"""
+Storage backends for UserManager and UserGroupManager. A backend reads all
+users or usergroups as a dict shaped like the contents of users.yaml or
+groups.yaml, and saves mutations given as journal records. YamlStorage is
+the default, ShardedYamlStorage splits the yaml over a directory of files
+and LoginComponent.sqlitestorage offers an indexed SQLite backend.
+
+A backend offers:
+
+- read(apply_record): returns the dict and remembers what was read.
+- transaction(): a context manager that keeps other processes from saving
+  and yields true if another process saved since the last read.
+- commit(records, write_all): saves the records of one or more mutations,
+  calling write_all if the backend prefers to rewrite everything.
+- write(data): replaces everything that is stored with data.
+- paths(): the files to watch for changes made by other processes.
+- names_path: the name index file the manager keeps for shell completion.
+- close(): releases what the backend holds open.
+"""
+
+import logging
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from LoginComponent import completion, yamlio
+from LoginComponent.filelock import FileLock
+from LoginComponent.stats import STATS
+
+_LOGGER = logging.getLogger(__name__)
+MANIFEST_FILE = "manifest.yaml"
+MANIFEST_FORMAT = 1
+SHARD_FILE = "shard-{:03d}.yaml"
+DEFAULT_SHARDS = 16
+LOAD_WORKERS = 4
+
+
+class YamlStorage:
+    """
+    Keeps users or usergroups in a yaml file, optionally with a Journal
+    that mutations are appended to instead of rewriting the file. The file
+    is locked between processes with a FileLock.
+    """
+
+    def __init__(self, yaml_file, journal=None, stats=None):
+        """
+        :param yaml_file: The path of the yaml file.
+        :param journal: Optional. A Journal that mutations are appended to
+        instead of rewriting the yaml file on every change.
+        :param stats: Optional. The Stats to record timings in. Defaults to
+        the shared STATS.
+        """
+        self.path = yaml_file
+        self.names_path = completion.names_path(yaml_file)
+        self.journal = journal
+        self.stats = STATS if stats is None else stats
+        self.lock = FileLock(yaml_file)
+        self._generation = None
+
+    def read(self, apply_record):
+        """
+        Reads the yaml file and the journal under the shared lock and
+        remembers which generation was read.
+        :param apply_record: The function applying a journal record to the
+        dict.
+        :return: The dict read from the yaml file.
+        """
+        with self.lock.shared():
+            self._generation = self.lock.generation()
+            data = yamlio.read_yaml_file(self.path)
+            if data is None:
+                data = {}
+            if self.journal is not None:
+                for record in self.journal.read():
+                    apply_record(data, record)
+        return data
+
+    @contextmanager
+    def transaction(self):
+        """
+        Holds the exclusive lock for the with block.
+        :return: Yields true if another process wrote the yaml file since it
+        was last read or written here, and false if not.
+        """
+        with self.lock.exclusive():
+            yield self.lock.generation() != self._generation
+
+    def commit(self, records, write_all):
+        """
+        Appends the records to the journal, or calls write_all if no journal
+        is used or the journal has grown too large.
+        :param records: The journal records describing the mutations.
+        :param write_all: The function writing all data with write().
+        """
+        if self.journal is None:
+            write_all()
+            return
+
+        with self.lock.exclusive():
+            with self.stats.phase("write"):
+                self.journal.append(records)
+            self._generation = self.lock.increment()
+        if self.journal.needs_compaction():
+            write_all()
+
+    def write(self, data):
+        """
+        Replaces the yaml file with data. If a journal is used, it is
+        emptied once the new file is in place, since it then contains all
+        of its records.
+        :param data: The dict to write.
+        """
+        with self.stats.phase("serialize"):
+            content = yamlio.dump_yaml(data)
+        with self.lock.exclusive():
+            with self.stats.phase("write"):
+                yamlio.write_yaml_content(self.path, content, data)
+            if self.journal is not None:
+                self.journal.clear()
+            self._generation = self.lock.increment()
+
+    def paths(self):
+        """
+        Returns the files other processes write to when they save.
+        :return: A list of paths.
+        """
+        paths = [self.path]
+        if self.journal is not None:
+            paths.append(self.journal.path)
+        return paths
+
+    def close(self):
+        """
+        Does nothing, the files are only open while they are read or
+        written.
+        """
+
+
+def shard_of(name, shards):
+    """
+    Returns the shard a user or usergroup is kept in. The crc32 of the name
+    is used since, unlike hash(), it is the same in every process.
+    :param name: The username or usergroup name.
+    :param shards: The number of shards.
+    :return: The index of the shard.
+    """
+    return zlib.crc32(name.encode("utf-8")) % shards
+
+
+class ShardedYamlStorage:
+    """
+    Keeps users or usergroups in a directory of yaml files, the shards,
+    with a manifest recording how many shards there are. Every user or
+    usergroup is kept in the shard given by shard_of, so a mutation only
+    rewrites the shards of the names it is about. The shards are read in
+    parallel, and the order of the users or usergroups is the order of the
+    shards rather than the order they were created in. The directory is
+    locked between processes with a FileLock beside the manifest.
+    """
+
+    def __init__(self, directory, shards=DEFAULT_SHARDS, stats=None,
+                 workers=LOAD_WORKERS):
+        """
+        :param directory: The directory of the manifest and the shards.
+        :param shards: Optional. The number of shards to create if the
+        directory has no manifest yet. The manifest wins otherwise.
+        :param stats: Optional. The Stats to record timings in. Defaults to
+        the shared STATS.
+        :param workers: Optional. The number of threads reading shards.
+        """
+        self.directory = directory
+        self.names_path = completion.names_path(os.path.normpath(directory))
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.stats = STATS if stats is None else stats
+        self.workers = workers
+        os.makedirs(directory, exist_ok=True)
+        self.lock = FileLock(self.manifest_path)
+        self._generation = None
+        self._shards = None
+        self._apply_record = None
+        manifest = yamlio.read_yaml_file(self.manifest_path, cache=False)
+        if manifest is not None:
+            if manifest.get("format") != MANIFEST_FORMAT:
+                raise ValueError("Unknown manifest format in " +
+                                 self.manifest_path)
+            if manifest["shards"] != shards:
+                _LOGGER.info("%s has %d shards", directory,
+                             manifest["shards"])
+            shards = manifest["shards"]
+        self.shards = shards
+
+    def shard_path(self, index):
+        """
+        Returns the path of a shard.
+        :param index: The index of the shard.
+        """
+        return os.path.join(self.directory, SHARD_FILE.format(index))
+
+    def read(self, apply_record):
+        """
+        Reads all shards under the shared lock and remembers them and which
+        generation was read.
+        :param apply_record: The function applying a journal record to the
+        dict, used when saving mutations.
+        :return: The dict of all shards.
+        """
+        self._apply_record = apply_record
+        paths = [self.shard_path(index) for index in range(self.shards)]
+        with self.lock.shared():
+            self._generation = self.lock.generation()
+            with ThreadPoolExecutor(self.workers) as executor:
+                shards = [shard or {} for shard in
+                          executor.map(yamlio.read_yaml_file, paths)]
+        self._shards = shards
+        data = {}
+        for shard in shards:
+            data.update(shard)
+        return data
+
+    @contextmanager
+    def transaction(self):
+        """
+        Holds the exclusive lock for the with block.
+        :return: Yields true if another process wrote a shard since they
+        were last read or written here, and false if not.
+        """
+        with self.lock.exclusive():
+            yield self.lock.generation() != self._generation
+
+    def commit(self, records, write_all):
+        """
+        Applies the records to the shards they are about and rewrites only
+        those shards. If the shards were not read yet, write_all is called
+        instead.
+        :param records: The journal records describing the mutations.
+        :param write_all: The function writing all data with write().
+        """
+        if self._shards is None:
+            write_all()
+            return
+
+        changed = set()
+        for record in records:
+            names = [record["usergroup"] if "usergroup" in record else
+                     record["username"]]
+            if record["op"] == "rename":
+                names.append(record.get("new_name",
+                                        record.get("new_username")))
+            indexes = sorted({shard_of(name, self.shards) for name in names})
+            if len(indexes) == 1:
+                self._apply_record(self._shards[indexes[0]], record)
+            else:
+                # A rename can move a name to another shard, so the record
+                # is applied to the shards combined and they are split again.
+                combined = {}
+                for index in indexes:
+                    combined.update(self._shards[index])
+                    self._shards[index] = {}
+                self._apply_record(combined, record)
+                for name, value in combined.items():
+                    self._shards[shard_of(name, self.shards)][name] = value
+            changed.update(indexes)
+        self._write_shards(sorted(changed))
+
+    def write(self, data):
+        """
+        Splits data into shards and rewrites the shards that changed.
+        :param data: The dict to write.
+        """
+        shards = [{} for _ in range(self.shards)]
+        for name, value in data.items():
+            shards[shard_of(name, self.shards)][name] = value
+        if self._shards is None:
+            changed = range(self.shards)
+        else:
+            changed = [index for index in range(self.shards)
+                       if shards[index] != self._shards[index]]
+        self._shards = shards
+        self._write_shards(changed)
+
+    def _write_shards(self, indexes):
+        """
+        Writes the given shards, and the manifest if there is none yet.
+        :param indexes: The indexes of the shards to write.
+        """
+        with self.stats.phase("serialize"):
+            contents = [(index, yamlio.dump_yaml(self._shards[index]))
+                        for index in indexes]
+        with self.lock.exclusive():
+            with self.stats.phase("write"):
+                if not os.path.isfile(self.manifest_path):
+                    yamlio.write_yaml_file(self.manifest_path, {
+                        "format": MANIFEST_FORMAT, "shards": self.shards},
+                        cache=False)
+                for index, content in contents:
+                    yamlio.write_yaml_content(self.shard_path(index), content,
+                                              self._shards[index])
+            self._generation = self.lock.increment()
+
+    def paths(self):
+        """
+        Returns the files other processes write to when they save.
+        :return: A list of paths.
+        """
+        return [self.manifest_path] + [self.shard_path(index) for index in
+                                       range(self.shards)]
+
+    def close(self):
+        """
+        Does nothing, the files are only open while they are read or
+        written.
+        """
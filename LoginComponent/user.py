@@ -1,13 +1,25 @@
-import hashlib
+import sys
+
+from LoginComponent import passwordhash
+
+SHA512_DIGEST_SIZE = 64
 
 
 class User:
-    """Stores the username and password of a user."""
+    """
+    Stores the username and password of a user. Passwords are hashed with
+    PBKDF2, see passwordhash. SHA-512 password hashes of older versions are
+    kept as their raw 64 byte digest and only turned into hex when the
+    password is read.
+    """
 
-    def __init__(self, username, password, hash_password=False):
+    __slots__ = ("username", "_password")
+
+    def __init__(self, username, password, hash_password=False,
+                 hasher=None):
         self.set_username(username)
         if hash_password:
-            self.set_password_and_hash(password)
+            self.set_password_and_hash(password, hasher)
         else:
             self.set_password(password)
 
@@ -23,7 +35,9 @@ class User:
         Returns the hashed password of this user.
         :return:
         """
-        return self.password
+        if isinstance(self._password, bytes):
+            return self._password.hex()
+        return self._password
 
     def set_username(self, new_username):
         """
@@ -31,22 +45,48 @@ class User:
         :param new_username: The new username of this user.
         :return:
         """
+        if isinstance(new_username, str):
+            new_username = sys.intern(new_username)
         self.username = new_username
 
     def set_password(self, new_password):
         """
-        Sets the password of this user to the new_password.
+        Sets the password of this user to the new_password. A hex encoded
+        SHA-512 hash is stored as its raw digest.
         :param new_password: The new password of this user.
         :return:
         """
-        self.password = new_password
+        if isinstance(new_password, str) and \
+                len(new_password) == 2 * SHA512_DIGEST_SIZE:
+            try:
+                digest = bytes.fromhex(new_password)
+            except ValueError:
+                digest = None
+            if digest is not None and len(digest) == SHA512_DIGEST_SIZE \
+                    and digest.hex() == new_password:
+                new_password = digest
+        self._password = new_password
+
+    password = property(get_password, set_password)
 
-    def set_password_and_hash(self, new_password):
+    def set_password_and_hash(self, new_password, hasher=None):
         """
-        Sets the password of this user and hashes it with sha512. Before
+        Sets the password of this user and hashes it with a new salt. Before
         hashing the password is converted to a string and encoded utf-8.
         :param new_password: The new password to be hashed.
+        :param hasher: Optional. The PasswordHasher to use. Defaults to
+        passwordhash.DEFAULT_HASHER.
         :return:
         """
-        self.password = hashlib.sha512(str(new_password).encode(
-                "utf-8")).hexdigest()
+        if hasher is None:
+            hasher = passwordhash.DEFAULT_HASHER
+        self._password = hasher.hash(new_password)
+
+    def check_password(self, password):
+        """
+        Checks a password against the hashed password of this user in
+        constant time.
+        :param password: The password to check.
+        :return: Returns true if the password is correct and false if not.
+        """
+        return passwordhash.verify(password, self._password)
@@ -1,16 +1,89 @@
+import sys
+from collections.abc import Sequence
+
+
+class MemberView(Sequence):
+    """
+    Read-only sequence view of the members of a UserGroup. Membership tests
+    and len() take constant time, indexing takes linear time.
+    """
+
+    __slots__ = ("_members",)
+
+    def __init__(self, members):
+        self._members = members
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, member):
+        try:
+            return member in self._members
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def __getitem__(self, index):
+        return list(self._members)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (MemberView, list, tuple)):
+            return len(self) == len(other) and \
+                all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self._members))
+
+
+def _intern(member):
+    """
+    Interns string members so usergroups and users share the same strings.
+    """
+    if isinstance(member, str):
+        return sys.intern(member)
+    return member
+
+
 class UserGroup:
-    """Stores users and the Home Assistant groups they may access."""
+    """
+    Stores users and the Home Assistant groups they may access. Both are
+    kept as insertion ordered sets.
+    """
+
+    __slots__ = ("name", "_users", "_groups")
 
     def __init__(self, name, users=None, groups=None):
         self.name = name
-        if users is None:
-            self.users = []
-        else:
-            self.users = users
-        if groups is None:
-            self.groups = []
-        else:
-            self.groups = groups
+        self.users = () if users is None else users
+        self.groups = () if groups is None else groups
+
+    @property
+    def users(self):
+        """
+        The users in this usergroup, in the order they were added.
+        """
+        return MemberView(self._users)
+
+    @users.setter
+    def users(self, users):
+        self._users = dict.fromkeys(_intern(user) for user in users)
+
+    @property
+    def groups(self):
+        """
+        The Home Assistant groups in this usergroup, in the order they were
+        added.
+        """
+        return MemberView(self._groups)
+
+    @groups.setter
+    def groups(self, groups):
+        self._groups = dict.fromkeys(groups)
 
     def get_users(self):
         """
@@ -26,33 +99,71 @@ class UserGroup:
         """
         return self.groups
 
+    def has_user(self, user):
+        """
+        Checks whether a user is in this UserGroup.
+        :param user: The username of the user to look up.
+        :return: Returns true if the user is in this UserGroup and false if
+        not.
+        """
+        return user in self._users
+
+    def has_group(self, group):
+        """
+        Checks whether a Home Assistant group is in this UserGroup.
+        :param group: The Home Assistant group to look up.
+        :return: Returns true if the group is in this UserGroup and false if
+        not.
+        """
+        return group in self._groups
+
     def add_user(self, user):
         """
         Adds a user to this UserGroup.
         :param user: The username of the user you'd like to add.
         """
-        self.users.append(user)
+        self._users[_intern(user)] = None
 
     def add_group(self, group):
         """
         Adds a Home Assistant group to this UserGroup.
         :param group: The Home Assistant group you'd like to add.
         """
-        self.groups.append(group)
+        self._groups[group] = None
 
     def remove_user(self, user):
         """
         Removes a user from this UserGroup.
         :param user: The username of the user you'd like to remove.
         """
-        self.users.remove(user)
+        try:
+            del self._users[user]
+        except KeyError:
+            raise ValueError(str(user) + " is not in this usergroup")
 
     def remove_group(self, group):
         """
         Removes a Home Assistant group from this UserGroup.
         :param group: The Home Assistant group you'd like to remove.
         """
-        self.groups.remove(group)
+        try:
+            del self._groups[group]
+        except KeyError:
+            raise ValueError(str(group) + " is not in this usergroup")
+
+    def replace_user(self, old_user, new_user):
+        """
+        Replaces a user of this UserGroup with another user, keeping its
+        position. If the new user already is in this UserGroup, the old user
+        is only removed.
+        :param old_user: The username of the user you'd like to replace.
+        :param new_user: The username of the user to replace it with.
+        """
+        if new_user in self._users:
+            self.remove_user(old_user)
+        else:
+            self.users = [new_user if user == old_user else user
+                          for user in self._users]
 
     def get_name(self):
         """
@@ -1,7 +1,10 @@
 import logging
-import yaml
-import os
+from contextlib import contextmanager
+from LoginComponent import completion
 from LoginComponent.usergroup import UserGroup
+from LoginComponent.nameindex import NameIndex
+from LoginComponent.stats import STATS, timed
+from LoginComponent.storage import YamlStorage
 from LoginComponent.scripts import utils
 
 _LOGGER = logging.getLogger(__name__)
@@ -11,9 +14,150 @@ GROUPS_YAML_FILE = "groups.yaml"
 class UserGroupManager:
     """Creates, updates, reads and deletes UserGroups."""
 
-    def __init__(self):
-        self.user_groups = self.read_groups()
+    def __init__(self, journal=None, stats=None, storage=None):
+        """
+        :param journal: Optional. A Journal that mutations are appended to
+        instead of rewriting groups.yaml on every change.
+        :param stats: Optional. The Stats to record timings in. Defaults to
+        the shared STATS.
+        :param storage: Optional. The storage backend to keep the usergroups
+        in. Defaults to a YamlStorage for groups.yaml using the journal.
+        """
+        self.journal = journal
+        self.stats = STATS if stats is None else stats
+        if storage is None:
+            storage = YamlStorage(GROUPS_YAML_FILE, journal, self.stats)
+        self.storage = storage
+        self._user_groups = None
+        self._name_index = None
+        self._membership_index = None
+        self._sorted_index = None
+        self._names_changed = False
+        self._batch_depth = 0
+        self._dirty = False
+        self._pending_records = []
+
+    @property
+    def user_groups(self):
+        """
+        The list of usergroups. groups.yaml is only read when the usergroups
+        are first needed.
+        """
+        if self._user_groups is None:
+            self.user_groups = self.read_groups()
+        return self._user_groups
+
+    @user_groups.setter
+    def user_groups(self, user_groups):
+        self._user_groups = user_groups
+        self._index_usergroups()
+
+    @property
+    def _usergroups_by_name(self):
+        """
+        The index from name to usergroup, loading the usergroups if needed.
+        """
+        if self._user_groups is None:
+            self.user_groups = self.read_groups()
+        return self._name_index
+
+    @property
+    def _usergroups_by_user(self):
+        """
+        The index from username to the usergroups containing that user,
+        loading the usergroups if needed.
+        """
+        if self._user_groups is None:
+            self.user_groups = self.read_groups()
+        return self._membership_index
+
+    @property
+    def _sorted_usergroup_names(self):
+        """
+        The NameIndex of all usergroup names, built when it is first needed.
+        """
+        if self._sorted_index is None:
+            self._sorted_index = NameIndex(self._usergroups_by_name)
+        return self._sorted_index
+
+    def is_loaded(self):
+        """
+        Checks whether the usergroups have been read from groups.yaml yet.
+        :return: Returns true if the usergroups are loaded and false if not.
+        """
+        return self._user_groups is not None
+
+    def _index_usergroups(self):
+        """
+        Rebuilds the usergroup name index and the reverse membership index
+        from self.user_groups.
+        """
+        self._name_index = {}
+        self._membership_index = {}
+        self._sorted_index = None
+        for user_group in self._user_groups:
+            self._name_index[user_group.get_name()] = user_group
+            for username in user_group.get_users():
+                self._add_membership(username, user_group)
+
+    def _add_membership(self, username, user_group):
+        """
+        Records in the reverse membership index that username is a member
+        of user_group.
+        """
+        self._usergroups_by_user.setdefault(username, {})[user_group] = None
 
+    def _remove_membership(self, username, user_group):
+        """
+        Removes user_group from the reverse membership index of username.
+        """
+        user_groups = self._usergroups_by_user.get(username)
+        if user_groups is not None:
+            user_groups.pop(user_group, None)
+            if not user_groups:
+                del self._usergroups_by_user[username]
+
+    def get_usergroup(self, name):
+        """
+        Returns the usergroup with the given name.
+        :param name: The name of the usergroup you'd like to get.
+        :return: Returns the usergroup if it exists, or None if it does not.
+        """
+        return self._usergroups_by_name.get(name)
+
+    def has_usergroup(self, name):
+        """
+        Checks whether a usergroup with the given name exists.
+        :param name: The name of the usergroup to look up.
+        :return: Returns true if the usergroup exists and false if it does
+        not.
+        """
+        return name in self._usergroups_by_name
+
+    def search_usergroups(self, pattern=None, offset=0, limit=None):
+        """
+        Returns the usergroups whose name starts with pattern, or matches it
+        if it is a glob pattern, sorted by name.
+        :param pattern: Optional. A prefix or glob pattern. All usergroups
+        match when it is not given.
+        :param offset: Optional. The number of matching usergroups to skip.
+        :param limit: Optional. The maximum number of usergroups to return.
+        :return: A list of usergroups.
+        """
+        index = self._usergroups_by_name
+        return [index[name] for name in
+                self._sorted_usergroup_names.search(pattern, offset, limit)]
+
+    def get_usergroups_for_user(self, username):
+        """
+        Returns the usergroups the given user is a member of.
+        :param username: The username of the user to look up.
+        :return: A list of the usergroups containing the user, or an empty
+        list if the user is not in any usergroup.
+        """
+        return list(self._usergroups_by_user.get(username, ()))
+
+    @timed("mutate")
     def create_group(self, group_name):
         """ Creates a UserGroup and adds it to the groups.yaml configuration
         file.
@@ -25,21 +169,210 @@ class UserGroupManager:
             _LOGGER.error("An integer as usergroup name is not supported!")
             return False
 
-        for user_group in self.user_groups:
-            if user_group.get_name() == group_name:
-                return False
+        if self.has_usergroup(group_name):
+            return False
 
-        self.user_groups.append(UserGroup(group_name))
-        self.write_user_groups_to_yaml()
-        return True
+        user_group = UserGroup(group_name)
+        self.user_groups.append(user_group)
+        self._usergroups_by_name[group_name] = user_group
+        if self._sorted_index is not None:
+            self._sorted_index.add(group_name)
+        self._names_changed = True
+        return self._save({"op": "create", "usergroup": group_name})
+
+    @contextmanager
+    def batch(self):
+        """
+        Defers writing groups.yaml until the outermost batch exits, so any
+        number of mutations results in at most one write. If an exception
+        leaves the outermost batch, the usergroups are rolled back to the
+        state they were in when the batch started and nothing is written. If
+        the usergroups were not loaded yet, they are unloaded again instead.
+        """
+        if self._batch_depth == 0:
+            snapshot = None
+            if self.is_loaded():
+                snapshot = [(user_group, user_group.get_name(),
+                             list(user_group.get_users()),
+                             list(user_group.get_groups()))
+                            for user_group in self.user_groups]
+            names_changed = self._names_changed
+            self._dirty = False
+            self._pending_records = []
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                if snapshot is None:
+                    self._user_groups = None
+                else:
+                    for user_group, name, users, groups in snapshot:
+                        user_group.set_name(name)
+                        user_group.users = users
+                        user_group.groups = groups
+                    self.user_groups[:] = [user_group for user_group, _, _, _
+                                           in snapshot]
+                    self._index_usergroups()
+                self._names_changed = names_changed
+                self._dirty = False
+                self._pending_records = []
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0 and self._dirty:
+            records = self._pending_records
+            self._dirty = False
+            self._pending_records = []
+            self._commit(records)
+
+    def _save(self, *records):
+        """
+        Persists a mutation, or marks the usergroups as changed if a batch
+        is active.
+        :param records: The journal records describing the mutation.
+        :return: Returns false if another process changed the usergroups so
+        that the mutation could not be applied, and true otherwise.
+        """
+        if self._batch_depth:
+            self._dirty = True
+            self._pending_records.extend(records)
+            return True
+        return self._commit(list(records))
+
+    def _commit(self, records):
+        """
+        Hands the records to the storage, which appends them to the journal,
+        stores them one by one or asks for all usergroups to be rewritten.
+        This happens in a storage transaction, and if another process saved
+        the usergroups since they were read, its changes are read first so
+        they are not overwritten. If names changed, the name index file is
+        marked stale so the next read writes it again.
+        :param records: The journal records describing the mutations.
+        :return: Returns false if a record could not be applied on top of
+        the changes of another process, and true otherwise.
+        """
+        rejected = []
+        with self.storage.transaction() as stale:
+            if stale:
+                rejected = self._rebase(records)
+                records = [record for record in records if not any(
+                    record is other for other in rejected)]
+            if records:
+                self.storage.commit(records, self.write_user_groups_to_yaml)
+            if self._names_changed:
+                self._names_changed = False
+                completion.mark_stale(self.storage.names_path)
+            else:
+                completion.touch(self.storage.names_path)
+        return not rejected
+
+    def _write_name_index(self, names, groups):
+        """
+        Writes the usergroup names and Home Assistant group names to the
+        name index file used for shell completion.
+        :param names: An iterable of all usergroup names.
+        :param groups: An iterable of all Home Assistant group names.
+        """
+        completion.write_names(self.storage.names_path,
+                               {completion.USERGROUPS: names,
+                                completion.GROUPS: groups})
+
+    def _rebase(self, records):
+        """
+        Reads the usergroups as another process wrote them and applies the
+        records of the mutations made here on top of them.
+        :param records: The journal records that were not written yet.
+        :return: A list of the records that could not be applied, because
+        the usergroup they are about was created, deleted or renamed by the
+        other process.
+        """
+        _LOGGER.info("The usergroups were saved by another process, merging "
+                     "the changes")
+        group_dict = self._read_groups_dict()
+        rejected = [record for record in records if
+                    not self.apply_record_to_dict(group_dict, record)]
+        for record in rejected:
+            _LOGGER.warning("Dropping the %s of usergroup \"%s\", it was "
+                            "changed by another process", record["op"],
+                            record["usergroup"])
+        with self.stats.phase("convert"):
+            self._apply_groups(self.convert_dict_to_groups(group_dict))
+        self._names_changed = True
+        return rejected
 
     def write_user_groups_to_yaml(self):
         """
-        Writes all user groups in self.user_groups to the groups.yaml file.
+        Writes all user groups in self.user_groups to the storage, which is
+        the groups.yaml file by default. If a journal is used, it is emptied
+        since groups.yaml now contains all of its records.
+        """
+        user_groups = self.user_groups
+        with self.stats.phase("convert"):
+            data = self.convert_groups_to_dict(user_groups)
+        self.storage.write(data)
+
+    def apply_record_to_dict(self, groups_dict, record):
+        """
+        Applies a journal record to a dict of usergroups as read from
+        groups.yaml. Applying a record that is already reflected in the dict
+        leaves it unchanged. Creating a usergroup that is in the dict, or
+        renaming or changing one that is not, is not applied, so a stale
+        change can not take over a usergroup another process created or
+        bring back one it deleted.
+        :param groups_dict: A dict containing usergroups.
+        :param record: The journal record to apply.
+        :return: Returns false if the record was not applied because its
+        usergroup exists already, is missing or its new name is taken, and
+        true otherwise.
         """
-        with open(GROUPS_YAML_FILE, 'w') as outfile:
-            groups_dict = self.convert_groups_to_dict(self.user_groups)
-            outfile.write(yaml.dump(groups_dict, default_flow_style=False))
+        op = record["op"]
+        name = record["usergroup"]
+        if op == "create":
+            if name in groups_dict:
+                return False
+            groups_dict[name] = {"users": [], "groups": []}
+            return True
+        if op == "delete":
+            groups_dict.pop(name, None)
+            return True
+        if op == "rename":
+            new_name = record["new_name"]
+            if name not in groups_dict or new_name in groups_dict:
+                return False
+            renamed = {(new_name if usergroup_name == name else
+                        usergroup_name): user_group for
+                       usergroup_name, user_group in groups_dict.items()}
+            groups_dict.clear()
+            groups_dict.update(renamed)
+            return True
+
+        user_group = groups_dict.get(name)
+        if user_group is None:
+            return False
+        if op == "add_user":
+            if record["username"] not in user_group["users"]:
+                user_group["users"].append(record["username"])
+        elif op == "remove_user":
+            if record["username"] in user_group["users"]:
+                user_group["users"].remove(record["username"])
+        elif op == "rename_user":
+            users = user_group["users"]
+            if record["username"] in users:
+                if record["new_username"] in users:
+                    users.remove(record["username"])
+                else:
+                    users[users.index(record["username"])] = \
+                        record["new_username"]
+        elif op == "add_group":
+            if record["group"] not in user_group["groups"]:
+                user_group["groups"].append(record["group"])
+        elif op == "remove_group":
+            if record["group"] in user_group["groups"]:
+                user_group["groups"].remove(record["group"])
+        else:
+            _LOGGER.warning("Ignoring unknown journal record %s", op)
+        return True
 
     def convert_groups_to_dict(self, usergroups_list):
         """
@@ -51,14 +384,10 @@ class UserGroupManager:
         groups_dict = {}
         for user_group in usergroups_list:
             groups_dict[user_group.get_name()] = {}
-            groups_dict[user_group.get_name()]["users"] = []
-            groups_dict[user_group.get_name()]["groups"] = []
-            for i in range(0, len(user_group.get_groups())):
-                groups_dict[user_group.get_name()]["groups"].append(
-                    user_group.get_groups()[i])
-            for i in range(0, len(user_group.get_users())):
-                groups_dict[user_group.get_name()]["users"].append(
-                    user_group.get_users()[i])
+            groups_dict[user_group.get_name()]["users"] = \
+                list(user_group.get_users())
+            groups_dict[user_group.get_name()]["groups"] = \
+                list(user_group.get_groups())
         return groups_dict
 
     def convert_dict_to_groups(self, usergroup_dict):
@@ -71,22 +400,96 @@ class UserGroupManager:
         user_groups = []
         for usergroup_name, user_group in usergroup_dict.items():
             user_groups.append(UserGroup(usergroup_name,
-                                         list(user_group["users"]),
-                                         list(user_group["groups"])))
+                                         user_group["users"],
+                                         user_group["groups"]))
         return user_groups
 
     def read_groups(self):
         """
-        Reads all UserGroups from the groups.yaml file.
+        Reads all UserGroups from the groups.yaml file and replays the
+        journal on top of them if one is used.
         :return: Returns a list of users if a list of users was found.
         Returns an empty list if none were found.
         """
-        if os.path.isfile(GROUPS_YAML_FILE):
-            group_dict = yaml.load(open(GROUPS_YAML_FILE, 'r'))
-            if group_dict is not None:
-                return self.convert_dict_to_groups(group_dict)
-        return []
+        group_dict = self._read_groups_dict()
+        if completion.is_stale(self.storage.names_path,
+                               self.storage.paths()):
+            self._write_name_index(group_dict, {
+                group for user_group in group_dict.values()
+                for group in user_group["groups"]})
+        with self.stats.phase("convert"):
+            return self.convert_dict_to_groups(group_dict)
+
+    def _read_groups_dict(self):
+        """
+        Reads the usergroups from the storage, which remembers what was
+        read.
+        :return: The dict of usergroups.
+        """
+        with self.stats.phase("load"):
+            return self.storage.read(self.apply_record_to_dict)
+
+    def reload(self):
+        """
+        Reads groups.yaml again and applies only the differences to the
+        loaded usergroups. Unchanged usergroups keep their UserGroup object,
+        and the name and membership indexes are updated instead of rebuilt.
+        Nothing is read if the usergroups were not loaded yet.
+        :return: A set of the names of the usergroups that were added,
+        changed or removed.
+        """
+        if not self.is_loaded():
+            return set()
+        if self._batch_depth:
+            raise RuntimeError("The usergroups can not be reloaded in a "
+                               "batch!")
+        return self._apply_groups(self.read_groups())
+
+    def _apply_groups(self, new_groups):
+        """
+        Makes the loaded usergroups equal to new_groups, keeping the
+        UserGroup objects and index entries of usergroups that did not
+        change.
+        :param new_groups: The list of usergroups as they should be.
+        :return: A set of the names of the usergroups that were added,
+        changed or removed.
+        """
+        index = self._usergroups_by_name
+        changed = set()
+        user_groups = []
+        for new_group in new_groups:
+            name = new_group.get_name()
+            user_group = index.get(name)
+            if user_group is None:
+                index[name] = user_group = new_group
+                for username in new_group.get_users():
+                    self._add_membership(username, new_group)
+                changed.add(name)
+            elif user_group.get_users() != new_group.get_users() or \
+                    user_group.get_groups() != new_group.get_groups():
+                old_users = set(user_group.get_users())
+                new_users = set(new_group.get_users())
+                for username in old_users - new_users:
+                    self._remove_membership(username, user_group)
+                for username in new_users - old_users:
+                    self._add_membership(username, user_group)
+                user_group.users = new_group.get_users()
+                user_group.groups = new_group.get_groups()
+                changed.add(name)
+            user_groups.append(user_group)
+        if len(user_groups) != len(index):
+            kept = {user_group.get_name() for user_group in user_groups}
+            for name in [name for name in index if name not in kept]:
+                removed = index.pop(name)
+                for username in removed.get_users():
+                    self._remove_membership(username, removed)
+                changed.add(name)
+        self._user_groups[:] = user_groups
+        if changed:
+            self._sorted_index = None
+        return changed
 
+    @timed("mutate")
     def delete_usergroup(self, groupname):
         """
         Deletes groups from groups.yaml file.
@@ -95,13 +498,19 @@ class UserGroupManager:
         :return: Returns true if the operation was successful and false if
         the operation failed.
         """
-        for group in self.user_groups:
-            if group.get_name() == groupname:
-                self.user_groups.remove(group)
-                self.write_user_groups_to_yaml()
-                return True
-        return False
+        user_group = self._usergroups_by_name.pop(groupname, None)
+        if user_group is None:
+            return False
+
+        self.user_groups.remove(user_group)
+        if self._sorted_index is not None:
+            self._sorted_index.remove(groupname)
+        self._names_changed = True
+        for username in user_group.get_users():
+            self._remove_membership(username, user_group)
+        return self._save({"op": "delete", "usergroup": groupname})
 
+    @timed("mutate")
     def add_user_to_usergroup(self, username, user_group, usermanager):
         """
         Adds a user to a usergroup.
@@ -110,13 +519,16 @@ class UserGroupManager:
         :return: Returns true if the operation was successful and false if
         the operation failed.
         """
-        if username in (user.get_username() for user in usermanager.users) \
-                and username not in user_group.users:
-            user_group.users.append(username)
-            self.write_user_groups_to_yaml()
-            return True
+        if usermanager.has_user(username) \
+                and not user_group.has_user(username):
+            user_group.add_user(username)
+            self._add_membership(username, user_group)
+            return self._save({"op": "add_user",
+                               "usergroup": user_group.get_name(),
+                               "username": username})
         return False
 
+    @timed("mutate")
     def add_group_to_usergroup(self, groupname, user_group):
         """
         Add a Home Assistant group to a usergroup.
@@ -126,12 +538,15 @@ class UserGroupManager:
         :return: Returns true if the operation was successful and false if
         the operation failed.
         """
-        if groupname not in user_group.groups:
-            user_group.groups.append(groupname)
-            self.write_user_groups_to_yaml()
-            return True
+        if not user_group.has_group(groupname):
+            user_group.add_group(groupname)
+            self._names_changed = True
+            return self._save({"op": "add_group",
+                               "usergroup": user_group.get_name(),
+                               "group": groupname})
         return False
 
+    @timed("mutate")
     def remove_user_from_usergroup(self, username, user_group):
         """
         Remove a user from a usergroup.
@@ -140,12 +555,15 @@ class UserGroupManager:
         :return: Returns true if the operation was successful and false if
         the operation failed.
         """
-        if username in user_group.users:
-            user_group.users.remove(username)
-            self.write_user_groups_to_yaml()
-            return True
+        if user_group.has_user(username):
+            user_group.remove_user(username)
+            self._remove_membership(username, user_group)
+            return self._save({"op": "remove_user",
+                               "usergroup": user_group.get_name(),
+                               "username": username})
         return False
 
+    @timed("mutate")
     def remove_group_from_usergroup(self, groupname, user_group):
         """
         Remove a Home Assistant group from a usergroup.
@@ -155,35 +573,44 @@ class UserGroupManager:
         :return: Returns true if the operation was successful and false if
         the operation failed.
         """
-        if groupname in user_group.groups:
-            user_group.groups.remove(groupname)
-            self.write_user_groups_to_yaml()
-            return True
+        if user_group.has_group(groupname):
+            user_group.remove_group(groupname)
+            self._names_changed = True
+            return self._save({"op": "remove_group",
+                               "usergroup": user_group.get_name(),
+                               "group": groupname})
         return False
 
+    @timed("mutate")
     def update_user_in_usergroup(self, old_username, new_username,
                                  usermanager):
         """
-        Goes through all user groups and replaces all occurences of the
-        old_username with the new_username.
+        Replaces the old_username with the new_username in every usergroup
+        the user is a member of.
         :param old_username: The username you want to replace.
         :param new_username: The username you want the old username to be
         replaced with.
         :return: Returns true if the operation was successful and false if
         the operation failed.
         """
-        if new_username in (user.get_username() for user in usermanager.users):
-            for user_group in self.user_groups:
-                for i in range(len(user_group.users)):
-                    if user_group.users[i] == old_username:
-                        user_group.users[i] = new_username
-                        break
-                else:
-                    return True
-                self.write_user_groups_to_yaml()
+        if not usermanager.has_user(new_username):
+            return False
+
+        user_groups = self._usergroups_by_user.pop(old_username, None)
+        if user_groups is None:
             return True
-        return False
 
+        records = []
+        for user_group in user_groups:
+            user_group.replace_user(old_username, new_username)
+            self._add_membership(new_username, user_group)
+            records.append({"op": "rename_user",
+                            "usergroup": user_group.get_name(),
+                            "username": old_username,
+                            "new_username": new_username})
+        return self._save(*records)
+
+    @timed("mutate")
     def update_usergroup_name(self, old_name, new_name):
         """
         Changes the name of the usergroup named old_name to new_name.
@@ -196,14 +623,18 @@ class UserGroupManager:
             _LOGGER.error("An integer as usergroup name is not supported!")
             return False
 
-        if new_name not in (usergroup.get_name() for usergroup in
-                            self.user_groups):
-            for usergroup in self.user_groups:
-                if usergroup.get_name() == old_name:
-                    usergroup.set_name(new_name)
-                    self.write_user_groups_to_yaml()
-                    return True
-        return False
+        if self.has_usergroup(new_name) or not self.has_usergroup(old_name):
+            return False
+
+        usergroup = self._usergroups_by_name.pop(old_name)
+        usergroup.set_name(new_name)
+        self._usergroups_by_name[new_name] = usergroup
+        if self._sorted_index is not None:
+            self._sorted_index.remove(old_name)
+            self._sorted_index.add(new_name)
+        self._names_changed = True
+        return self._save({"op": "rename", "usergroup": old_name,
+                           "new_name": new_name})
 
     def get_usergroups(self):
         """
@@ -1,7 +1,11 @@
-import yaml
-import os
 import logging
+import threading
+from contextlib import contextmanager
+from LoginComponent import completion, passwordhash
 from LoginComponent.user import User
+from LoginComponent.nameindex import NameIndex
+from LoginComponent.stats import STATS, timed
+from LoginComponent.storage import YamlStorage
 from LoginComponent.scripts import utils
 
 _LOGGER = logging.getLogger(__name__)
@@ -11,9 +15,206 @@ USERS_YAML_FILE = "users.yaml"
 class UserManager:
     """Creates, updates, reads and deletes users."""
 
-    def __init__(self):
-        self.users = self.read_users()
+    def __init__(self, journal=None, stats=None, storage=None,
+                 verify_cache=None, hasher=None):
+        """
+        :param journal: Optional. A Journal that mutations are appended to
+        instead of rewriting users.yaml on every change.
+        :param stats: Optional. The Stats to record timings in. Defaults to
+        the shared STATS.
+        :param storage: Optional. The storage backend to keep the users in.
+        Defaults to a YamlStorage for users.yaml using the journal.
+        :param verify_cache: Optional. A VerificationCache remembering
+        recent successful password checks.
+        :param hasher: Optional. The PasswordHasher for new passwords.
+        Defaults to the one configured in hashing.yaml, which is read when
+        a password is first hashed or checked.
+        """
+        self.journal = journal
+        self.stats = STATS if stats is None else stats
+        if storage is None:
+            storage = YamlStorage(USERS_YAML_FILE, journal, self.stats)
+        self.storage = storage
+        self.verify_cache = verify_cache
+        self._hasher = hasher
+        # Guards the passwords of the loaded users and the rehash records,
+        # since verify_password may run next to a mutation in another thread.
+        self._password_lock = threading.Lock()
+        self._rehash_records = []
+        self._users = None
+        self._username_index = None
+        self._sorted_index = None
+        self._names_changed = False
+        self._batch_depth = 0
+        self._dirty = False
+        self._pending_records = []
+
+    @property
+    def users(self):
+        """
+        The list of users. users.yaml is only read when the users are first
+        needed.
+        """
+        if self._users is None:
+            self.users = self.read_users()
+        return self._users
+
+    @users.setter
+    def users(self, users):
+        self._users = users
+        self._index_users()
+
+    @property
+    def _users_by_name(self):
+        """
+        The index from username to user, loading the users if needed.
+        """
+        if self._users is None:
+            self.users = self.read_users()
+        return self._username_index
+
+    @property
+    def _sorted_usernames(self):
+        """
+        The NameIndex of all usernames, built when it is first needed.
+        """
+        if self._sorted_index is None:
+            self._sorted_index = NameIndex(self._users_by_name)
+        return self._sorted_index
+
+    @property
+    def hasher(self):
+        """
+        The PasswordHasher for new passwords. hashing.yaml is only read when
+        the hasher is first needed.
+        """
+        if self._hasher is None:
+            self._hasher = passwordhash.read_hasher()
+        return self._hasher
+
+    @hasher.setter
+    def hasher(self, hasher):
+        self._hasher = hasher
+
+    def is_loaded(self):
+        """
+        Checks whether the users have been read from users.yaml yet.
+        :return: Returns true if the users are loaded and false if not.
+        """
+        return self._users is not None
+
+    def _index_users(self):
+        """
+        Rebuilds the username index from self.users.
+        """
+        self._username_index = {user.get_username(): user
+                                for user in self._users}
+        self._sorted_index = None
+
+    def get_user(self, username):
+        """
+        Returns the user with the given username.
+        :param username: The username of the user you'd like to get.
+        :return: Returns the user if it exists, or None if it does not.
+        """
+        return self._users_by_name.get(username)
+
+    def has_user(self, username):
+        """
+        Checks whether a user with the given username exists.
+        :param username: The username to look up.
+        :return: Returns true if the user exists and false if it does not.
+        """
+        return username in self._users_by_name
 
+    def search_users(self, pattern=None, offset=0, limit=None):
+        """
+        Returns the users whose username starts with pattern, or matches it
+        if it is a glob pattern, sorted by username.
+        :param pattern: Optional. A prefix or glob pattern. All users match
+        when it is not given.
+        :param offset: Optional. The number of matching users to skip.
+        :param limit: Optional. The maximum number of users to return.
+        :return: A list of users.
+        """
+        index = self._users_by_name
+        return [index[username] for username in
+                self._sorted_usernames.search(pattern, offset, limit)]
+
+    def verify_password(self, username, password):
+        """
+        Checks the password of a user in constant time. Successful checks
+        are remembered in the verification cache if one is used. If the
+        password was hashed differently than the hasher would hash it now,
+        it is hashed again. The new hash is saved with the next change, or
+        when flush_rehashes is called, so many logins cause one write.
+        :param username: The username of the user.
+        :param password: The password to check.
+        :return: Returns true if the user exists and the password is
+        correct, and false if not.
+        """
+        user = self.get_user(username)
+        if user is None:
+            return False
+        stored_password = user.get_password()
+        cache = self.verify_cache
+        if cache is not None and cache.check(username, password,
+                                             stored_password):
+            return True
+        if not user.check_password(password):
+            return False
+        if self.hasher.needs_rehash(stored_password):
+            new_password = self.hasher.hash(password)
+            with self._password_lock:
+                # A password changed while this one was hashed is kept.
+                if user.get_password() == stored_password:
+                    user.set_password(new_password)
+                    self._rehash_records.append({
+                        "op": "rehash", "username": username,
+                        "password": new_password,
+                        "previous": stored_password})
+                    stored_password = new_password
+        if cache is not None:
+            cache.add(username, password, stored_password)
+        return True
+
+    def has_rehashes(self):
+        """
+        Checks whether passwords were hashed again by verify_password and
+        not saved yet.
+        :return: Returns true if there are unsaved hashes and false if not.
+        """
+        return bool(self._rehash_records)
+
+    def flush_rehashes(self):
+        """
+        Saves the passwords verify_password hashed again, all in one write.
+        :return: Returns true if anything was saved and false if not.
+        """
+        if not self._rehash_records:
+            return False
+        self._save()
+        return True
+
+    def _take_rehash_records(self):
+        """
+        Returns the unsaved records of passwords that were hashed again and
+        forgets them.
+        """
+        with self._password_lock:
+            records = self._rehash_records
+            self._rehash_records = []
+        return records
+
+    def _invalidate_verification(self, username):
+        """
+        Forgets the remembered password check of a user.
+        :param username: The username of the user.
+        """
+        if self.verify_cache is not None:
+            self.verify_cache.invalidate(username)
+
+    @timed("mutate")
     def create_user(self, username, password):
         """
         Creates a user and adds it to the yaml configuration file.
@@ -22,25 +223,261 @@ class UserManager:
         :return: Returns true if the operation was successful and false if
         the operation failed.
         """
-        if utils.parse_int(username) is not None:
-            _LOGGER.error("An integer as username is not supported!")
+        if not self._can_create(username):
             return False
 
-        for user in self.users:
-            if user.get_username() == username:
-                logging.error("A user with the username \"" + username +
+        return self._add_user(User(username, password, True, self.hasher))
+
+    @timed("mutate")
+    def create_users(self, users, workers=None,
+                     chunk_size=passwordhash.HASH_CHUNK_SIZE):
+        """
+        Creates many users at once. Their passwords are hashed in parallel
+        by worker processes, and users.yaml is written once at the end.
+        :param users: An iterable of (username, password) pairs.
+        :param workers: Optional. The number of worker processes. Defaults
+        to the number of CPUs.
+        :param chunk_size: Optional. The number of passwords a worker hashes
+        at a time.
+        :return: A list with true for every user that was created and false
+        for every user that could not be, in the order they were given.
+        """
+        results = []
+        new_users = []
+        usernames = set()
+        for username, password in users:
+            if username in usernames:
+                logging.error("A user with the username \"" + str(username) +
                               "\" already exists!")
-                return False
+                created = False
+            else:
+                created = self._can_create(username)
+            if created:
+                usernames.add(username)
+                new_users.append((len(results), username, password))
+            results.append(created)
+
+        hashes = passwordhash.hash_passwords(
+            self.hasher, [password for _, _, password in new_users], workers,
+            chunk_size)
+        with self.batch():
+            for (_, username, _), password_hash in zip(new_users, hashes):
+                self._add_user(User(username, password_hash))
+        # A user another process created first keeps its own password.
+        for (position, username, _), password_hash in zip(new_users, hashes):
+            user = self.get_user(username)
+            results[position] = user is not None and \
+                user.get_password() == password_hash
+        return results
+
+    def _can_create(self, username):
+        """
+        Checks whether a user with the given username can be created.
+        :param username: The username of the new user.
+        :return: Returns true if it can be created and false if not.
+        """
+        if utils.parse_int(username) is not None:
+            _LOGGER.error("An integer as username is not supported!")
+            return False
 
-        self.users.append(User(username, password, True))
-        self.write_users_to_yaml()
+        if self.has_user(username):
+            logging.error("A user with the username \"" + username +
+                          "\" already exists!")
+            return False
         return True
 
+    def _add_user(self, user):
+        """
+        Adds a new user with a hashed password and saves it.
+        :param user: The new user.
+        :return: Returns false if another process created a user with the
+        same username first, and true otherwise.
+        """
+        username = user.get_username()
+        self.users.append(user)
+        self._users_by_name[username] = user
+        if self._sorted_index is not None:
+            self._sorted_index.add(username)
+        self._names_changed = True
+        return self._save({"op": "create", "username": username,
+                           "password": user.get_password()})
+
+    @contextmanager
+    def batch(self):
+        """
+        Defers writing users.yaml until the outermost batch exits, so any
+        number of mutations results in at most one write. If an exception
+        leaves the outermost batch, the users are rolled back to the state
+        they were in when the batch started and nothing is written. If the
+        users were not loaded yet, they are unloaded again instead.
+        """
+        if self._batch_depth == 0:
+            snapshot = None
+            if self.is_loaded():
+                snapshot = [(user, user.get_username(), user.get_password())
+                            for user in self.users]
+            names_changed = self._names_changed
+            self._dirty = False
+            self._pending_records = []
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                if snapshot is None:
+                    self._users = None
+                else:
+                    with self._password_lock:
+                        for user, username, password in snapshot:
+                            user.set_username(username)
+                            user.set_password(password)
+                    self.users[:] = [user for user, _, _ in snapshot]
+                    self._index_users()
+                if self.verify_cache is not None:
+                    self.verify_cache.clear()
+                self._names_changed = names_changed
+                self._dirty = False
+                self._pending_records = []
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0 and self._dirty:
+            records = self._pending_records
+            self._dirty = False
+            self._pending_records = []
+            self._commit(records)
+
+    def _save(self, *records):
+        """
+        Persists a mutation, or marks the users as changed if a batch is
+        active.
+        :param records: The journal records describing the mutation.
+        :return: Returns false if another process changed the users so that
+        the mutation could not be applied, and true otherwise.
+        """
+        if self._batch_depth:
+            self._dirty = True
+            self._pending_records.extend(records)
+            return True
+        return self._commit(list(records))
+
+    def _commit(self, records):
+        """
+        Hands the records to the storage, which appends them to the journal,
+        stores them one by one or asks for all users to be rewritten. This
+        happens in a storage transaction, and if another process saved the
+        users since they were read, its changes are read first so they are
+        not overwritten. If usernames changed, the name index file is marked
+        stale so the next read writes it again, and the passwords
+        verify_password hashed again are saved along.
+        :param records: The journal records describing the mutations.
+        :return: Returns false if a record could not be applied on top of
+        the changes of another process, and true otherwise.
+        """
+        records = records + self._take_rehash_records()
+        if not records:
+            return True
+        rejected = []
+        with self.storage.transaction() as stale:
+            if stale:
+                rejected = self._rebase(records)
+                records = [record for record in records if not any(
+                    record is other for other in rejected)]
+            if records:
+                self.storage.commit(records, self.write_users_to_yaml)
+            if self._names_changed:
+                self._names_changed = False
+                completion.mark_stale(self.storage.names_path)
+            else:
+                completion.touch(self.storage.names_path)
+        return not rejected
+
+    def _write_name_index(self, usernames):
+        """
+        Writes the usernames to the name index file used for shell
+        completion.
+        :param usernames: An iterable of all usernames.
+        """
+        completion.write_names(self.storage.names_path,
+                               {completion.USERS: usernames})
+
+    def _rebase(self, records):
+        """
+        Reads the users as another process wrote them and applies the
+        records of the mutations made here on top of them.
+        :param records: The journal records that were not written yet.
+        :return: A list of the records that could not be applied, because
+        the user they are about was deleted or renamed by the other process.
+        """
+        _LOGGER.info("The users were saved by another process, merging "
+                     "the changes")
+        user_dict = self._read_users_dict()
+        rejected = [record for record in records if
+                    not self.apply_record_to_dict(user_dict, record)]
+        for record in rejected:
+            _LOGGER.warning("Dropping the %s of user \"%s\", it was changed "
+                            "by another process", record["op"],
+                            record["username"])
+        with self.stats.phase("convert"):
+            self._apply_users(self.convert_dict_to_users(user_dict))
+        self._names_changed = True
+        return rejected
+
     def write_users_to_yaml(self):
-        """ Write the list of users in self.users to the users.yaml file. """
-        with open(USERS_YAML_FILE, 'w') as outfile:
-            users_dict = self.convert_users_to_dict(self.users)
-            outfile.write(yaml.dump(users_dict, default_flow_style=False))
+        """
+        Write the list of users in self.users to the storage, which is the
+        users.yaml file by default. If a journal is used, it is emptied
+        since users.yaml now contains all of its records.
+        """
+        users = self.users
+        with self.stats.phase("convert"):
+            data = self.convert_users_to_dict(users)
+        self.storage.write(data)
+
+    def apply_record_to_dict(self, users_dict, record):
+        """
+        Applies a journal record to a dict of users as read from users.yaml.
+        Applying a record that is already reflected in the dict leaves it
+        unchanged. Creating a user that is in the dict with another password,
+        or changing the password of or renaming a user that is not, is not
+        applied, so a stale change can not overwrite a user another process
+        created or bring back one it deleted.
+        :param users_dict: A dict filled with users.
+        :param record: The journal record to apply.
+        :return: Returns false if the record was not applied because its
+        user is missing or its new username is taken, and true otherwise.
+        """
+        op = record["op"]
+        username = record["username"]
+        if op == "create":
+            if username in users_dict:
+                return users_dict[username]["password"] == record["password"]
+            users_dict[username] = {"password": record["password"]}
+        elif op == "password":
+            if username not in users_dict:
+                return False
+            users_dict[username] = {"password": record["password"]}
+        elif op == "rehash":
+            # Another process may have changed the password since it was
+            # verified here, which the new hash must not undo.
+            user_information = users_dict.get(username)
+            if user_information is not None and \
+                    user_information["password"] == record["previous"]:
+                user_information["password"] = record["password"]
+        elif op == "delete":
+            users_dict.pop(username, None)
+        elif op == "rename":
+            new_username = record["new_username"]
+            if username not in users_dict or new_username in users_dict:
+                return False
+            renamed = {(new_username if name == username else name):
+                       user_information for name, user_information
+                       in users_dict.items()}
+            users_dict.clear()
+            users_dict.update(renamed)
+        else:
+            _LOGGER.warning("Ignoring unknown journal record %s", op)
+        return True
 
     def convert_users_to_dict(self, user_list):
         """
@@ -70,32 +507,102 @@ class UserManager:
 
     def read_users(self):
         """
-        Reads all users from the users.yaml file.
+        Reads all users from the users.yaml file and replays the journal on
+        top of them if one is used.
         :return: Returns a list of users if they were successfully loaded,
         or an empty is if not.
         """
-        if os.path.isfile(USERS_YAML_FILE):
-            user_dict = yaml.load(open(USERS_YAML_FILE, 'r'))
-            if user_dict is not None:
-                return self.convert_dict_to_users(user_dict)
-        return []
+        user_dict = self._read_users_dict()
+        if completion.is_stale(self.storage.names_path,
+                               self.storage.paths()):
+            self._write_name_index(user_dict)
+        with self.stats.phase("convert"):
+            return self.convert_dict_to_users(user_dict)
 
-    def delete_user(self, username, groupmanager):
+    def _read_users_dict(self):
+        """
+        Reads the users from the storage, which remembers what was read.
+        :return: The dict of users.
+        """
+        with self.stats.phase("load"):
+            return self.storage.read(self.apply_record_to_dict)
+
+    def reload(self):
+        """
+        Reads users.yaml again and applies only the differences to the
+        loaded users. Users whose username and password did not change keep
+        their User object, and the username index is updated instead of
+        rebuilt. Nothing is read if the users were not loaded yet.
+        :return: A set of the usernames that were added, changed or removed.
+        """
+        if not self.is_loaded():
+            return set()
+        if self._batch_depth:
+            raise RuntimeError("The users can not be reloaded in a batch!")
+        return self._apply_users(self.read_users())
+
+    def _apply_users(self, new_users):
+        """
+        Makes the loaded users equal to new_users, keeping the User objects
+        and index entries of users that did not change.
+        :param new_users: The list of users as they should be.
+        :return: A set of the usernames that were added, changed or removed.
+        """
+        index = self._users_by_name
+        changed = set()
+        users = []
+        for new_user in new_users:
+            username = new_user.get_username()
+            user = index.get(username)
+            if user is None:
+                index[username] = user = new_user
+                changed.add(username)
+            elif user.get_password() != new_user.get_password():
+                with self._password_lock:
+                    user.set_password(new_user.get_password())
+                changed.add(username)
+            users.append(user)
+        if len(users) != len(index):
+            kept = {user.get_username() for user in users}
+            for username in [name for name in index if name not in kept]:
+                del index[username]
+                changed.add(username)
+        self._users[:] = users
+        if changed:
+            self._sorted_index = None
+            for username in changed:
+                self._invalidate_verification(username)
+        return changed
+
+    @timed("mutate")
+    def delete_user(self, username, groupmanager=None):
         """
         Deletes users from users.yaml file.
+        :param username: The username of the user you'd like to delete.
+        :param groupmanager: Optional. The UserGroupManager whose usergroups
+        the user should be removed from as well.
         :return: Returns true if the operation was successful and false if
         the operation failed.
         """
-        for user in self.users:
-            if user.get_username() == username:
-                self.users.remove(user)
-                self.write_users_to_yaml()
-                for usergroup in groupmanager.user_groups:
+        user = self._users_by_name.pop(username, None)
+        if user is None:
+            return False
+
+        self.users.remove(user)
+        self._invalidate_verification(username)
+        if self._sorted_index is not None:
+            self._sorted_index.remove(username)
+        self._names_changed = True
+        self._save({"op": "delete", "username": username})
+        if groupmanager is not None:
+            with groupmanager.batch():
+                for usergroup in groupmanager.get_usergroups_for_user(
+                        username):
                     groupmanager.remove_user_from_usergroup(username,
                                                             usergroup)
-                return True
-        return False
+        return True
 
+    @timed("mutate")
     def update_user_username(self, old_username, new_username):
         """
         Update the username of a single user.
@@ -110,14 +617,21 @@ class UserManager:
             _LOGGER.error("An integer as username is not supported!")
             return False
 
-        if new_username not in (user.get_username() for user in self.users):
-            for user in self.users:
-                if user.get_username() == old_username:
-                    user.set_username(new_username)
-                    self.write_users_to_yaml()
-                    return True
-        return False
+        if self.has_user(new_username) or not self.has_user(old_username):
+            return False
 
+        user = self._users_by_name.pop(old_username)
+        user.set_username(new_username)
+        self._invalidate_verification(old_username)
+        self._users_by_name[new_username] = user
+        if self._sorted_index is not None:
+            self._sorted_index.remove(old_username)
+            self._sorted_index.add(new_username)
+        self._names_changed = True
+        return self._save({"op": "rename", "username": old_username,
+                           "new_username": new_username})
+
+    @timed("mutate")
     def update_user_password(self, username, password):
         """
         Update the password of a single user.
@@ -128,12 +642,47 @@ class UserManager:
         :return: Returns true if the operation was successful and false if
         the operation failed.
         """
-        for user in self.users:
-            if user.get_username() == username:
-                user.set_password_and_hash(password)
-                self.write_users_to_yaml()
-                return True
-        return False
+        user = self.get_user(username)
+        if user is None:
+            return False
+
+        password_hash = self.hasher.hash(password)
+        with self._password_lock:
+            user.set_password(password_hash)
+        self._invalidate_verification(username)
+        return self._save({"op": "password", "username": username,
+                           "password": password_hash})
+
+    @timed("mutate")
+    def update_passwords(self, passwords, workers=None,
+                         chunk_size=passwordhash.HASH_CHUNK_SIZE):
+        """
+        Updates the passwords of many users at once. The passwords are
+        hashed in parallel by worker processes, and users.yaml is written
+        once at the end.
+        :param passwords: A mapping from username to new password.
+        :param workers: Optional. The number of worker processes. Defaults
+        to the number of CPUs.
+        :param chunk_size: Optional. The number of passwords a worker hashes
+        at a time.
+        :return: A list with true for every password that was updated and
+        false for every user that does not exist, in the order of the
+        mapping.
+        """
+        results = [self.has_user(username) for username in passwords]
+        usernames = [username for username, exists in zip(passwords, results)
+                     if exists]
+        hashes = passwordhash.hash_passwords(
+            self.hasher, [passwords[username] for username in usernames],
+            workers, chunk_size)
+        with self.batch():
+            for username, password_hash in zip(usernames, hashes):
+                with self._password_lock:
+                    self.get_user(username).set_password(password_hash)
+                self._invalidate_verification(username)
+                self._save({"op": "password", "username": username,
+                            "password": password_hash})
+        return results
 
     def get_users(self):
         """
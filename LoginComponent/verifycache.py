@@ -0,0 +1,103 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 300.0
+KEY_SIZE = 32
+
+
+class VerificationCache:
+    """
+    Remembers recent successful password checks, so a user logging in again
+    does not have to hash their password again. At most one entry is kept per
+    user, and the least recently used entry is dropped when the cache is
+    full. Entries hold an HMAC of the password under a key that only lives
+    in this process, never the password itself, together with the stored
+    password hash they were checked against, so an entry stops matching as
+    soon as the password of the user changes.
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL,
+                 clock=time.monotonic):
+        """
+        :param size: Optional. The maximum number of entries.
+        :param ttl: Optional. The number of seconds an entry is valid.
+        :param clock: Optional. The function returning the current time in
+        seconds.
+        """
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._key = os.urandom(KEY_SIZE)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _digest(self, username, password):
+        return hmac.new(self._key, str(username).encode("utf-8") + b"\0" +
+                        str(password).encode("utf-8"),
+                        hashlib.sha256).digest()
+
+    def check(self, username, password, stored_password):
+        """
+        Checks whether the password of a user was verified recently and
+        counts a hit or a miss.
+        :param username: The username of the user.
+        :param password: The password to check.
+        :param stored_password: The password hash the user has now.
+        :return: Returns true if the password was verified against the same
+        stored password before the entry expired, and false if not.
+        """
+        digest = self._digest(username, password)
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[2] <= self.clock():
+                del self._entries[username]
+                entry = None
+            if entry is not None and entry[1] == stored_password and \
+                    hmac.compare_digest(entry[0], digest):
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, username, password, stored_password):
+        """
+        Remembers a successful password check.
+        :param username: The username of the user.
+        :param password: The password that was verified.
+        :param stored_password: The password hash it was verified against.
+        """
+        if self.size <= 0:
+            return
+        digest = self._digest(username, password)
+        with self._lock:
+            self._entries[username] = (digest, stored_password,
+                                       self.clock() + self.ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username):
+        """
+        Forgets the password check of a user.
+        :param username: The username of the user.
+        """
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        """
+        Forgets all password checks. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,181 @@
+"""
+Watches the yaml configuration files for changes made by other processes,
+such as the cli or someone editing them by hand. inotify is used where it
+is available, and the files are polled otherwise.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# Files are only looked at once they were closed or moved into place, so a
+# file that is still being written is not read halfway.
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_inotify():
+    """
+    Returns libc if it offers inotify, or None if it does not.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def _file_stamp(path):
+    """
+    Returns what identifies the current version of a file, or None if it
+    does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class FileWatcher:
+    """
+    Calls a callback with the paths of the watched files that changed. The
+    files are compared by modification time, size and inode, so the files
+    themselves are only read by the callback.
+    """
+
+    def __init__(self, paths, callback, interval=POLL_INTERVAL,
+                 use_inotify=True):
+        """
+        :param paths: The paths of the files to watch. The files do not
+        have to exist yet.
+        :param callback: The function called with a list of changed paths.
+        :param interval: Optional. The number of seconds between polls when
+        inotify is not used.
+        :param use_inotify: Optional. Whether to use inotify if available.
+        """
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.callback = callback
+        self.interval = interval
+        self._libc = _load_inotify() if use_inotify else None
+        self._stamps = {path: _file_stamp(path) for path in self.paths}
+        self._thread = None
+        self._stop = threading.Event()
+        self._wakeup = None
+
+    def uses_inotify(self):
+        """
+        Checks whether the files are watched with inotify.
+        :return: Returns true for inotify and false for polling.
+        """
+        return self._libc is not None
+
+    def check(self, touched=()):
+        """
+        Compares the files with how they were when last checked and calls
+        the callback if any of them changed.
+        :param touched: Optional. Paths that are known to have been written,
+        which are reported even if their size and modification time look
+        the same.
+        :return: The list of changed paths.
+        """
+        changed = []
+        for path in self.paths:
+            stamp = _file_stamp(path)
+            if stamp != self._stamps[path] or path in touched:
+                self._stamps[path] = stamp
+                changed.append(path)
+        if changed:
+            try:
+                self.callback(changed)
+            except Exception:
+                _LOGGER.exception("The change callback failed")
+        return changed
+
+    def start(self):
+        """
+        Starts watching the files in a background thread.
+        """
+        self._stop.clear()
+        target = self._poll
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                _LOGGER.warning("inotify is not available, polling instead")
+            else:
+                target = self._watch_inotify
+                self._inotify_fd = fd
+                for directory in {os.path.dirname(path)
+                                  for path in self.paths}:
+                    self._libc.inotify_add_watch(
+                        fd, os.fsencode(directory), WATCH_MASK)
+                self._wakeup = os.pipe()
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops watching the files and waits for the background thread.
+        """
+        self._stop.set()
+        if self._wakeup is not None:
+            os.write(self._wakeup[1], b"\0")
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._wakeup is not None:
+            os.close(self._inotify_fd)
+            os.close(self._wakeup[0])
+            os.close(self._wakeup[1])
+            self._wakeup = None
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def _watch_inotify(self):
+        paths_by_name = {}
+        for path in self.paths:
+            paths_by_name.setdefault(os.fsencode(os.path.basename(path)),
+                                     []).append(path)
+        while not self._stop.is_set():
+            readable, _, _ = select.select(
+                [self._inotify_fd, self._wakeup[0]], [], [])
+            if self._inotify_fd not in readable:
+                continue
+            try:
+                data = os.read(self._inotify_fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            touched = set()
+            overflow = False
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                overflow = overflow or bool(mask & IN_Q_OVERFLOW)
+                touched.update(paths_by_name.get(name, ()))
+            if touched or overflow:
+                self.check(touched)
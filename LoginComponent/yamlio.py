@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import marshal
+import os
+import sys
+import tempfile
+import yaml
+
+try:
+    from yaml import CSafeLoader as Loader, CSafeDumper as Dumper
+    LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader as Loader, SafeDumper as Dumper
+    LIBYAML = False
+
+_LOGGER = logging.getLogger(__name__)
+CACHE_SUFFIX = ".cache"
+CACHE_FORMAT = (1, marshal.version) + tuple(sys.version_info[:2])
+
+
+def load_yaml(stream, loader=None):
+    """
+    Parses yaml from a string or file with the libyaml based loader when
+    PyYAML was built with it, or the pure Python loader if not.
+    :param stream: A string or file object containing yaml.
+    :param loader: Optional. The loader class to use instead.
+    :return: The parsed yaml document.
+    """
+    return yaml.load(stream, Loader=loader or Loader)
+
+
+def dump_yaml(data, dumper=None):
+    """
+    Serializes data to a block style yaml string with the libyaml based
+    dumper when PyYAML was built with it, or the pure Python dumper if not.
+    :param data: The data to serialize.
+    :param dumper: Optional. The dumper class to use instead.
+    :return: The yaml string.
+    """
+    return yaml.dump(data, Dumper=dumper or Dumper, default_flow_style=False)
+
+
+def read_yaml_file(path, cache=True):
+    """
+    Reads and parses a yaml file. If cache is true, the parsed document is
+    taken from the snapshot cache beside the file when the cache was made
+    from the current contents of the file, and the cache is refreshed when
+    it was not.
+    :param path: The path of the yaml file.
+    :param cache: Optional. Whether to use the snapshot cache.
+    :return: The parsed yaml document, or None if the file does not exist
+    or is empty.
+    """
+    if not os.path.isfile(path):
+        return None
+    if not cache:
+        with open(path, 'r') as infile:
+            return load_yaml(infile)
+
+    with open(path, 'rb') as infile:
+        content = infile.read()
+        stamp = _stamp(os.fstat(infile.fileno()), content)
+    data = _read_cache(path, stamp)
+    if data is None:
+        data = load_yaml(content.decode("utf-8"))
+        _write_cache(path, stamp, data)
+    return data
+
+
+def write_yaml_file(path, data, cache=True):
+    """
+    Serializes data and writes it to a yaml file. If cache is true, the
+    snapshot cache beside the file is updated as well so the next read does
+    not have to parse the file.
+    :param path: The path of the yaml file.
+    :param data: The data to write.
+    :param cache: Optional. Whether to update the snapshot cache.
+    """
+    write_yaml_content(path, dump_yaml(data), data if cache else None)
+
+
+def write_yaml_content(path, content, data=None):
+    """
+    Writes already serialized yaml to a file. The content is written to a
+    temporary file that then replaces the file, so a crash while writing
+    leaves either the old or the new file and never a truncated one. If
+    data is given, the snapshot cache beside the file is updated with it.
+    :param path: The path of the yaml file.
+    :param content: The yaml string to write.
+    :param data: Optional. The document content was serialized from.
+    """
+    content = content.encode("utf-8")
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, temporary_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp",
+                                          dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as outfile:
+            if os.path.exists(path):
+                os.chmod(temporary_path, os.stat(path).st_mode & 0o7777)
+            outfile.write(content)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+            stamp = _stamp(os.fstat(outfile.fileno()), content)
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    if data is not None:
+        _write_cache(path, stamp, data)
+
+
+def _stamp(stat, content):
+    """
+    Returns the stamp identifying the given contents of a yaml file.
+    """
+    return (stat.st_mtime_ns, stat.st_size,
+            hashlib.sha256(content).hexdigest())
+
+
+def _read_cache(path, stamp):
+    """
+    Returns the cached document of the yaml file at path if the cache
+    matches the given stamp, or None if it does not.
+    """
+    try:
+        with open(path + CACHE_SUFFIX, 'rb') as infile:
+            cache_format, cache_stamp, data = marshal.load(infile)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if cache_format != CACHE_FORMAT or cache_stamp != stamp:
+        return None
+    return data
+
+
+def _write_cache(path, stamp, data):
+    """
+    Stores the parsed document of the yaml file at path in its snapshot
+    cache. Every writer uses its own temporary file, so processes reading
+    the same yaml file at once do not replace each other's cache halfway.
+    Failing to write the cache is not an error.
+    """
+    cache_path = path + CACHE_SUFFIX
+    directory, name = os.path.split(os.path.abspath(cache_path))
+    try:
+        fd, temporary_path = tempfile.mkstemp(prefix=name + ".",
+                                              suffix=".tmp", dir=directory)
+    except OSError as error:
+        _LOGGER.warning("Could not write %s: %s", cache_path, error)
+        return
+    try:
+        with os.fdopen(fd, 'wb') as outfile:
+            marshal.dump((CACHE_FORMAT, stamp, data), outfile)
+        os.replace(temporary_path, cache_path)
+    except (OSError, ValueError) as error:
+        _LOGGER.warning("Could not write %s: %s", cache_path, error)
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
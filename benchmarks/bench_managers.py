@@ -0,0 +1,251 @@
+"""
+Times UserManager, UserGroupManager and CLI operations on synthetic
+users.yaml and groups.yaml files of several sizes and writes the results
+as JSON, so runs on different commits can be compared. Everything runs in
+a temporary directory.
+
+    python benchmarks/bench_managers.py --sizes 100 1000 10000 -o new.json
+    python benchmarks/bench_managers.py --compare old.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from LoginComponent import yamlio
+from LoginComponent.usermanager import UserManager, USERS_YAML_FILE
+from LoginComponent.usergroupmanager import UserGroupManager, \
+    GROUPS_YAML_FILE
+from synthetic import make_users, make_groups
+
+REGRESSION_THRESHOLD = 1.2
+
+
+class Timer:
+    """Accumulates the time spent in a with block over several uses."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.count = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds += time.perf_counter() - self._start
+        self.count += 1
+
+    def per_operation(self):
+        """
+        Returns the average number of seconds per use.
+        """
+        return self.seconds / max(self.count, 1)
+
+
+def remove_caches():
+    """
+    Removes the snapshot caches so the next load parses the yaml files.
+    """
+    for path in (USERS_YAML_FILE, GROUPS_YAML_FILE):
+        if os.path.exists(path + yamlio.CACHE_SUFFIX):
+            os.remove(path + yamlio.CACHE_SUFFIX)
+
+
+def run_size(user_count, group_count, fanout, operations):
+    """
+    Runs every benchmark against one synthetic directory in the current
+    working directory.
+    :return: A dict from operation name to seconds per operation.
+    """
+    yamlio.write_yaml_file(USERS_YAML_FILE, make_users(user_count))
+    yamlio.write_yaml_file(GROUPS_YAML_FILE,
+                           make_groups(user_count, group_count, fanout))
+    results = {}
+
+    for name, factory, attribute in (
+            ("load_users", UserManager, "users"),
+            ("load_groups", UserGroupManager, "user_groups")):
+        remove_caches()
+        with Timer() as timer:
+            getattr(factory(), attribute)
+        results[name + "_cold"] = timer.per_operation()
+        with Timer() as timer:
+            getattr(factory(), attribute)
+        results[name + "_warm"] = timer.per_operation()
+
+    usermanager = UserManager()
+    groupmanager = UserGroupManager()
+    usermanager.users
+    groupmanager.user_groups
+    new_users = ["new_user" + str(i) for i in range(operations)]
+    usergroups = [groupmanager.user_groups[i % group_count]
+                  for i in range(operations)]
+
+    timer = Timer()
+    for username in new_users:
+        with timer:
+            usermanager.create_user(username, "password")
+    results["create_user"] = timer.per_operation()
+
+    timer = Timer()
+    for username, usergroup in zip(new_users, usergroups):
+        with timer:
+            groupmanager.add_user_to_usergroup(username, usergroup,
+                                               usermanager)
+    results["add_user_to_usergroup"] = timer.per_operation()
+
+    timer = Timer()
+    for username, usergroup in zip(new_users, usergroups):
+        with timer:
+            groupmanager.remove_user_from_usergroup(username, usergroup)
+    results["remove_user_from_usergroup"] = timer.per_operation()
+
+    timer = Timer()
+    for i in range(operations):
+        with timer:
+            usermanager.update_user_username("user" + str(i),
+                                             "renamed" + str(i))
+            groupmanager.update_user_in_usergroup("user" + str(i),
+                                                  "renamed" + str(i),
+                                                  usermanager)
+    results["rename_user"] = timer.per_operation()
+
+    timer = Timer()
+    for i in range(operations):
+        with timer:
+            usermanager.delete_user("renamed" + str(i), groupmanager)
+    results["delete_user_cascade"] = timer.per_operation()
+
+    timer = Timer()
+    for _ in range(operations):
+        with timer:
+            usermanager.write_users_to_yaml()
+            groupmanager.write_user_groups_to_yaml()
+    results["dump"] = timer.per_operation()
+
+    results["cli_read_user"] = time_cli(["read-user", "-u",
+                                         "user" + str(operations)])
+    return results
+
+
+def time_cli(arguments):
+    """
+    Returns the wall clock time of running the command line interface with
+    the given arguments in a new process.
+    """
+    command = [sys.executable, "-c",
+               "from LoginComponent.scripts.cli import cli; cli()"]
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+        [path for path in [environment.get("PYTHONPATH")] if path])
+    start = time.perf_counter()
+    subprocess.run(command + arguments, env=environment, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def git_commit():
+    """
+    Returns the abbreviated hash of the checked out commit, if known.
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    """
+    Prints the change per operation between two result files and returns
+    the number of operations that got slower than REGRESSION_THRESHOLD.
+    """
+    with open(old_path) as infile:
+        old = json.load(infile)
+    with open(new_path) as infile:
+        new = json.load(infile)
+    old_results = {(result["users"], result["operation"]): result["seconds"]
+                   for result in old["results"]}
+    regressions = 0
+    print("{:>9} {:<28} {:>10} {:>10} {:>7}".format(
+        "users", "operation", "old (s)", "new (s)", "ratio"))
+    for result in new["results"]:
+        key = (result["users"], result["operation"])
+        if key not in old_results:
+            continue
+        ratio = result["seconds"] / max(old_results[key], 1e-9)
+        flag = ""
+        if ratio > REGRESSION_THRESHOLD:
+            regressions += 1
+            flag = " slower"
+        print("{:>9} {:<28} {:>10.5f} {:>10.5f} {:>7.2f}{}".format(
+            key[0], key[1], old_results[key], result["seconds"], ratio,
+            flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100, 1000, 10000],
+                        help="Numbers of users to generate, up to 10^6.")
+    parser.add_argument("--users-per-group", type=int, default=100)
+    parser.add_argument("--fanout", type=int, default=3,
+                        help="Number of usergroups each user is in.")
+    parser.add_argument("--operations", type=int, default=5,
+                        help="Number of times every mutation is timed.")
+    parser.add_argument("-o", "--output",
+                        help="Write the JSON results to this file instead "
+                             "of stdout.")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="Compare two result files instead.")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    report = {"meta": {"commit": git_commit(),
+                       "python": platform.python_version(),
+                       "libyaml": yamlio.LIBYAML,
+                       "fanout": args.fanout,
+                       "users_per_group": args.users_per_group,
+                       "operations": args.operations},
+              "results": []}
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for size in args.sizes:
+                group_count = max(1, size // args.users_per_group)
+                results = run_size(size, group_count, args.fanout,
+                                   min(args.operations, size))
+                for operation, seconds in results.items():
+                    report["results"].append({"users": size,
+                                              "groups": group_count,
+                                              "operation": operation,
+                                              "seconds": seconds})
+                print("Finished {} users".format(size), file=sys.stderr)
+        finally:
+            os.chdir(working_directory)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            outfile.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
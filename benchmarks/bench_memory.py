@@ -0,0 +1,93 @@
+"""
+Reports the resident memory per user and per usergroup for the current
+User and UserGroup classes and for their former __dict__ based layout that
+kept passwords as hex strings.
+
+    python benchmarks/bench_memory.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import gc
+import hashlib
+import tracemalloc
+
+from LoginComponent.user import User
+from LoginComponent.usergroup import UserGroup
+
+MEMBERS_PER_GROUP = 10
+
+
+class LegacyUser:
+    """The User layout before __slots__ and raw digests."""
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+
+
+class LegacyUserGroup:
+    """The UserGroup layout before __slots__."""
+
+    def __init__(self, name, users, groups):
+        self.name = name
+        self.users = users
+        self.groups = groups
+
+
+def measure(build, count):
+    """
+    Returns the number of bytes per entry that stay allocated after build
+    created count entries.
+    """
+    gc.collect()
+    tracemalloc.start()
+    entries = build(count)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del entries
+    return size / count
+
+
+def build_users(user_class):
+    """
+    Returns a function that creates users of user_class with SHA-512
+    passwords in hex, the way they are read from users.yaml.
+    """
+    def build(count):
+        return [user_class("user" + str(i), hashlib.sha512(
+            str(i).encode("utf-8")).hexdigest()) for i in range(count)]
+    return build
+
+
+def build_groups(group_class):
+    """
+    Returns a function that creates usergroups of group_class with
+    MEMBERS_PER_GROUP users and one Home Assistant group each.
+    """
+    def build(count):
+        return [group_class("group" + str(i),
+                            ["user" + str(i + j)
+                             for j in range(MEMBERS_PER_GROUP)],
+                            ["group.ha" + str(i % 100)]) for i in range(count)]
+    return build
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print("{:>9} {:>10} {:>10} {:>12} {:>12}".format(
+        "entries", "user old", "user new", "group old", "group new"))
+    for size in args.sizes:
+        print("{:>9} {:>10.1f} {:>10.1f} {:>12.1f} {:>12.1f}".format(
+            size,
+            measure(build_users(LegacyUser), size),
+            measure(build_users(User), size),
+            measure(build_groups(LegacyUserGroup), size),
+            measure(build_groups(UserGroup), size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Measures the round trip time of password checks and usergroup lookups
+against a server holding synthetic users and usergroups, and compares it
+with reading the yaml configuration files for every check. Everything runs
+in a temporary directory.
+
+    python benchmarks/bench_server.py --users 10000 --requests 2000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from LoginComponent import yamlio
+from LoginComponent.client import Client
+from LoginComponent.server import Server
+from LoginComponent.usermanager import UserManager, USERS_YAML_FILE
+from LoginComponent.usergroupmanager import GROUPS_YAML_FILE
+from synthetic import make_users, make_groups
+
+
+def percentile(timings, fraction):
+    """
+    Returns the timing below which the given fraction of timings fall.
+    """
+    timings = sorted(timings)
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)]
+
+
+def time_requests(function, count):
+    """
+    Calls function count times with the index of the call.
+    :return: The list of seconds per call.
+    """
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        function(i)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        yamlio.write_yaml_file(USERS_YAML_FILE, make_users(args.users))
+        yamlio.write_yaml_file(GROUPS_YAML_FILE, make_groups(
+            args.users, args.groups, args.fanout))
+
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        asyncio.run_coroutine_threadsafe(Server().start("bench.sock"),
+                                         loop).result()
+        client = Client("bench.sock")
+
+        def verify(i):
+            name = "user" + str(i % args.users)
+            client.request("verify", username=name, password=str(i))
+
+        def groups_for(i):
+            client.request("groups_for", username="user" + str(i % args.users))
+
+        def verify_from_yaml(i):
+            UserManager().get_user("user" + str(i % args.users))
+
+        print("{:>16} {:>10} {:>10}".format("request", "p50 (ms)",
+                                            "p99 (ms)"))
+        for name, function, count in (
+                ("verify", verify, args.requests),
+                ("groups_for", groups_for, args.requests),
+                ("yaml per check", verify_from_yaml,
+                 max(args.requests // 100, 1))):
+            timings = time_requests(function, count)
+            print("{:>16} {:>10.3f} {:>10.3f}".format(
+                name, percentile(timings, 0.5) * 1000,
+                percentile(timings, 0.99) * 1000))
+        client.close()
+        loop.call_soon_threadsafe(loop.stop)
+        os.chdir(os.path.dirname(directory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares load and dump times of the libyaml based and the pure Python yaml
+loader and dumper on synthetic users.yaml files, and the time it takes to
+read such a file from its snapshot cache.
+
+    python benchmarks/bench_yaml.py --sizes 1000 10000 50000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import yaml
+
+from LoginComponent import yamlio
+from synthetic import make_users
+
+PATHS = [("pure", yaml.SafeLoader, yaml.SafeDumper)]
+if yamlio.LIBYAML:
+    PATHS.append(("libyaml", yaml.CSafeLoader, yaml.CSafeDumper))
+
+
+def best_of(repeat, function, *args):
+    """
+    Returns the fastest of repeat calls of function in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not yamlio.LIBYAML:
+        print("PyYAML was built without libyaml, only timing the pure "
+              "Python path.")
+    print("{:>8} {:>8} {:>10} {:>10}".format("users", "path", "load (s)",
+                                            "dump (s)"))
+    for size in args.sizes:
+        users = make_users(size)
+        document = yamlio.dump_yaml(users)
+        for name, loader, dumper in PATHS:
+            load_time = best_of(args.repeat, yamlio.load_yaml, document,
+                                loader)
+            dump_time = best_of(args.repeat, yamlio.dump_yaml, users, dumper)
+            print("{:>8} {:>8} {:>10.4f} {:>10.4f}".format(
+                size, name, load_time, dump_time))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "users.yaml")
+            yamlio.write_yaml_file(path, users)
+            load_time = best_of(args.repeat, yamlio.read_yaml_file, path)
+            print("{:>8} {:>8} {:>10.4f} {:>10}".format(size, "cached",
+                                                       load_time, "-"))
+
+
+if __name__ == "__main__":
+    main()
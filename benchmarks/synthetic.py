@@ -0,0 +1,33 @@
+"""
+Generates synthetic users.yaml and groups.yaml contents for benchmarks.
+"""
+
+import hashlib
+
+
+def make_users(count):
+    """
+    Builds a dict of users shaped like the contents of users.yaml.
+    :param count: The number of users to generate.
+    """
+    return {"user" + str(i): {"password": hashlib.sha512(
+        str(i).encode("utf-8")).hexdigest()} for i in range(count)}
+
+
+def make_groups(user_count, group_count, fanout):
+    """
+    Builds a dict of usergroups shaped like the contents of groups.yaml.
+    Every user is a member of fanout usergroups, spread evenly over all
+    usergroups, and every usergroup grants one Home Assistant group.
+    :param user_count: The number of users named user0, user1, ...
+    :param group_count: The number of usergroups to generate.
+    :param fanout: The number of usergroups each user is a member of.
+    """
+    groups = {"group" + str(i): {"users": [], "groups": ["group.ha" + str(i)]}
+              for i in range(group_count)}
+    fanout = min(fanout, group_count)
+    for i in range(user_count):
+        for k in range(fanout):
+            group = (i + k * group_count // fanout) % group_count
+            groups["group" + str(group)]["users"].append("user" + str(i))
+    return groups
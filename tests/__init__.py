@@ -0,0 +1,5 @@
+# The tests hash passwords with the fewest iterations allowed to stay fast.
+from LoginComponent import passwordhash
+
+passwordhash.DEFAULT_HASHER = passwordhash.PasswordHasher(
+    passwordhash.MIN_ITERATIONS)
@@ -0,0 +1,139 @@
+import unittest
+import asyncio
+import os
+import threading
+import time
+from unittest import mock
+from LoginComponent import asyncmanager
+from LoginComponent.asyncmanager import AsyncUserGroupManager, \
+    AsyncUserManager
+from LoginComponent.passwordhash import MIN_ITERATIONS, PasswordHasher
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+
+
+class test_asyncmanager(unittest.TestCase):
+    """Unit tests for the asyncio managers"""
+
+    def tearDown(self):
+        for path in ('groups.yaml', 'groups.yaml.cache', 'groups.yaml.lock',
+                     'users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_lookup_before_load(self):
+        async def run():
+            usermanager = AsyncUserManager()
+            with self.assertRaises(RuntimeError):
+                usermanager.get_user('test_user')
+            with self.assertRaises(RuntimeError):
+                await usermanager.create_user('test_user', 'secret')
+            await usermanager.load()
+            self.assertEqual(usermanager.get_user('test_user'), None)
+        asyncio.run(run())
+
+    def test_load_runs_in_executor(self):
+        threads = []
+        read_users = UserManager.read_users
+
+        def record_thread(manager):
+            threads.append(threading.current_thread())
+            return read_users(manager)
+
+        async def run():
+            usermanager = AsyncUserManager()
+            with mock.patch.object(UserManager, 'read_users', record_thread):
+                await usermanager.load()
+            self.assertEqual(usermanager.is_loaded(), True)
+        asyncio.run(run())
+        self.assertNotEqual(threads, [threading.main_thread()])
+
+    def test_concurrent_mutations(self):
+        async def run():
+            usermanager = AsyncUserManager()
+            await usermanager.load()
+            results = await asyncio.gather(*(
+                usermanager.create_user('test_user' + str(i), 'secret')
+                for i in range(20)))
+            self.assertEqual(results, [True] * 20)
+        asyncio.run(run())
+        self.assertEqual(len(UserManager().users), 20)
+
+    def test_loop_not_blocked_by_write(self):
+        write_users = UserManager.write_users_to_yaml
+
+        def slow_write(manager):
+            time.sleep(0.2)
+            write_users(manager)
+
+        async def tick(ticks, done):
+            while not done.is_set():
+                ticks.append(None)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            usermanager = AsyncUserManager()
+            await usermanager.load()
+            ticks, done = [], asyncio.Event()
+            ticker = asyncio.ensure_future(tick(ticks, done))
+            with mock.patch.object(UserManager, 'write_users_to_yaml',
+                                   slow_write):
+                await usermanager.create_user('test_user', 'secret')
+            done.set()
+            await ticker
+            self.assertGreater(len(ticks), 5)
+            self.assertEqual(usermanager.has_user('test_user'), True)
+        asyncio.run(run())
+
+    def test_verify_password_flushes_rehashes(self):
+        UserManager().create_user('test_user', 'secret')
+
+        async def run():
+            usermanager = AsyncUserManager(UserManager(
+                hasher=PasswordHasher(MIN_ITERATIONS * 2)))
+            await usermanager.load()
+            with mock.patch.object(asyncmanager, 'REHASH_FLUSH_DELAY', 0):
+                self.assertEqual(await usermanager.verify_password(
+                    'test_user', 'secret'), True)
+                self.assertEqual(await usermanager.verify_password(
+                    'test_user', 'wrong'), False)
+                await asyncio.sleep(0.01)
+                while usermanager._flush is not None:
+                    await asyncio.sleep(0.01)
+            self.assertEqual(usermanager.manager.has_rehashes(), False)
+        asyncio.run(run())
+        self.assertEqual(PasswordHasher(MIN_ITERATIONS * 2).needs_rehash(
+            UserManager().get_user('test_user').get_password()), False)
+
+    def test_bulk_mutations(self):
+        async def run():
+            usermanager = AsyncUserManager()
+            await usermanager.load()
+            self.assertEqual(await usermanager.create_users(
+                [('user1', 'secret'), ('user1', 'secret')]), [True, False])
+            self.assertEqual(await usermanager.update_passwords(
+                {'user1': 'new_secret'}), [True])
+        asyncio.run(run())
+        self.assertEqual(UserManager().verify_password('user1',
+                                                       'new_secret'), True)
+
+    def test_delete_user_from_usergroups(self):
+        async def run():
+            usermanager = AsyncUserManager()
+            groupmanager = AsyncUserGroupManager()
+            await usermanager.load()
+            await groupmanager.load()
+            await usermanager.create_user('test_user', 'secret')
+            await groupmanager.create_group('test_group')
+            usergroup = groupmanager.get_usergroup('test_group')
+            self.assertEqual(await groupmanager.add_user_to_usergroup(
+                'test_user', usergroup, usermanager), True)
+            self.assertEqual(await usermanager.delete_user('test_user',
+                                                           groupmanager),
+                             True)
+            self.assertEqual(groupmanager.get_usergroups_for_user(
+                'test_user'), [])
+        asyncio.run(run())
+        self.assertEqual(UserGroupManager().get_usergroup('test_group').
+                         get_users(), [])
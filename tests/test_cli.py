@@ -0,0 +1,149 @@
+import unittest
+import json
+import os
+import subprocess
+import sys
+from unittest import mock
+from click.testing import CliRunner
+from LoginComponent.scripts import cli
+
+# Modules that take long to import and are only needed by some commands.
+HEAVY_MODULES = ['yaml', 'multiprocessing', 'sqlite3', 'asyncio', 'readline',
+                 'LoginComponent.usermanager',
+                 'LoginComponent.usergroupmanager', 'LoginComponent.client']
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__)))
+
+
+def run_python(code):
+    """ Runs code in a new Python process and returns its output. """
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = PROJECT_DIRECTORY
+    return subprocess.check_output([sys.executable, '-c', code],
+                                   env=environment).decode()
+
+
+class test_cli(unittest.TestCase):
+    """Unit tests for the command line interface"""
+
+    def tearDown(self):
+        for path in ('users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names',
+                     'groups.yaml.lock', 'hashing.yaml'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_import_does_not_load_managers(self):
+        loaded = json.loads(run_python(
+            'import json, sys\n'
+            'import LoginComponent.scripts.cli\n'
+            'print(json.dumps(sorted(sys.modules)))'))
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, loaded)
+
+    def test_help_does_not_load_managers(self):
+        loaded = json.loads(run_python(
+            'import json, sys\n'
+            'from LoginComponent.scripts.cli import cli\n'
+            'try:\n'
+            '    cli(["--help"])\n'
+            'except SystemExit:\n'
+            '    pass\n'
+            'print(json.dumps(sorted(sys.modules)))').splitlines()[-1])
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, loaded)
+
+    def test_default_socket_matches_client(self):
+        from LoginComponent import client
+        self.assertEqual(cli.DEFAULT_SOCKET, client.DEFAULT_SOCKET)
+
+    def test_no_clear_by_default(self):
+        with mock.patch('click.clear') as clear:
+            CliRunner().invoke(cli.cli, ['read-users'])
+            self.assertEqual(clear.call_count, 0)
+
+    def test_clear(self):
+        with mock.patch('click.clear') as clear:
+            CliRunner().invoke(cli.cli, ['--clear', 'read-users'])
+            self.assertEqual(clear.call_count, 1)
+
+    def test_create_and_read_user(self):
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, ['create-user', '-u', 'test_user',
+                                         '-p', 'secret'])
+        self.assertEqual(result.exit_code, 0)
+        result = runner.invoke(cli.cli, ['read-user', '-u', 'test_user'])
+        self.assertIn('Username: test_user', result.output)
+
+    def test_read_users_match_and_pagination(self):
+        runner = CliRunner()
+        for username in ('carol', 'alice', 'albert', 'bob'):
+            runner.invoke(cli.cli, ['create-user', '-u', username,
+                                    '-p', 'secret'])
+        result = runner.invoke(cli.cli, ['read-users'])
+        self.assertEqual([line.split()[1] for line in
+                          result.output.splitlines()],
+                         ['albert', 'alice', 'bob', 'carol'])
+        result = runner.invoke(cli.cli, ['read-users', '--match', 'al',
+                                         '--offset', '1'])
+        self.assertEqual([line.split()[1] for line in
+                          result.output.splitlines()], ['alice'])
+        result = runner.invoke(cli.cli, ['read-users', '-m', '*o*',
+                                         '--limit', '1'])
+        self.assertEqual([line.split()[1] for line in
+                          result.output.splitlines()], ['bob'])
+        result = runner.invoke(cli.cli, ['read-users', '--limit', '-1'])
+        self.assertEqual(result.exit_code, 2)
+
+    def test_read_users_writes_in_chunks(self):
+        runner = CliRunner()
+        for username in ('alice', 'albert', 'bob'):
+            runner.invoke(cli.cli, ['create-user', '-u', username,
+                                    '-p', 'secret'])
+        with mock.patch.object(cli, 'OUTPUT_CHUNK', 2), \
+                mock.patch('click.echo') as echo:
+            runner.invoke(cli.cli, ['read-users'])
+            self.assertEqual(echo.call_count, 2)
+
+    def test_select_user_by_search(self):
+        runner = CliRunner()
+        for username in ('alice', 'albert', 'bob'):
+            runner.invoke(cli.cli, ['create-user', '-u', username,
+                                    '-p', 'secret'])
+        result = runner.invoke(cli.cli, ['read-user'], input='al\n2\n')
+        self.assertIn('Username: alice', result.output)
+        result = runner.invoke(cli.cli, ['read-user'], input='b*\n')
+        self.assertIn('Username: bob', result.output)
+        result = runner.invoke(cli.cli, ['read-user'], input='x\nbob\n')
+        self.assertIn('The given user does not exist!', result.output)
+        self.assertIn('Username: bob', result.output)
+
+    def test_select_menu_is_limited(self):
+        runner = CliRunner()
+        for i in range(cli.MENU_SIZE + 5):
+            runner.invoke(cli.cli, ['create-user', '-u', 'user' + str(i),
+                                    '-p', 'secret'])
+        result = runner.invoke(cli.cli, ['read-user'], input='user0\n')
+        self.assertIn('type a prefix or pattern', result.output)
+        self.assertNotIn('[' + str(cli.MENU_SIZE + 1) + ']', result.output)
+
+    def test_calibrate_hash(self):
+        with mock.patch('LoginComponent.passwordhash.calibrate',
+                        return_value=2000):
+            result = CliRunner().invoke(cli.cli, ['calibrate-hash', '-t',
+                                                  '5'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('2000 iterations', result.output)
+        from LoginComponent.passwordhash import read_hasher
+        self.assertEqual(read_hasher().iterations, 2000)
+        result = CliRunner().invoke(cli.cli, ['create-user', '-u',
+                                              'test_user', '-p', 'secret'])
+        from LoginComponent.usermanager import UserManager
+        self.assertEqual(UserManager().get_user('test_user').get_password().
+                         split('$')[1], '2000')
+
+    def test_calibrate_hash_dry_run(self):
+        result = CliRunner().invoke(cli.cli, ['calibrate-hash', '-t', '1',
+                                              '--dry-run'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(os.path.exists('hashing.yaml'), False)
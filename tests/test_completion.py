@@ -0,0 +1,149 @@
+import unittest
+import os
+import subprocess
+import sys
+from click.testing import CliRunner
+from LoginComponent import completion
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+from LoginComponent.scripts.cli import cli
+
+PROG_NAME = 'user-management-home-assistant'
+COMPLETE_VARIABLE = '_USER_MANAGEMENT_HOME_ASSISTANT_COMPLETE'
+NAMES_FILE = 'test.names'
+
+
+class test_completion(unittest.TestCase):
+    """Unit tests for the name index files used by shell completion"""
+
+    def tearDown(self):
+        for path in ('groups.yaml', 'groups.yaml.cache', 'groups.yaml.lock',
+                     'users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names', NAMES_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def complete(self, words):
+        result = CliRunner().invoke(cli, prog_name=PROG_NAME, env={
+            COMPLETE_VARIABLE: 'bash_complete',
+            'COMP_WORDS': PROG_NAME + ' ' + words,
+            'COMP_CWORD': str(len(words.split(' ')))})
+        self.assertEqual(result.exit_code, 0)
+        return [line.split(',', 1)[1] for line in
+                result.output.splitlines()]
+
+    def test_complete(self):
+        completion.write_names(NAMES_FILE, {
+            completion.USERS: ['test_user2', 'other', 'test_user']})
+        self.assertEqual(completion.complete(NAMES_FILE, completion.USERS,
+                                             'test'),
+                         ['test_user', 'test_user2'])
+        self.assertEqual(completion.complete(NAMES_FILE, completion.USERS,
+                                             ''),
+                         ['other', 'test_user', 'test_user2'])
+        self.assertEqual(completion.complete(NAMES_FILE,
+                                             completion.USERGROUPS, ''), [])
+
+    def test_complete_without_file(self):
+        self.assertEqual(completion.complete(NAMES_FILE, completion.USERS,
+                                             ''), [])
+        with open(NAMES_FILE, 'w') as outfile:
+            outfile.write('not json')
+        self.assertEqual(completion.complete(NAMES_FILE, completion.USERS,
+                                             ''), [])
+
+    def test_is_stale(self):
+        self.assertEqual(completion.is_stale(NAMES_FILE, ['users.yaml']),
+                         False)
+        UserManager().create_user('test_user', 'secret')
+        os.remove('users.yaml.names')
+        self.assertEqual(completion.is_stale('users.yaml.names',
+                                             ['users.yaml']), True)
+        completion.write_names('users.yaml.names', {})
+        self.assertEqual(completion.is_stale('users.yaml.names',
+                                             ['users.yaml']), False)
+
+    def test_managers_keep_names_file(self):
+        user_manager = UserManager()
+        user_manager.create_user('test_user', 'secret')
+        user_manager.create_user('test_user2', 'secret')
+        user_manager.update_user_username('test_user2', 'renamed_user')
+        self.assertEqual(completion.is_marked_stale('users.yaml.names'),
+                         True)
+        UserManager().read_users()
+        self.assertEqual(completion.read_names('users.yaml.names',
+                                               completion.USERS),
+                         ['renamed_user', 'test_user'])
+        user_manager.update_user_password('test_user', 'other_secret')
+        self.assertEqual(completion.is_marked_stale('users.yaml.names'),
+                         False)
+        group_manager = UserGroupManager()
+        group_manager.create_group('test_group')
+        group_manager.add_group_to_usergroup(
+            'group.kitchen', group_manager.get_usergroup('test_group'))
+        self.assertEqual(completion.is_marked_stale('groups.yaml.names'),
+                         True)
+        UserGroupManager().read_groups()
+        self.assertEqual(completion.read_names('groups.yaml.names',
+                                               completion.USERGROUPS),
+                         ['test_group'])
+        self.assertEqual(completion.read_names('groups.yaml.names',
+                                               completion.GROUPS),
+                         ['group.kitchen'])
+
+    def test_read_users_writes_stale_names_file(self):
+        UserManager().create_user('test_user', 'secret')
+        os.remove('users.yaml.names')
+        UserManager().read_users()
+        self.assertEqual(completion.read_names('users.yaml.names',
+                                               completion.USERS),
+                         ['test_user'])
+
+    def test_mark_stale(self):
+        completion.mark_stale(NAMES_FILE)
+        self.assertEqual(completion.is_marked_stale(NAMES_FILE), True)
+        completion.touch(NAMES_FILE)
+        self.assertEqual(completion.is_marked_stale(NAMES_FILE), True)
+        completion.write_names(NAMES_FILE, {completion.USERS: ['test_user']})
+        self.assertEqual(completion.is_marked_stale(NAMES_FILE), False)
+
+    def test_cli_completion_writes_stale_names_file(self):
+        UserManager().create_user('test_user', 'secret')
+        self.assertEqual(completion.is_marked_stale('users.yaml.names'),
+                         True)
+        self.assertEqual(self.complete('delete-user -u te'), ['test_user'])
+        self.assertEqual(completion.is_marked_stale('users.yaml.names'),
+                         False)
+
+    def test_cli_completion(self):
+        user_manager = UserManager()
+        user_manager.create_user('test_user', 'secret')
+        user_manager.create_user('other', 'secret')
+        group_manager = UserGroupManager()
+        group_manager.create_group('test_group')
+        group_manager.add_group_to_usergroup(
+            'group.kitchen', group_manager.get_usergroup('test_group'))
+        self.assertEqual(self.complete('delete-user -u te'),
+                         ['test_user'])
+        self.assertEqual(self.complete('delete-usergroup -ug '),
+                         ['test_group'])
+        self.assertEqual(self.complete('add-group-to-usergroup -g gr'),
+                         ['group.kitchen'])
+
+    def test_cli_completion_does_not_load_yaml(self):
+        UserManager().create_user('test_user', 'secret')
+        UserManager().read_users()
+        code = ('import sys\n'
+                'from LoginComponent.scripts.cli import cli\n'
+                'try:\n'
+                '    cli(prog_name=%r)\n'
+                'except SystemExit:\n'
+                '    pass\n'
+                'print("yaml" in sys.modules)\n' % PROG_NAME)
+        env = dict(os.environ, COMP_WORDS=PROG_NAME + ' delete-user -u t',
+                   COMP_CWORD='3')
+        env[COMPLETE_VARIABLE] = 'bash_complete'
+        output = subprocess.run([sys.executable, '-c', code], env=env,
+                                stdout=subprocess.PIPE,
+                                universal_newlines=True).stdout
+        self.assertEqual(output.splitlines(), ['plain,test_user', 'False'])
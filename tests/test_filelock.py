@@ -0,0 +1,278 @@
+import unittest
+import os
+import subprocess
+import sys
+from unittest import mock
+from LoginComponent.filelock import FileLock
+from LoginComponent.journal import Journal
+from LoginComponent.sqlitestorage import SqliteGroupStorage, \
+    SqliteUserStorage
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+
+PROCESSES = 8
+OPERATIONS = 10
+DATABASE = 'test.db'
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__)))
+
+CREATE_USERS = '''
+import sys
+from LoginComponent.passwordhash import MIN_ITERATIONS, PasswordHasher
+from LoginComponent.usermanager import UserManager
+user_manager = UserManager(hasher=PasswordHasher(MIN_ITERATIONS))
+user_manager.users
+for i in range({operations}):
+    assert user_manager.create_user('user' + sys.argv[1] + '_' + str(i),
+                                    'secret')
+'''
+
+ADD_GROUPS = '''
+import sys
+from LoginComponent.usergroupmanager import UserGroupManager
+group_manager = UserGroupManager()
+for i in range({operations}):
+    user_group = group_manager.get_usergroup('test_group')
+    assert group_manager.add_group_to_usergroup(
+        'group.' + sys.argv[1] + '_' + str(i), user_group)
+'''
+
+
+def run_processes(code):
+    """ Runs code in PROCESSES processes at once and waits for them. """
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = PROJECT_DIRECTORY
+    processes = [subprocess.Popen([sys.executable, '-c', code, str(i)],
+                                  env=environment)
+                 for i in range(PROCESSES)]
+    return [process.wait() for process in processes]
+
+
+class test_filelock(unittest.TestCase):
+    """Unit tests for the file lock and concurrent access"""
+
+    def tearDown(self):
+        for path in ('groups.yaml', 'groups.yaml.cache', 'groups.yaml.lock',
+                     'users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names',
+                     'test.yaml.lock', 'users.yaml.journal',
+                     'groups.yaml.journal', DATABASE, DATABASE + '-wal',
+                     DATABASE + '-shm', DATABASE + '-users.names',
+                     DATABASE + '-usergroups.names'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_generation(self):
+        lock = FileLock('test.yaml')
+        with lock.shared():
+            self.assertEqual(lock.generation(), 0)
+        with lock.exclusive():
+            self.assertEqual(lock.increment(), 1)
+            self.assertEqual(lock.increment(), 2)
+        with FileLock('test.yaml').shared() as other_lock:
+            self.assertEqual(other_lock.generation(), 2)
+
+    def test_generation_needs_lock(self):
+        lock = FileLock('test.yaml')
+        with self.assertRaises(RuntimeError):
+            lock.generation()
+        with lock.shared():
+            with self.assertRaises(RuntimeError):
+                lock.increment()
+
+    def test_shared_lock_does_not_create_file(self):
+        lock = FileLock('test.yaml')
+        with lock.shared():
+            self.assertEqual(lock.generation(), 0)
+        self.assertEqual(os.path.exists('test.yaml.lock'), False)
+
+    def test_read_only_directory(self):
+        UserManager().create_user('test_user', 'secret')
+        os.remove('users.yaml.lock')
+        with mock.patch('os.open', side_effect=self.read_only_open):
+            self.assertEqual(UserManager().has_user('test_user'), True)
+        self.assertEqual(os.path.exists('users.yaml.lock'), False)
+
+    @staticmethod
+    def read_only_open(path, flags, *args, _open=os.open):
+        if path.endswith('.lock') and flags & (os.O_CREAT | os.O_RDWR):
+            raise PermissionError(path)
+        return _open(path, flags, *args)
+
+    def test_nesting(self):
+        lock = FileLock('test.yaml')
+        with lock.exclusive():
+            with lock.shared():
+                lock.increment()
+            self.assertEqual(lock.increment(), 2)
+        with lock.shared():
+            with self.assertRaises(RuntimeError):
+                with lock.exclusive():
+                    pass
+
+    def test_stale_manager_merges(self):
+        user_manager = UserManager()
+        stale_manager = UserManager()
+        self.assertEqual(stale_manager.users, [])
+        user_manager.create_user('test_user', 'secret')
+        stale_manager.create_user('test_user2', 'secret')
+        self.assertEqual(stale_manager.has_user('test_user'), True)
+        self.assertEqual([user.get_username() for user in
+                          UserManager().users], ['test_user', 'test_user2'])
+
+    def user_managers(self):
+        """
+        Yields a function making UserManagers for every kind of storage,
+        with test_user and test_user2 created.
+        """
+        storages = []
+
+        def sqlite_manager():
+            storage = SqliteUserStorage(DATABASE)
+            storages.append(storage)
+            return UserManager(storage=storage)
+
+        for make_manager in (UserManager,
+                             lambda: UserManager(Journal('users.yaml')),
+                             sqlite_manager):
+            make_manager().create_users([('test_user', 'secret'),
+                                         ('test_user2', 'secret')])
+            try:
+                yield make_manager
+            finally:
+                for storage in storages:
+                    storage.close()
+                del storages[:]
+                self.tearDown()
+
+    def test_update_of_deleted_user(self):
+        for make_manager in self.user_managers():
+            stale_manager = make_manager()
+            self.assertEqual(len(stale_manager.users), 2)
+            make_manager().delete_user('test_user2')
+            self.assertEqual(stale_manager.update_user_password(
+                'test_user2', 'new_secret'), False)
+            self.assertEqual(stale_manager.has_user('test_user2'), False)
+            self.assertEqual([user.get_username() for user in
+                              make_manager().users], ['test_user'])
+
+    def test_update_of_renamed_user(self):
+        for make_manager in self.user_managers():
+            stale_manager = make_manager()
+            self.assertEqual(len(stale_manager.users), 2)
+            make_manager().update_user_username('test_user2',
+                                                'renamed_user')
+            self.assertEqual(stale_manager.update_user_password(
+                'test_user2', 'new_secret'), False)
+            self.assertEqual(stale_manager.update_user_username(
+                'test_user2', 'other_user'), False)
+            self.assertEqual(sorted(user.get_username() for user in
+                                    make_manager().users),
+                             ['renamed_user', 'test_user'])
+            self.assertEqual(make_manager().verify_password(
+                'renamed_user', 'secret'), True)
+
+    def test_create_of_created_user(self):
+        for make_manager in self.user_managers():
+            stale_manager = make_manager()
+            self.assertEqual(len(stale_manager.users), 2)
+            make_manager().create_user('new_user', 'secret')
+            self.assertEqual(stale_manager.create_user('new_user',
+                                                       'other_secret'), False)
+            self.assertEqual(make_manager().verify_password(
+                'new_user', 'secret'), True)
+            self.assertEqual(stale_manager.verify_password(
+                'new_user', 'secret'), True)
+            other_manager = make_manager()
+            other_manager.users
+            make_manager().create_user('bulk_user', 'secret')
+            self.assertEqual(other_manager.create_users(
+                [('bulk_user', 'other_secret'), ('bulk_user2', 'secret')]),
+                [False, True])
+            self.assertEqual(make_manager().verify_password(
+                'bulk_user', 'secret'), True)
+
+    def test_stale_group_manager_merges(self):
+        group_manager = UserGroupManager()
+        group_manager.create_group('test_group')
+        stale_manager = UserGroupManager()
+        stale_group = stale_manager.get_usergroup('test_group')
+        group_manager.add_group_to_usergroup(
+            'group.kitchen', group_manager.get_usergroup('test_group'))
+        stale_manager.add_group_to_usergroup('group.hall', stale_group)
+        self.assertEqual(stale_group.get_groups(),
+                         ['group.kitchen', 'group.hall'])
+
+    def group_managers(self):
+        """
+        Yields a function making UserGroupManagers for every kind of
+        storage, with test_group and test_group2 created.
+        """
+        storages = []
+
+        def sqlite_manager():
+            storage = SqliteGroupStorage(DATABASE)
+            storages.append(storage)
+            return UserGroupManager(storage=storage)
+
+        for make_manager in (UserGroupManager,
+                             lambda: UserGroupManager(Journal('groups.yaml')),
+                             sqlite_manager):
+            group_manager = make_manager()
+            group_manager.create_group('test_group')
+            group_manager.create_group('test_group2')
+            try:
+                yield make_manager
+            finally:
+                for storage in storages:
+                    storage.close()
+                del storages[:]
+                self.tearDown()
+
+    def test_update_of_deleted_usergroup(self):
+        for make_manager in self.group_managers():
+            stale_manager = make_manager()
+            stale_group = stale_manager.get_usergroup('test_group2')
+            make_manager().delete_usergroup('test_group2')
+            self.assertEqual(stale_manager.add_group_to_usergroup(
+                'group.kitchen', stale_group), False)
+            self.assertEqual(stale_manager.has_usergroup('test_group2'),
+                             False)
+            self.assertEqual([user_group.get_name() for user_group in
+                              make_manager().user_groups], ['test_group'])
+
+    def test_update_of_renamed_usergroup(self):
+        for make_manager in self.group_managers():
+            stale_manager = make_manager()
+            self.assertEqual(len(stale_manager.user_groups), 2)
+            make_manager().update_usergroup_name('test_group2',
+                                                 'renamed_group')
+            self.assertEqual(stale_manager.update_usergroup_name(
+                'test_group2', 'other_group'), False)
+            self.assertEqual(sorted(user_group.get_name() for user_group in
+                                    make_manager().user_groups),
+                             ['renamed_group', 'test_group'])
+
+    def test_create_of_created_usergroup(self):
+        for make_manager in self.group_managers():
+            stale_manager = make_manager()
+            self.assertEqual(len(stale_manager.user_groups), 2)
+            group_manager = make_manager()
+            group_manager.create_group('new_group')
+            group_manager.add_group_to_usergroup(
+                'group.kitchen', group_manager.get_usergroup('new_group'))
+            self.assertEqual(stale_manager.create_group('new_group'), False)
+            self.assertEqual(make_manager().get_usergroup('new_group').
+                             get_groups(), ['group.kitchen'])
+
+    def test_concurrent_processes_create_users(self):
+        self.assertEqual(run_processes(CREATE_USERS.format(
+            operations=OPERATIONS)), [0] * PROCESSES)
+        self.assertEqual(len(UserManager().users), PROCESSES * OPERATIONS)
+
+    def test_concurrent_processes_update_usergroup(self):
+        UserGroupManager().create_group('test_group')
+        self.assertEqual(run_processes(ADD_GROUPS.format(
+            operations=OPERATIONS)), [0] * PROCESSES)
+        self.assertEqual(len(UserGroupManager().get_usergroup('test_group').
+                             get_groups()), PROCESSES * OPERATIONS)
@@ -0,0 +1,121 @@
+import unittest
+import os
+from unittest import mock
+from LoginComponent.journal import Journal
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+
+
+class test_journal(unittest.TestCase):
+    """Unit tests for the journal and the journaled storage mode"""
+
+    def setUp(self):
+        self.user_journal = Journal('users.yaml')
+        self.group_journal = Journal('groups.yaml')
+        self.user_manager = UserManager(self.user_journal)
+        self.user_manager.create_user('test_user', 'test_password')
+        self.user_group_manager = UserGroupManager(self.group_journal)
+        self.user_group_manager.create_group('test_group')
+
+    def tearDown(self):
+        for path in ('users.yaml', 'groups.yaml', 'users.yaml.journal',
+                     'groups.yaml.journal', 'users.yaml.cache',
+                     'groups.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names',
+                     'groups.yaml.lock'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_journal_append_and_read(self):
+        journal = Journal('test.yaml')
+        self.addCleanup(journal.clear)
+        journal.append([{"op": "create", "username": "a"}])
+        journal.append([{"op": "delete", "username": "a"},
+                        {"op": "create", "username": "b"}])
+        self.assertEqual(journal.read(), [{"op": "create", "username": "a"},
+                                          {"op": "delete", "username": "a"},
+                                          {"op": "create", "username": "b"}])
+        self.assertEqual(journal.record_count, 3)
+
+    def test_journal_ignores_partial_record(self):
+        journal = Journal('test.yaml')
+        self.addCleanup(journal.clear)
+        journal.append([{"op": "create", "username": "a"}])
+        with open(journal.path, 'a') as outfile:
+            outfile.write('{"op": "crea')
+        self.assertEqual(journal.read(), [{"op": "create", "username": "a"}])
+
+    def test_journal_needs_compaction(self):
+        journal = Journal('test.yaml', max_records=2)
+        self.addCleanup(journal.clear)
+        journal.append([{"op": "create", "username": "a"}])
+        self.assertEqual(journal.needs_compaction(), False)
+        journal.append([{"op": "create", "username": "b"}])
+        self.assertEqual(journal.needs_compaction(), True)
+
+    def test_mutations_do_not_rewrite_yaml(self):
+        with mock.patch.object(self.user_manager, 'write_users_to_yaml') \
+                as write:
+            self.user_manager.update_user_password('test_user', 'new')
+            self.assertEqual(write.call_count, 0)
+        self.assertEqual(os.path.exists('users.yaml'), False)
+
+    def test_replay_users(self):
+        self.user_manager.create_user('test_user2', 'test_password')
+        self.user_manager.update_user_password('test_user', 'new')
+        self.user_manager.update_user_username('test_user', 'renamed')
+        self.user_manager.delete_user('test_user2')
+        user_manager = UserManager(Journal('users.yaml'))
+        self.assertEqual([user.get_username() for user in
+                          user_manager.get_users()], ['renamed'])
+        self.assertEqual(user_manager.get_user('renamed').get_password(),
+                         self.user_manager.get_user('renamed').get_password())
+
+    def test_replay_usergroups(self):
+        self.user_manager.create_user('test_user2', 'test_password')
+        usergroup = self.user_group_manager.get_usergroup('test_group')
+        self.user_group_manager.add_user_to_usergroup(
+            'test_user', usergroup, self.user_manager)
+        self.user_group_manager.add_user_to_usergroup(
+            'test_user2', usergroup, self.user_manager)
+        self.user_group_manager.add_group_to_usergroup('ha_group', usergroup)
+        self.user_group_manager.update_usergroup_name('test_group',
+                                                      'renamed')
+        self.user_manager.update_user_username('test_user', 'test_user_new')
+        self.user_group_manager.update_user_in_usergroup(
+            'test_user', 'test_user_new', self.user_manager)
+        self.user_manager.delete_user('test_user2', self.user_group_manager)
+        self.user_group_manager.create_group('deleted_group')
+        self.user_group_manager.delete_usergroup('deleted_group')
+        user_group_manager = UserGroupManager(Journal('groups.yaml'))
+        self.assertEqual(
+            user_group_manager.convert_groups_to_dict(
+                user_group_manager.user_groups),
+            {'renamed': {'users': ['test_user_new'],
+                         'groups': ['ha_group']}})
+
+    def test_compaction(self):
+        self.user_journal.max_records = 3
+        self.user_manager.create_user('test_user2', 'test_password')
+        self.assertEqual(os.path.exists('users.yaml'), False)
+        self.user_manager.create_user('test_user3', 'test_password')
+        self.assertEqual(os.path.exists('users.yaml'), True)
+        self.assertEqual(os.path.exists('users.yaml.journal'), False)
+        self.assertEqual(self.user_journal.record_count, 0)
+
+    def test_batch_appends_once(self):
+        with mock.patch.object(self.user_journal, 'append',
+                               wraps=self.user_journal.append) as append:
+            with self.user_manager.batch():
+                for i in range(5):
+                    self.user_manager.create_user('batch_user' + str(i),
+                                                  'test_password')
+            self.assertEqual(append.call_count, 1)
+        self.assertEqual(len(Journal('users.yaml').read()), 6)
+
+    def test_batch_rollback_discards_records(self):
+        with self.assertRaises(RuntimeError):
+            with self.user_manager.batch():
+                self.user_manager.create_user('test_user2', 'test_password')
+                raise RuntimeError()
+        self.assertEqual(len(Journal('users.yaml').read()), 1)
@@ -0,0 +1,52 @@
+import unittest
+from LoginComponent.nameindex import NameIndex, is_glob
+
+NAMES = ['bob', 'alice', 'albert', 'al', 'carol', 'alfred', 'b']
+
+
+class test_nameindex(unittest.TestCase):
+    """Unit tests for the sorted name index"""
+
+    def setUp(self):
+        self.index = NameIndex(NAMES)
+
+    def test_sorted(self):
+        self.assertEqual(list(self.index), sorted(NAMES))
+
+    def test_prefix(self):
+        self.assertEqual(self.index.search('al'),
+                         ['al', 'albert', 'alfred', 'alice'])
+        self.assertEqual(self.index.search('alb'), ['albert'])
+        self.assertEqual(self.index.search('x'), [])
+        self.assertEqual(self.index.search(None), sorted(NAMES))
+
+    def test_glob(self):
+        self.assertEqual(self.index.search('al*e*'),
+                         ['albert', 'alfred', 'alice'])
+        self.assertEqual(self.index.search('*o*'), ['bob', 'carol'])
+        self.assertEqual(self.index.search('?'), ['b'])
+        self.assertEqual(self.index.search('[bc]*'), ['b', 'bob', 'carol'])
+
+    def test_offset_and_limit(self):
+        self.assertEqual(self.index.search('al', 1, 2), ['albert', 'alfred'])
+        self.assertEqual(self.index.search('al*', 3, 5), ['alice'])
+        self.assertEqual(self.index.search(None, 10), [])
+        self.assertEqual(self.index.search('a', 0, 0), [])
+        with self.assertRaises(ValueError):
+            self.index.search(None, -1)
+
+    def test_add_and_remove(self):
+        self.index.add('alan')
+        self.index.remove('alice')
+        self.index.remove('missing')
+        self.assertEqual(self.index.search('al'),
+                         ['al', 'alan', 'albert', 'alfred'])
+
+    def test_largest_character(self):
+        index = NameIndex(['a\U0010ffff', 'a\U0010ffffb', 'b'])
+        self.assertEqual(index.search('a\U0010ffff'),
+                         ['a\U0010ffff', 'a\U0010ffffb'])
+
+    def test_is_glob(self):
+        self.assertEqual(is_glob('al*'), True)
+        self.assertEqual(is_glob('al'), False)
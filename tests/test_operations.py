@@ -0,0 +1,119 @@
+import unittest
+import os
+from unittest import mock
+from click.testing import CliRunner
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+from LoginComponent.operations import OperationError, apply_script, \
+    parse_line, run_operation
+from LoginComponent.scripts.cli import cli
+
+SCRIPT = [
+    'create-user -u test_user -p secret\n',
+    '{"op": "create-usergroup", "user_group": "test_group"}\n',
+    '\n',
+    '# comment\n',
+    'add-user-to-usergroup -u test_user --user-group=test_group\n',
+    'add-user-to-usergroup -u missing_user -ug test_group\n',
+]
+
+
+class test_operations(unittest.TestCase):
+    """Unit tests for running scripts of operations"""
+
+    def setUp(self):
+        self.usermanager = UserManager()
+        self.groupmanager = UserGroupManager()
+
+    def tearDown(self):
+        for path in ('groups.yaml', 'groups.yaml.cache', 'groups.yaml.lock',
+                     'users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_parse_command_line(self):
+        self.assertEqual(parse_line('update-user -u "a b" --new-username c'),
+                         ('update-user', {'username': 'a b',
+                                          'new_username': 'c'}))
+
+    def test_parse_json_line(self):
+        self.assertEqual(parse_line('{"op": "delete-user", "username": "a"}'),
+                         ('delete-user', {'username': 'a'}))
+
+    def test_parse_invalid_lines(self):
+        for line in ('create-user -x a', 'create-user -u', '{"username": 1}',
+                     '{broken', 'create-user -u "a'):
+            with self.assertRaises(OperationError):
+                parse_line(line)
+
+    def test_run_invalid_operations(self):
+        with self.assertRaises(OperationError):
+            run_operation(self.usermanager, self.groupmanager, 'bogus', {})
+        with self.assertRaises(OperationError):
+            run_operation(self.usermanager, self.groupmanager, 'create-user',
+                          {'username': 'test_user'})
+        with self.assertRaises(OperationError):
+            run_operation(self.usermanager, self.groupmanager, 'delete-user',
+                          {'username': 'test_user', 'password': 'secret'})
+
+    def test_update_user(self):
+        run_operation(self.usermanager, self.groupmanager, 'create-user',
+                      {'username': 'test_user', 'password': 'secret'})
+        self.groupmanager.create_group('test_group')
+        self.groupmanager.add_user_to_usergroup(
+            'test_user', self.groupmanager.get_usergroup('test_group'),
+            self.usermanager)
+        run_operation(self.usermanager, self.groupmanager, 'update-user',
+                      {'username': 'test_user', 'new_username': 'new_user'})
+        self.assertEqual(self.groupmanager.get_usergroup('test_group').
+                         get_users(), ['new_user'])
+
+    def test_apply_script(self):
+        results = apply_script(self.usermanager, self.groupmanager, SCRIPT)
+        self.assertEqual([(number, success) for number, success, _ in
+                          results],
+                         [(1, True), (2, True), (5, True), (6, False)])
+        self.assertEqual(UserGroupManager().get_usergroup('test_group').
+                         get_users(), ['test_user'])
+
+    def test_apply_script_non_string_value(self):
+        results = apply_script(self.usermanager, self.groupmanager, [
+            '{"op": "create-user", "username": "test_user", '
+            '"password": "secret"}\n',
+            '{"op": "create-user", "username": 1, "password": "secret"}\n',
+            '{"op": ["create-user"], "username": "a", "password": "b"}\n'])
+        self.assertEqual([(number, success) for number, success, _ in
+                          results], [(1, True), (2, False), (3, False)])
+        self.assertIn('"username"', results[1][2])
+        self.assertEqual(UserManager().has_user('test_user'), True)
+
+    def test_apply_script_writes_once(self):
+        with mock.patch.object(self.usermanager,
+                               'write_users_to_yaml') as write_users, \
+                mock.patch.object(self.groupmanager,
+                                  'write_user_groups_to_yaml') as write_groups:
+            apply_script(self.usermanager, self.groupmanager, SCRIPT)
+            self.assertEqual(write_users.call_count, 1)
+            self.assertEqual(write_groups.call_count, 1)
+
+    def test_dry_run(self):
+        results = apply_script(self.usermanager, self.groupmanager, SCRIPT,
+                               dry_run=True)
+        self.assertEqual([success for _, success, _ in results],
+                         [True, True, True, False])
+        self.assertEqual(os.path.exists('users.yaml'), False)
+        self.assertEqual(os.path.exists('groups.yaml'), False)
+        self.assertEqual(self.usermanager.has_user('test_user'), False)
+
+    def test_cli_apply(self):
+        result = CliRunner().invoke(cli, ['apply'], input=''.join(SCRIPT))
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('3 succeeded, 1 failed', result.output)
+        self.assertEqual(UserManager().has_user('test_user'), True)
+
+    def test_cli_apply_dry_run(self):
+        result = CliRunner().invoke(cli, ['apply', '--dry-run'],
+                                    input=SCRIPT[0])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(os.path.exists('users.yaml'), False)
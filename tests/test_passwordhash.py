@@ -0,0 +1,84 @@
+import unittest
+import hashlib
+import os
+from unittest import mock
+from LoginComponent import passwordhash
+from LoginComponent.passwordhash import MIN_ITERATIONS, PasswordHasher
+
+HASHING_FILE = 'test_hashing.yaml'
+
+
+class test_passwordhash(unittest.TestCase):
+    """Unit tests for the PBKDF2 password hashes"""
+
+    def tearDown(self):
+        if os.path.exists(HASHING_FILE):
+            os.remove(HASHING_FILE)
+
+    def test_hash_and_verify(self):
+        hasher = PasswordHasher(MIN_ITERATIONS)
+        password = hasher.hash('secret')
+        self.assertEqual(password.split('$')[:2],
+                         ['pbkdf2_sha256', str(MIN_ITERATIONS)])
+        self.assertEqual(passwordhash.verify('secret', password), True)
+        self.assertEqual(passwordhash.verify('wrong', password), False)
+        self.assertNotEqual(hasher.hash('secret'), password)
+
+    def test_verify_sha512(self):
+        digest = hashlib.sha512(b'secret').digest()
+        self.assertEqual(passwordhash.verify('secret', digest), True)
+        self.assertEqual(passwordhash.verify('secret', digest.hex()), True)
+        self.assertEqual(passwordhash.verify('wrong', digest.hex()), False)
+
+    def test_verify_malformed(self):
+        for password in ('pbkdf2_sha256$', 'pbkdf2_sha256$x$YQ==$YQ==',
+                         'pbkdf2_sha256$0$YQ==$YQ==',
+                         'pbkdf2_sha256$1000$!$YQ==', None, ''):
+            self.assertEqual(passwordhash.verify('secret', password), False)
+
+    def test_hash_passwords_keeps_order(self):
+        hasher = PasswordHasher(MIN_ITERATIONS)
+        passwords = ['secret' + str(i) for i in range(7)]
+        for workers in (1, 3):
+            hashes = passwordhash.hash_passwords(hasher, passwords, workers,
+                                                 chunk_size=2)
+            self.assertEqual(len(hashes), len(passwords))
+            for password, password_hash in zip(passwords, hashes):
+                self.assertEqual(passwordhash.verify(password,
+                                                     password_hash), True)
+
+    def test_hash_passwords_does_not_fork(self):
+        from concurrent.futures import ProcessPoolExecutor
+        with mock.patch('concurrent.futures.ProcessPoolExecutor',
+                        wraps=ProcessPoolExecutor) as pool:
+            passwordhash.hash_passwords(PasswordHasher(MIN_ITERATIONS),
+                                        ['secret'] * 4, 2, chunk_size=2)
+        self.assertNotEqual(pool.call_args.kwargs['mp_context'].
+                            get_start_method(), 'fork')
+
+    def test_needs_rehash(self):
+        hasher = PasswordHasher(MIN_ITERATIONS)
+        self.assertEqual(hasher.needs_rehash(hasher.hash('secret')), False)
+        self.assertEqual(PasswordHasher(MIN_ITERATIONS * 2).needs_rehash(
+            hasher.hash('secret')), True)
+        self.assertEqual(hasher.needs_rehash(
+            hashlib.sha512(b'secret').hexdigest()), True)
+
+    def test_minimum_iterations(self):
+        self.assertEqual(PasswordHasher(1).iterations, MIN_ITERATIONS)
+
+    def test_calibrate(self):
+        times = iter([0.0, 0.02] * passwordhash.CALIBRATION_ROUNDS)
+        iterations = passwordhash.calibrate(50, clock=lambda: next(times))
+        self.assertEqual(iterations, 50000)
+
+    def test_read_and_write_hasher(self):
+        self.assertIs(passwordhash.read_hasher(HASHING_FILE),
+                      passwordhash.DEFAULT_HASHER)
+        passwordhash.write_hasher(PasswordHasher(5000), HASHING_FILE)
+        self.assertEqual(passwordhash.read_hasher(HASHING_FILE).iterations,
+                         5000)
+        with open(HASHING_FILE, 'w') as outfile:
+            outfile.write('iterations: many\n')
+        self.assertIs(passwordhash.read_hasher(HASHING_FILE),
+                      passwordhash.DEFAULT_HASHER)
@@ -0,0 +1,154 @@
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+from click.testing import CliRunner
+from LoginComponent.client import DEFAULT_SOCKET, Client, \
+    RemoteUserGroupManager, RemoteUserManager, ServerError
+from LoginComponent.server import Server
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+from LoginComponent.scripts.cli import cli
+
+
+class test_server(unittest.TestCase):
+    """Unit tests for the server and its client"""
+
+    def setUp(self):
+        usermanager = UserManager()
+        usermanager.create_user('test_user', 'secret')
+        groupmanager = UserGroupManager()
+        groupmanager.create_group('test_group')
+        self.server = Server(usermanager, groupmanager)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.sock')
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.listener = asyncio.run_coroutine_threadsafe(
+            self.server.start(self.path), self.loop).result()
+        self.client = Client(self.path, timeout=5)
+
+    async def stop(self):
+        """ Stops listening and ends the open connections. """
+        self.listener.close()
+        await self.listener.wait_closed()
+        tasks = [task for task in asyncio.all_tasks()
+                 if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def tearDown(self):
+        self.client.close()
+        asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        shutil.rmtree(self.directory)
+        for path in ('groups.yaml', 'groups.yaml.cache', 'groups.yaml.lock',
+                     'users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names',
+                     DEFAULT_SOCKET):
+            if os.path.lexists(path):
+                os.remove(path)
+
+    def test_verify(self):
+        self.assertEqual(self.client.request(
+            'verify', username='test_user', password='secret'), True)
+        self.assertEqual(self.client.request(
+            'verify', username='test_user', password='wrong'), False)
+        self.assertEqual(self.client.request(
+            'verify', username='missing', password='secret'), False)
+        self.assertEqual(self.client.request(
+            'verify', username='test_user', password='secret'), True)
+        cache = self.server.usermanager.manager.verify_cache
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_groups_for(self):
+        self.client.request('add_user_to_usergroup', username='test_user',
+                            name='test_group')
+        groups = self.client.request('groups_for', username='test_user')
+        self.assertEqual([group['name'] for group in groups], ['test_group'])
+
+    def test_changes_are_saved(self):
+        self.assertEqual(self.client.request(
+            'create_user', username='test_user2', password='secret'), True)
+        self.assertEqual(UserManager().has_user('test_user2'), True)
+
+    def test_invalid_requests(self):
+        for request in ({}, [], {'op': 'bogus'},
+                        {'op': 'verify', 'username': 'test_user'}):
+            self.assertIn('error', asyncio.run_coroutine_threadsafe(
+                self.server.handle(request), self.loop).result())
+        with self.assertRaises(ServerError):
+            self.client.request('get_user', name='test_user')
+        self.assertEqual(self.client.request('users')[0]['username'],
+                         'test_user')
+
+    def test_remote_managers(self):
+        usermanager = RemoteUserManager(self.client)
+        groupmanager = RemoteUserGroupManager(self.client)
+        self.assertEqual(usermanager.update_user_username('test_user',
+                                                          'new_user'), True)
+        usergroup = groupmanager.get_usergroup('test_group')
+        self.assertEqual(groupmanager.add_user_to_usergroup(
+            'new_user', usergroup, usermanager), True)
+        self.assertEqual(groupmanager.get_usergroup('test_group').
+                         get_users(), ['new_user'])
+        self.assertEqual(usermanager.delete_user('new_user'), True)
+        self.assertEqual(groupmanager.get_usergroups_for_user('new_user'),
+                         [])
+
+    def test_remote_search(self):
+        usermanager = RemoteUserManager(self.client)
+        groupmanager = RemoteUserGroupManager(self.client)
+        usermanager.create_user('test_user2', 'secret')
+        self.assertEqual([user.get_username() for user in
+                          usermanager.search_users('test', 1)],
+                         ['test_user2'])
+        self.assertEqual([user_group.get_name() for user_group in
+                          groupmanager.search_usergroups('*group', 0, 1)],
+                         ['test_group'])
+        with self.assertRaises(ServerError):
+            usermanager.search_users(None, -1)
+
+    def test_reload(self):
+        changes = []
+        self.server.on_change = lambda users, groups: changes.append(
+            (users, groups))
+        UserManager().create_user('test_user2', 'secret')
+        paths = list(self.server.watched_files())
+        asyncio.run_coroutine_threadsafe(self.server.reload(paths),
+                                         self.loop).result()
+        self.assertEqual(changes, [({'test_user2'}, set())])
+        self.assertEqual(self.client.request(
+            'verify', username='test_user2', password='secret'), True)
+
+    def test_cli_server(self):
+        os.remove('users.yaml')
+        result = CliRunner().invoke(cli, ['--server', '--socket', self.path,
+                                          'read-user', '-u', 'test_user'])
+        self.assertIn('Username: test_user', result.output)
+        result = CliRunner().invoke(cli, ['--server', '--socket', self.path,
+                                          'create-user', '-u', 'test_user2',
+                                          '-p', 'secret'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(self.server.usermanager.has_user('test_user2'),
+                         True)
+
+    def test_cli_server_default_socket(self):
+        os.symlink(self.path, DEFAULT_SOCKET)
+        os.remove('users.yaml')
+        result = CliRunner().invoke(cli, ['--server', 'read-users'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Username: test_user', result.output)
+
+    def test_cli_without_server(self):
+        result = CliRunner().invoke(cli, ['--server', '--socket',
+                                          self.path + '.missing',
+                                          'read-users'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Username: test_user', result.output)
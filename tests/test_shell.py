@@ -0,0 +1,90 @@
+import unittest
+import os
+from unittest import mock
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+from LoginComponent.scripts.cli import cli
+from LoginComponent.scripts.shell import Completer, Session, run_shell
+
+
+def lines(*commands):
+    """ Returns a read_line function that returns the given commands. """
+    remaining = list(commands)
+
+    def read_line(prompt):
+        if not remaining:
+            raise EOFError()
+        return remaining.pop(0)
+    return read_line
+
+
+class test_shell(unittest.TestCase):
+    """Unit tests for the interactive shell"""
+
+    def setUp(self):
+        self.session = Session()
+
+    def tearDown(self):
+        for path in ('groups.yaml', 'groups.yaml.cache', 'groups.yaml.lock',
+                     'users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_commands_share_managers(self):
+        run_shell(cli, self.session, lines(
+            'create-user -u test_user -p secret',
+            'create-usergroup -ug test_group',
+            'add-user-to-usergroup -u test_user -ug test_group'))
+        self.assertEqual(UserGroupManager().get_usergroup('test_group').
+                         get_users(), ['test_user'])
+
+    def test_single_write_on_exit(self):
+        with mock.patch.object(self.session.usermanager,
+                               'write_users_to_yaml') as write:
+            run_shell(cli, self.session, lines(
+                'create-user -u test_user -p secret',
+                'create-user -u test_user2 -p secret',
+                'update-usergroup-name -ug missing -n other'))
+            self.assertEqual(write.call_count, 1)
+
+    def test_commit_writes(self):
+        def read_line(prompt):
+            read_line.calls += 1
+            if read_line.calls == 1:
+                return 'create-user -u test_user -p secret'
+            if read_line.calls == 2:
+                return 'commit'
+            self.assertEqual(UserManager().has_user('test_user'), True)
+            return 'exit'
+        read_line.calls = 0
+        run_shell(cli, self.session, read_line)
+        self.assertEqual(read_line.calls, 3)
+
+    def test_unknown_and_invalid_lines(self):
+        run_shell(cli, self.session, lines('bogus', 'create-user -u "x',
+                                           'shell', '', 'help'))
+        self.assertEqual(os.path.exists('users.yaml'), False)
+
+    def test_complete_commands(self):
+        completer = Completer(['create-user', 'read-user'], self.session)
+        self.assertEqual(completer.candidates('cr', 'cr'), ['create-user'])
+
+    def test_complete_usernames(self):
+        self.session.usermanager.create_user('test_user', 'secret')
+        self.session.usermanager.create_user('other_user', 'secret')
+        completer = Completer(['read-user'], self.session)
+        self.assertEqual(completer.candidates('read-user -u te', 'te'),
+                         ['test_user'])
+
+    def test_complete_usergroups(self):
+        self.session.groupmanager.create_group('test_group')
+        usergroup = self.session.groupmanager.get_usergroup('test_group')
+        self.session.groupmanager.add_group_to_usergroup('group.kitchen',
+                                                         usergroup)
+        completer = Completer(['read-group'], self.session)
+        self.assertEqual(completer.candidates('read-group -ug ', ''),
+                         ['test_group'])
+        self.assertEqual(completer.candidates(
+            'add-group-to-usergroup -g group.k', 'group.k'),
+            ['group.kitchen'])
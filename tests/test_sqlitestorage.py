@@ -0,0 +1,153 @@
+import unittest
+import os
+from unittest import mock
+from click.testing import CliRunner
+from LoginComponent.passwordhash import MIN_ITERATIONS, PasswordHasher
+from LoginComponent.sqlitestorage import SqliteGroupStorage, \
+    SqliteUserStorage
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+from LoginComponent.scripts.cli import cli
+
+DATABASE = 'test.db'
+
+
+class test_sqlitestorage(unittest.TestCase):
+    """Unit tests for the SQLite storage backends"""
+
+    def setUp(self):
+        self.storages = []
+
+    def tearDown(self):
+        for storage in self.storages:
+            storage.close()
+        for path in ('groups.yaml', 'groups.yaml.cache', 'groups.yaml.lock',
+                     'users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names',
+                     DATABASE, DATABASE + '-wal', DATABASE + '-shm',
+                     DATABASE + '-users.names',
+                     DATABASE + '-usergroups.names'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def user_manager(self):
+        storage = SqliteUserStorage(DATABASE)
+        self.storages.append(storage)
+        return UserManager(storage=storage)
+
+    def group_manager(self):
+        storage = SqliteGroupStorage(DATABASE)
+        self.storages.append(storage)
+        return UserGroupManager(storage=storage)
+
+    def test_users(self):
+        user_manager = self.user_manager()
+        user_manager.create_user('test_user', 'secret')
+        user_manager.create_user('test_user2', 'secret')
+        user_manager.create_user('test_user3', 'secret')
+        user_manager.update_user_username('test_user', 'renamed_user')
+        user_manager.update_user_password('test_user2', 'new_secret')
+        user_manager.delete_user('test_user3')
+        users = self.user_manager().users
+        self.assertEqual([user.get_username() for user in users],
+                         ['renamed_user', 'test_user2'])
+        self.assertEqual(users[1].get_password(),
+                         user_manager.get_user('test_user2').get_password())
+        self.assertEqual(os.path.exists('users.yaml'), False)
+
+    def test_mutation_does_not_rewrite_all_users(self):
+        user_manager = self.user_manager()
+        user_manager.create_user('test_user', 'secret')
+        with mock.patch.object(user_manager, 'write_users_to_yaml') as write:
+            user_manager.create_user('test_user2', 'secret')
+            self.assertEqual(write.call_count, 0)
+        self.assertEqual(self.user_manager().has_user('test_user2'), True)
+
+    def test_usergroups(self):
+        user_manager = self.user_manager()
+        for username in ('a', 'b', 'c', 'd'):
+            user_manager.create_user(username, 'secret')
+        group_manager = self.group_manager()
+        group_manager.create_group('test_group')
+        group_manager.create_group('test_group2')
+        user_group = group_manager.get_usergroup('test_group')
+        with group_manager.batch():
+            for username in ('a', 'b', 'c'):
+                group_manager.add_user_to_usergroup(username, user_group,
+                                                    user_manager)
+            group_manager.add_group_to_usergroup('group.kitchen', user_group)
+        group_manager.update_user_in_usergroup('a', 'd', user_manager)
+        group_manager.update_user_in_usergroup('b', 'c', user_manager)
+        group_manager.remove_group_from_usergroup('group.kitchen',
+                                                  user_group)
+        group_manager.add_group_to_usergroup('group.hall', user_group)
+        group_manager.update_usergroup_name('test_group', 'renamed_group')
+        group_manager.delete_usergroup('test_group2')
+        self.assertEqual(self.group_manager().convert_groups_to_dict(
+            self.group_manager().user_groups),
+            {'renamed_group': {'users': ['d', 'c'],
+                               'groups': ['group.hall']}})
+
+    def test_delete_usergroup_removes_rows(self):
+        user_manager = self.user_manager()
+        user_manager.create_user('test_user', 'secret')
+        group_manager = self.group_manager()
+        group_manager.create_group('test_group')
+        group_manager.add_user_to_usergroup(
+            'test_user', group_manager.get_usergroup('test_group'),
+            user_manager)
+        group_manager.delete_usergroup('test_group')
+        storage = self.storages[1]
+        self.assertEqual(storage.connection.execute(
+            'SELECT COUNT(*) FROM memberships').fetchone()[0], 0)
+
+    def test_rehash(self):
+        self.user_manager().create_user('test_user', 'secret')
+        user_manager = UserManager(storage=self.user_manager().storage,
+                                   hasher=PasswordHasher(MIN_ITERATIONS * 2))
+        user_manager.verify_password('test_user', 'secret')
+        user_manager.flush_rehashes()
+        self.assertEqual(self.user_manager().get_user('test_user').
+                         get_password(),
+                         user_manager.get_user('test_user').get_password())
+
+    def test_stale_manager_merges(self):
+        user_manager = self.user_manager()
+        stale_manager = self.user_manager()
+        self.assertEqual(stale_manager.users, [])
+        user_manager.create_user('test_user', 'secret')
+        stale_manager.create_user('test_user2', 'secret')
+        self.assertEqual(stale_manager.has_user('test_user'), True)
+
+    def test_batch_rollback(self):
+        user_manager = self.user_manager()
+        with self.assertRaises(ValueError):
+            with user_manager.batch():
+                user_manager.create_user('test_user', 'secret')
+                raise ValueError()
+        self.assertEqual(self.user_manager().users, [])
+
+    def test_cli_database(self):
+        result = CliRunner().invoke(cli, ['--database', DATABASE,
+                                          'create-user', '-u', 'test_user',
+                                          '-p', 'secret'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(os.path.exists('users.yaml'), False)
+        self.assertEqual(self.user_manager().has_user('test_user'), True)
+
+    def test_cli_migrate(self):
+        user_manager = UserManager()
+        user_manager.create_user('test_user', 'secret')
+        group_manager = UserGroupManager()
+        group_manager.create_group('test_group')
+        group_manager.add_user_to_usergroup(
+            'test_user', group_manager.get_usergroup('test_group'),
+            user_manager)
+        result = CliRunner().invoke(cli, ['migrate', DATABASE])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Migrated 1 users and 1 usergroups', result.output)
+        self.assertEqual(self.user_manager().get_user('test_user').
+                         get_password(),
+                         UserManager().get_user('test_user').get_password())
+        self.assertEqual(self.group_manager().get_usergroup('test_group').
+                         get_users(), ['test_user'])
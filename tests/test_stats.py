@@ -0,0 +1,123 @@
+import unittest
+import os
+import threading
+from unittest import mock
+from click.testing import CliRunner
+from LoginComponent.stats import Stats
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+from LoginComponent.scripts.cli import cli
+
+
+class test_stats(unittest.TestCase):
+    """Unit tests for the timing instrumentation"""
+
+    def setUp(self):
+        self.stats = Stats()
+
+    def tearDown(self):
+        for path in ('users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names',
+                     'groups.yaml.lock', 'groups.yaml', 'groups.yaml.cache'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_phase_records_count(self):
+        with self.stats.phase('load'):
+            pass
+        with self.stats.phase('load'):
+            pass
+        self.assertEqual(self.stats.counts, {'load': 2})
+        self.assertGreaterEqual(self.stats.durations['load'], 0)
+
+    def test_nested_phase_excluded_from_outer(self):
+        with mock.patch('time.perf_counter', side_effect=[0, 1, 11, 12]):
+            with self.stats.phase('mutate'):
+                with self.stats.phase('write'):
+                    pass
+        self.assertEqual(self.stats.durations, {'mutate': 2, 'write': 10})
+
+    def test_outermost_phase_counts_once(self):
+        with mock.patch('time.perf_counter', side_effect=[0, 5]):
+            with self.stats.outermost_phase('mutate'):
+                with self.stats.outermost_phase('mutate'):
+                    pass
+        self.assertEqual(self.stats.counts, {'mutate': 1})
+        self.assertEqual(self.stats.durations, {'mutate': 5})
+        with self.stats.outermost_phase('mutate'):
+            pass
+        self.assertEqual(self.stats.counts, {'mutate': 2})
+
+    def test_phases_nest_per_thread(self):
+        with mock.patch('time.perf_counter', side_effect=[0, 1, 3, 12]):
+            with self.stats.phase('mutate'):
+                thread = threading.Thread(target=self.run_write_phase)
+                thread.start()
+                thread.join()
+        self.assertEqual(self.stats.durations, {'mutate': 12, 'write': 2})
+
+    def run_write_phase(self):
+        with self.stats.phase('write'):
+            pass
+
+    def test_subscribe(self):
+        recorded = []
+        self.stats.subscribe(lambda name, seconds: recorded.append(name))
+        with self.stats.phase('load'):
+            pass
+        self.assertEqual(recorded, ['load'])
+
+    def test_unsubscribe(self):
+        recorded = []
+
+        def callback(name, seconds):
+            recorded.append(name)
+        self.stats.subscribe(callback)
+        self.stats.unsubscribe(callback)
+        self.stats.record('load', 1)
+        self.assertEqual(recorded, [])
+
+    def test_reset(self):
+        self.stats.record('load', 1)
+        self.stats.reset()
+        self.assertEqual(self.stats.counts, {})
+
+    def test_report(self):
+        self.stats.record('write', 0.5)
+        self.stats.record('load', 0.25)
+        lines = self.stats.report().splitlines()
+        self.assertEqual([line.split()[0] for line in lines],
+                         ['phase', 'load', 'write', 'total'])
+
+    def test_usermanager_phases(self):
+        user_manager = UserManager(stats=self.stats)
+        user_manager.create_user('test_user', 'test_password')
+        self.assertEqual(set(self.stats.counts),
+                         {'load', 'convert', 'mutate', 'serialize', 'write'})
+        self.assertEqual(self.stats.counts['mutate'], 1)
+
+    def test_nested_mutation_counts_once(self):
+        user_manager = UserManager(stats=self.stats)
+        user_manager.create_user('test_user', 'test_password')
+        group_manager = UserGroupManager(stats=self.stats)
+        group_manager.create_group('test_group')
+        group_manager.add_user_to_usergroup(
+            'test_user', group_manager.get_usergroup('test_group'),
+            user_manager)
+        self.stats.reset()
+        user_manager.delete_user('test_user', group_manager)
+        self.assertEqual(self.stats.counts['mutate'], 1)
+
+    def test_full_write_serializes_once(self):
+        user_manager = UserManager(stats=self.stats)
+        user_manager.users
+        self.stats.reset()
+        user_manager.write_users_to_yaml()
+        self.assertEqual(self.stats.counts['serialize'], 1)
+        self.assertEqual(self.stats.counts['write'], 1)
+
+    def test_cli_profile(self):
+        result = CliRunner().invoke(cli, ['--profile', 'create-user', '-u',
+                                          'test_user', '-p', 'secret'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('serialize', result.output)
@@ -0,0 +1,127 @@
+import unittest
+import os
+import shutil
+from unittest import mock
+from click.testing import CliRunner
+from LoginComponent import yamlio
+from LoginComponent.storage import ShardedYamlStorage, shard_of
+from LoginComponent.usermanager import UserManager
+from LoginComponent.usergroupmanager import UserGroupManager
+from LoginComponent.scripts.cli import cli
+
+DIRECTORY = 'test_shards'
+SHARDS = 4
+
+
+class test_storage(unittest.TestCase):
+    """Unit tests for the sharded yaml storage"""
+
+    def tearDown(self):
+        if os.path.exists(DIRECTORY):
+            shutil.rmtree(DIRECTORY)
+        for path in ('groups.yaml', 'groups.yaml.cache', 'groups.yaml.lock',
+                     'users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def user_manager(self):
+        return UserManager(storage=ShardedYamlStorage(
+            os.path.join(DIRECTORY, 'users'), SHARDS))
+
+    def group_manager(self):
+        return UserGroupManager(storage=ShardedYamlStorage(
+            os.path.join(DIRECTORY, 'groups'), SHARDS))
+
+    def test_users(self):
+        user_manager = self.user_manager()
+        for i in range(10):
+            user_manager.create_user('test_user' + str(i), 'secret')
+        user_manager.update_user_username('test_user0', 'renamed_user')
+        user_manager.update_user_password('test_user1', 'new_secret')
+        user_manager.delete_user('test_user2')
+        users = {user.get_username(): user.get_password() for user in
+                 self.user_manager().users}
+        self.assertEqual(users, {user.get_username(): user.get_password()
+                                 for user in user_manager.users})
+        self.assertEqual(len(users), 9)
+        self.assertEqual(os.path.exists('users.yaml'), False)
+
+    def test_users_are_kept_in_their_shard(self):
+        user_manager = self.user_manager()
+        user_manager.create_user('test_user', 'secret')
+        shard = yamlio.read_yaml_file(user_manager.storage.shard_path(
+            shard_of('test_user', SHARDS)))
+        self.assertEqual(list(shard), ['test_user'])
+
+    def test_mutation_rewrites_one_shard(self):
+        user_manager = self.user_manager()
+        for i in range(10):
+            user_manager.create_user('test_user' + str(i), 'secret')
+        with mock.patch.object(yamlio, 'write_yaml_content',
+                               wraps=yamlio.write_yaml_content) as write:
+            user_manager.update_user_password('test_user3', 'new_secret')
+            self.assertEqual(write.call_count, 1)
+            self.assertEqual(write.call_args[0][0],
+                             user_manager.storage.shard_path(
+                                 shard_of('test_user3', SHARDS)))
+
+    def test_rename_moves_user_to_other_shard(self):
+        user_manager = self.user_manager()
+        user_manager.create_user('test_user', 'secret')
+        new_username = next('user' + str(i) for i in range(100) if
+                            shard_of('user' + str(i), SHARDS) !=
+                            shard_of('test_user', SHARDS))
+        user_manager.update_user_username('test_user', new_username)
+        self.assertEqual([user.get_username() for user in
+                          self.user_manager().users], [new_username])
+
+    def test_usergroups(self):
+        user_manager = self.user_manager()
+        user_manager.create_user('test_user', 'secret')
+        group_manager = self.group_manager()
+        group_manager.create_group('test_group')
+        group_manager.add_user_to_usergroup(
+            'test_user', group_manager.get_usergroup('test_group'),
+            user_manager)
+        group_manager.add_group_to_usergroup(
+            'group.kitchen', group_manager.get_usergroup('test_group'))
+        group_manager.update_usergroup_name('test_group', 'renamed_group')
+        user_group = self.group_manager().get_usergroup('renamed_group')
+        self.assertEqual(user_group.get_users(), ['test_user'])
+        self.assertEqual(user_group.get_groups(), ['group.kitchen'])
+
+    def test_manifest_keeps_shard_count(self):
+        self.user_manager().create_user('test_user', 'secret')
+        storage = ShardedYamlStorage(os.path.join(DIRECTORY, 'users'))
+        self.assertEqual(storage.shards, SHARDS)
+        self.assertEqual(UserManager(storage=storage).has_user('test_user'),
+                         True)
+
+    def test_stale_manager_merges(self):
+        user_manager = self.user_manager()
+        stale_manager = self.user_manager()
+        self.assertEqual(stale_manager.users, [])
+        user_manager.create_user('test_user', 'secret')
+        stale_manager.create_user('test_user2', 'secret')
+        self.assertEqual(stale_manager.has_user('test_user'), True)
+        self.assertEqual(len(self.user_manager().users), 2)
+
+    def test_cli_sharded(self):
+        UserManager().create_user('test_user', 'secret')
+        result = CliRunner().invoke(cli, ['migrate', '--sharded', DIRECTORY])
+        self.assertEqual(result.exit_code, 0)
+        result = CliRunner().invoke(cli, ['--sharded', DIRECTORY,
+                                          'create-user', '-u', 'test_user2',
+                                          '-p', 'secret'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(len(self.user_manager().users), 2)
+        self.assertEqual(len(UserManager().users), 1)
+
+    def test_cli_storage_options_exclusive(self):
+        result = CliRunner().invoke(cli, ['--sharded', DIRECTORY,
+                                          '--database', 'test.db',
+                                          'read-users'])
+        self.assertEqual(result.exit_code, 2)
+        result = CliRunner().invoke(cli, ['migrate'])
+        self.assertEqual(result.exit_code, 2)
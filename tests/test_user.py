@@ -1,6 +1,9 @@
 import unittest
+import hashlib
 from LoginComponent.user import User
 
+LEGACY_HASH = hashlib.sha512(b"secretpass").hexdigest()
+
 
 class test_user(unittest.TestCase):
     """ Unittests for the user class """
@@ -42,3 +45,38 @@ class test_user(unittest.TestCase):
         self.user.set_password_and_hash("newpass")
         self.assertNotEquals(self.user.password, "secretpass")
         self.assertNotEquals(self.user.password, "newpass")
+
+    def test_user_hashed_password_is_salted(self):
+        self.assertEqual(self.hasheduser.get_password().split("$")[0],
+                         "pbkdf2_sha256")
+        self.assertNotEqual(User("testuser", "secretpass", True).password,
+                            self.hasheduser.password)
+
+    def test_user_legacy_password_stored_as_digest(self):
+        self.user.set_password(LEGACY_HASH)
+        self.assertEqual(len(self.user._password), 64)
+
+    def test_user_set_password_hex_round_trip(self):
+        self.user.set_password(LEGACY_HASH)
+        self.assertEqual(self.user.get_password(), LEGACY_HASH)
+        self.assertIsInstance(self.user._password, bytes)
+
+    def test_user_set_password_uppercase_hex_kept(self):
+        password = LEGACY_HASH.upper()
+        self.user.set_password(password)
+        self.assertEqual(self.user.get_password(), password)
+
+    def test_user_has_no_dict(self):
+        self.assertEqual(hasattr(self.user, "__dict__"), False)
+
+    def test_user_check_password(self):
+        self.assertEqual(self.hasheduser.check_password("secretpass"), True)
+        self.assertEqual(self.hasheduser.check_password("wrongpass"), False)
+        self.assertEqual(User("testuser", self.hasheduser.password).
+                         check_password("secretpass"), True)
+        self.assertEqual(self.user.check_password("secretpass"), False)
+
+    def test_user_check_legacy_password(self):
+        self.user.set_password(LEGACY_HASH)
+        self.assertEqual(self.user.check_password("secretpass"), True)
+        self.assertEqual(self.user.check_password("wrongpass"), False)
@@ -54,3 +54,44 @@ class test_user(unittest.TestCase):
     def test_usergroup_remove_group(self):
         self.filled_usergroup.remove_group("group1")
         self.assertEqual(self.filled_usergroup.groups, ["group2"])
+
+    def test_usergroup_has_no_dict(self):
+        self.assertEqual(hasattr(self.empty_usergroup, "__dict__"), False)
+
+    def test_usergroup_add_user_twice(self):
+        self.filled_usergroup.add_user("user1")
+        self.assertEqual(self.filled_usergroup.users, ["user1", "user2"])
+
+    def test_usergroup_add_user_keeps_order(self):
+        self.filled_usergroup.add_user("user0")
+        self.assertEqual(self.filled_usergroup.get_users(),
+                         ["user1", "user2", "user0"])
+
+    def test_usergroup_remove_user_not_existing(self):
+        with self.assertRaises(ValueError):
+            self.filled_usergroup.remove_user("user3")
+
+    def test_usergroup_has_user(self):
+        self.assertEqual(self.filled_usergroup.has_user("user1"), True)
+        self.assertEqual(self.filled_usergroup.has_user("user3"), False)
+
+    def test_usergroup_has_group(self):
+        self.assertEqual(self.filled_usergroup.has_group("group1"), True)
+        self.assertEqual(self.filled_usergroup.has_group("group3"), False)
+
+    def test_usergroup_replace_user_keeps_position(self):
+        self.filled_usergroup.replace_user("user1", "user3")
+        self.assertEqual(self.filled_usergroup.users, ["user3", "user2"])
+
+    def test_usergroup_replace_user_existing(self):
+        self.filled_usergroup.replace_user("user1", "user2")
+        self.assertEqual(self.filled_usergroup.users, ["user2"])
+
+    def test_usergroup_users_sequence_view(self):
+        users = self.filled_usergroup.get_users()
+        self.assertEqual(len(users), 2)
+        self.assertEqual(users[1], "user2")
+        self.assertEqual(users[-1], "user2")
+        self.assertEqual(list(users), ["user1", "user2"])
+        self.assertIn("user1", users)
+        self.assertEqual(repr(users), repr(["user1", "user2"]))
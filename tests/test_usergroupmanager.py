@@ -1,5 +1,7 @@
 import unittest
 import os
+from unittest import mock
+from LoginComponent import completion
 from LoginComponent.usergroupmanager import UserGroupManager
 from LoginComponent.usermanager import UserManager
 
@@ -13,10 +15,24 @@ class test_usergroupmanager(unittest.TestCase):
         self.test_dict = ''
 
     def tearDown(self):
-        if os.path.exists('groups.yaml'):
-            os.remove('groups.yaml')
-        if os.path.exists('users.yaml'):
-            os.remove('users.yaml')
+        for path in ('groups.yaml', 'groups.yaml.cache', 'groups.yaml.lock',
+                     'users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # Load tests.
+    def test_constructor_does_not_read_groups(self):
+        with mock.patch.object(UserGroupManager, 'read_groups') as \
+                read_groups:
+            user_group_manager = UserGroupManager()
+            self.assertEqual(read_groups.call_count, 0)
+            self.assertEqual(user_group_manager.is_loaded(), False)
+
+    def test_groups_loaded_on_lookup(self):
+        user_group_manager = UserGroupManager()
+        self.assertEqual(user_group_manager.has_usergroup('test_group'), True)
+        self.assertEqual(user_group_manager.is_loaded(), True)
 
     # Create tests.
     def test_create_group(self):
@@ -47,6 +63,31 @@ class test_usergroupmanager(unittest.TestCase):
             True)
 
     # Read tests.
+    def test_get_usergroup(self):
+        self.assertEqual(self.user_group_manager.get_usergroup(
+            'test_group').get_name(), 'test_group')
+
+    def test_get_usergroup_not_existing(self):
+        self.assertIsNone(self.user_group_manager.get_usergroup(
+            'not_existant'))
+
+    def test_get_usergroups_for_user(self):
+        self.user_manager = UserManager()
+        self.user_manager.create_user('test_user', 'test_password')
+        self.user_group_manager.create_group('test_group2')
+        self.user_group_manager.create_group('test_group3')
+        for name in ('test_group', 'test_group3'):
+            self.user_group_manager.add_user_to_usergroup(
+                'test_user', self.user_group_manager.get_usergroup(name),
+                self.user_manager)
+        self.assertEqual([usergroup.get_name() for usergroup in
+                          self.user_group_manager.get_usergroups_for_user(
+                              'test_user')], ['test_group', 'test_group3'])
+
+    def test_get_usergroups_for_user_not_in_group(self):
+        self.assertEqual(self.user_group_manager.get_usergroups_for_user(
+            'test_user'), [])
+
     def test_read_group_list(self):
         self.assertEqual(len(self.user_group_manager.read_groups()), 1)
 
@@ -74,6 +115,26 @@ class test_usergroupmanager(unittest.TestCase):
         self.assertEqual(self.user_group_manager.update_user_in_usergroup(
             'test_user', 'test_user_new', self.user_manager), True)
 
+    def test_update_user_in_usergroup_all_groups(self):
+        self.user_manager = UserManager()
+        self.user_manager.create_user('test_user', 'test_password')
+        self.user_manager.create_user('other_user', 'test_password')
+        self.user_group_manager.create_group('test_group2')
+        for usergroup in self.user_group_manager.user_groups:
+            self.user_group_manager.add_user_to_usergroup(
+                'other_user', usergroup, self.user_manager)
+            self.user_group_manager.add_user_to_usergroup(
+                'test_user', usergroup, self.user_manager)
+        self.user_manager.update_user_username('test_user', 'test_user_new')
+        self.user_group_manager.update_user_in_usergroup(
+            'test_user', 'test_user_new', self.user_manager)
+        for usergroup in self.user_group_manager.user_groups:
+            self.assertEqual(usergroup.users, ['other_user', 'test_user_new'])
+        self.assertEqual(self.user_group_manager.get_usergroups_for_user(
+            'test_user'), [])
+        self.assertEqual(len(self.user_group_manager.get_usergroups_for_user(
+            'test_user_new')), 2)
+
     def test_update_user_in_usergroup_not_existant_user(self):
         self.user_manager = UserManager()
         self.user_manager.create_user('test_user', 'test_password')
@@ -89,6 +150,27 @@ class test_usergroupmanager(unittest.TestCase):
         self.assertEqual(self.user_group_manager.delete_usergroup(
             'test_group'), True)
 
+    def test_delete_group_updates_membership(self):
+        self.user_manager = UserManager()
+        self.user_manager.create_user('test_user', 'test_password')
+        self.user_group_manager.add_user_to_usergroup(
+            'test_user', self.user_group_manager.user_groups[0],
+            self.user_manager)
+        self.user_group_manager.delete_usergroup('test_group')
+        self.assertEqual(self.user_group_manager.get_usergroups_for_user(
+            'test_user'), [])
+
+    def test_delete_user_removes_from_usergroups(self):
+        self.user_manager = UserManager()
+        self.user_manager.create_user('test_user', 'test_password')
+        self.user_group_manager.add_user_to_usergroup(
+            'test_user', self.user_group_manager.user_groups[0],
+            self.user_manager)
+        self.user_manager.delete_user('test_user', self.user_group_manager)
+        self.assertEqual(self.user_group_manager.user_groups[0].users, [])
+        self.assertEqual(self.user_group_manager.get_usergroups_for_user(
+            'test_user'), [])
+
     def test_delete_group_not_existing(self):
         self.assertEqual(self.user_group_manager.delete_usergroup(
             'not_existant'), False)
@@ -107,3 +189,124 @@ class test_usergroupmanager(unittest.TestCase):
     def test_delete_user_from_usergroup_not_existing(self):
         self.assertEqual(self.user_group_manager.remove_user_from_usergroup(
             'test_user', self.user_group_manager.user_groups[0]), False)
+
+    # Batch tests.
+    def test_batch_writes_once(self):
+        with mock.patch.object(self.user_group_manager,
+                               'write_user_groups_to_yaml') as write:
+            with self.user_group_manager.batch():
+                for i in range(5):
+                    self.user_group_manager.create_group('batch_group' +
+                                                         str(i))
+                self.user_group_manager.update_usergroup_name('test_group',
+                                                              'renamed')
+                self.assertEqual(write.call_count, 0)
+            self.assertEqual(write.call_count, 1)
+
+    def test_delete_user_writes_groups_once(self):
+        self.user_manager = UserManager()
+        self.user_manager.create_user('test_user', 'test_password')
+        for i in range(5):
+            self.user_group_manager.create_group('test_group' + str(i))
+        for usergroup in self.user_group_manager.user_groups:
+            self.user_group_manager.add_user_to_usergroup(
+                'test_user', usergroup, self.user_manager)
+        with mock.patch.object(self.user_group_manager,
+                               'write_user_groups_to_yaml') as write:
+            self.user_manager.delete_user('test_user',
+                                          self.user_group_manager)
+            self.assertEqual(write.call_count, 1)
+
+    def test_batch_rollback(self):
+        self.user_manager = UserManager()
+        self.user_manager.create_user('test_user', 'test_password')
+        self.user_group_manager.add_user_to_usergroup(
+            'test_user', self.user_group_manager.user_groups[0],
+            self.user_manager)
+        with self.assertRaises(RuntimeError):
+            with self.user_group_manager.batch():
+                self.user_group_manager.create_group('test_group2')
+                self.user_group_manager.add_group_to_usergroup(
+                    'ha_group', self.user_group_manager.user_groups[0])
+                self.user_group_manager.update_usergroup_name('test_group',
+                                                              'renamed')
+                self.user_group_manager.delete_usergroup('renamed')
+                raise RuntimeError()
+        usergroup = self.user_group_manager.get_usergroup('test_group')
+        self.assertEqual(self.user_group_manager.user_groups, [usergroup])
+        self.assertEqual(usergroup.get_users(), ['test_user'])
+        self.assertEqual(usergroup.get_groups(), [])
+        self.assertEqual(self.user_group_manager.get_usergroups_for_user(
+            'test_user'), [usergroup])
+        self.assertEqual(self.user_group_manager.has_usergroup('renamed'),
+                         False)
+        UserGroupManager().read_groups()
+        self.user_group_manager.remove_user_from_usergroup('test_user',
+                                                           usergroup)
+        self.assertEqual(completion.is_marked_stale('groups.yaml.names'),
+                         False)
+
+    # Search tests.
+    def test_search_usergroups(self):
+        for name in ('kitchen', 'hall', 'hall_upstairs'):
+            self.user_group_manager.create_group(name)
+        self.user_group_manager.update_usergroup_name('kitchen', 'attic')
+        self.user_group_manager.delete_usergroup('test_group')
+        self.assertEqual([user_group.get_name() for user_group in
+                          self.user_group_manager.search_usergroups()],
+                         ['attic', 'hall', 'hall_upstairs'])
+        self.assertEqual([user_group.get_name() for user_group in
+                          self.user_group_manager.search_usergroups(
+                              'hall', 0, 1)], ['hall'])
+        self.assertEqual([user_group.get_name() for user_group in
+                          self.user_group_manager.search_usergroups(
+                              '*_*')], ['hall_upstairs'])
+
+    # Reload tests.
+    def test_reload_applies_differences(self):
+        user_manager = UserManager()
+        user_manager.create_user('test_user', 'test_password')
+        user_manager.create_user('test_user2', 'test_password')
+        self.user_group_manager.create_group('kept_group')
+        test_group = self.user_group_manager.get_usergroup('test_group')
+        kept_group = self.user_group_manager.get_usergroup('kept_group')
+        self.user_group_manager.add_user_to_usergroup('test_user', test_group,
+                                                      user_manager)
+
+        other_manager = UserGroupManager()
+        other_group = other_manager.get_usergroup('test_group')
+        other_manager.remove_user_from_usergroup('test_user', other_group)
+        other_manager.add_user_to_usergroup('test_user2', other_group,
+                                            user_manager)
+        other_manager.add_group_to_usergroup('group.kitchen', other_group)
+        other_manager.create_group('new_group')
+        other_manager.add_user_to_usergroup(
+            'test_user', other_manager.get_usergroup('new_group'),
+            user_manager)
+
+        self.assertEqual(self.user_group_manager.reload(),
+                         {'test_group', 'new_group'})
+        self.assertIs(self.user_group_manager.get_usergroup('test_group'),
+                      test_group)
+        self.assertIs(self.user_group_manager.get_usergroup('kept_group'),
+                      kept_group)
+        self.assertEqual(test_group.get_users(), ['test_user2'])
+        self.assertEqual(test_group.get_groups(), ['group.kitchen'])
+        self.assertEqual([user_group.get_name() for user_group in
+                          self.user_group_manager.get_usergroups_for_user(
+                              'test_user')], ['new_group'])
+        self.assertEqual(self.user_group_manager.get_usergroups_for_user(
+            'test_user2'), [test_group])
+
+    def test_reload_removes_groups(self):
+        user_manager = UserManager()
+        user_manager.create_user('test_user', 'test_password')
+        self.user_group_manager.add_user_to_usergroup(
+            'test_user', self.user_group_manager.get_usergroup('test_group'),
+            user_manager)
+        UserGroupManager().delete_usergroup('test_group')
+        self.assertEqual(self.user_group_manager.reload(), {'test_group'})
+        self.assertEqual(self.user_group_manager.has_usergroup('test_group'),
+                         False)
+        self.assertEqual(self.user_group_manager.get_usergroups_for_user(
+            'test_user'), [])
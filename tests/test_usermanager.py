@@ -1,6 +1,12 @@
 import unittest
+import hashlib
 import os
+from unittest import mock
+from LoginComponent import completion
+from LoginComponent.passwordhash import MIN_ITERATIONS, PasswordHasher
+from LoginComponent.user import User
 from LoginComponent.usermanager import UserManager
+from LoginComponent.verifycache import VerificationCache
 
 
 class test_groupmanager(unittest.TestCase):
@@ -12,8 +18,52 @@ class test_groupmanager(unittest.TestCase):
         self.test_dict = ''
 
     def tearDown(self):
-        if os.path.exists('users.yaml'):
-            os.remove('users.yaml')
+        for path in ('users.yaml', 'users.yaml.cache', 'users.yaml.lock',
+                     'users.yaml.names', 'groups.yaml.names',
+                     'groups.yaml.lock'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # Load tests.
+    def test_constructor_does_not_read_users(self):
+        with mock.patch.object(UserManager, 'read_users') as read_users:
+            user_manager = UserManager()
+            self.assertEqual(read_users.call_count, 0)
+            self.assertEqual(user_manager.is_loaded(), False)
+
+    def test_constructor_does_not_read_hashing_file(self):
+        with mock.patch('LoginComponent.passwordhash.read_hasher',
+                        return_value=PasswordHasher(MIN_ITERATIONS)) as read:
+            user_manager = UserManager()
+            self.assertEqual(user_manager.has_user('test_user'), True)
+            self.assertEqual(read.call_count, 0)
+            user_manager.create_user('test_user2', 'secret')
+            user_manager.create_user('test_user3', 'secret')
+            self.assertEqual(read.call_count, 1)
+
+    def test_users_loaded_on_first_access(self):
+        user_manager = UserManager()
+        self.assertEqual(len(user_manager.users), 1)
+        self.assertEqual(user_manager.is_loaded(), True)
+
+    def test_users_loaded_on_lookup(self):
+        user_manager = UserManager()
+        self.assertEqual(user_manager.has_user('test_user'), True)
+
+    def test_users_assignment_updates_index(self):
+        user_manager = UserManager()
+        user_manager.users = [User('assigned_user', 'test_password')]
+        self.assertEqual(user_manager.has_user('assigned_user'), True)
+        self.assertEqual(user_manager.has_user('test_user'), False)
+
+    def test_batch_rollback_before_load(self):
+        user_manager = UserManager()
+        with self.assertRaises(RuntimeError):
+            with user_manager.batch():
+                user_manager.create_user('test_user2', 'test_password')
+                raise RuntimeError()
+        self.assertEqual(user_manager.is_loaded(), False)
+        self.assertEqual(user_manager.has_user('test_user2'), False)
 
     # Create tests.
     def test_create_user(self):
@@ -35,10 +85,49 @@ class test_groupmanager(unittest.TestCase):
     def test_create_user_both_not_string(self):
         self.assertEqual(self.user_manager.create_user(1, 1), False)
 
+    def test_create_users(self):
+        user_manager = UserManager()
+        with mock.patch.object(user_manager.storage, 'commit',
+                               wraps=user_manager.storage.commit) as commit:
+            results = user_manager.create_users(
+                [('user' + str(i), 'password' + str(i)) for i in range(10)] +
+                [('test_user', 'secret'), ('user3', 'secret'), ('42', 'x')],
+                workers=2, chunk_size=3)
+            self.assertEqual(commit.call_count, 1)
+        self.assertEqual(results, [True] * 10 + [False] * 3)
+        user_manager = UserManager()
+        self.assertEqual(len(user_manager.users), 11)
+        for i in range(10):
+            self.assertEqual(user_manager.verify_password(
+                'user' + str(i), 'password' + str(i)), True)
+
+    def test_create_users_empty(self):
+        self.assertEqual(self.user_manager.create_users([]), [])
+
     # Read tests.
     def test_read_user_list(self):
         self.assertEqual(len(self.user_manager.read_users()), 1)
 
+    def test_get_user(self):
+        self.assertEqual(self.user_manager.get_user('test_user').
+                         get_username(), 'test_user')
+
+    def test_get_user_not_existing(self):
+        self.assertIsNone(self.user_manager.get_user('not_existant'))
+
+    def test_has_user(self):
+        self.assertEqual(self.user_manager.has_user('test_user'), True)
+
+    def test_has_user_not_existing(self):
+        self.assertEqual(self.user_manager.has_user('not_existant'), False)
+
+    def test_get_users_keeps_order(self):
+        self.user_manager.create_user('b_user', 'test_password')
+        self.user_manager.create_user('a_user', 'test_password')
+        self.assertEqual([user.get_username() for user in
+                          self.user_manager.get_users()],
+                         ['test_user', 'b_user', 'a_user'])
+
     def test_read_group_null(self):
         self.user_manager.delete_user('test_user')
         self.assertEqual(len(self.user_manager.read_users()), 0)
@@ -48,6 +137,45 @@ class test_groupmanager(unittest.TestCase):
         self.assertEqual(self.user_manager.update_user_username(
             'test_user', 'test_user_new'), True)
 
+    def test_update_username_updates_index(self):
+        self.user_manager.update_user_username('test_user', 'test_user_new')
+        self.assertEqual(self.user_manager.has_user('test_user'), False)
+        self.assertEqual(self.user_manager.has_user('test_user_new'), True)
+
+    def test_update_username_existing(self):
+        self.user_manager.create_user('test_user2', 'test_password')
+        self.assertEqual(self.user_manager.update_user_username(
+            'test_user', 'test_user2'), False)
+
+    def test_update_user_password(self):
+        old_password = self.user_manager.get_user('test_user').get_password()
+        self.assertEqual(self.user_manager.update_user_password(
+            'test_user', 'new_password'), True)
+        self.assertNotEqual(self.user_manager.get_user('test_user').
+                            get_password(), old_password)
+
+    def test_update_user_password_not_existing(self):
+        self.assertEqual(self.user_manager.update_user_password(
+            'not_existant', 'new_password'), False)
+
+    def test_update_passwords(self):
+        user_manager = UserManager()
+        user_manager.create_users([('user' + str(i), 'secret')
+                                   for i in range(5)])
+        with mock.patch.object(user_manager.storage, 'commit',
+                               wraps=user_manager.storage.commit) as commit:
+            results = user_manager.update_passwords(
+                {'user3': 'new3', 'missing_user': 'x', 'user1': 'new1',
+                 'test_user': 'new'}, workers=2, chunk_size=1)
+            self.assertEqual(commit.call_count, 1)
+        self.assertEqual(results, [True, False, True, True])
+        user_manager = UserManager()
+        for username, password in (('user3', 'new3'), ('user1', 'new1'),
+                                   ('test_user', 'new'),
+                                   ('user2', 'secret')):
+            self.assertEqual(user_manager.verify_password(username,
+                                                          password), True)
+
     # Delete tests.
     def test_delete_user(self):
         self.assertEqual(self.user_manager.delete_user(
@@ -56,3 +184,228 @@ class test_groupmanager(unittest.TestCase):
     def test_delete_user_not_existing(self):
         self.assertEqual(self.user_manager.delete_user(
           'not_existant'), False)
+
+    # Batch tests.
+    def test_batch_writes_once(self):
+        with mock.patch.object(self.user_manager, 'write_users_to_yaml') \
+                as write:
+            with self.user_manager.batch():
+                for i in range(5):
+                    self.user_manager.create_user('batch_user' + str(i),
+                                                  'test_password')
+                self.user_manager.update_user_password('test_user', 'new')
+                self.assertEqual(write.call_count, 0)
+            self.assertEqual(write.call_count, 1)
+
+    def test_batch_without_changes_does_not_write(self):
+        with mock.patch.object(self.user_manager, 'write_users_to_yaml') \
+                as write:
+            with self.user_manager.batch():
+                self.user_manager.delete_user('not_existant')
+            self.assertEqual(write.call_count, 0)
+
+    def test_batch_nested_writes_once(self):
+        with mock.patch.object(self.user_manager, 'write_users_to_yaml') \
+                as write:
+            with self.user_manager.batch():
+                with self.user_manager.batch():
+                    self.user_manager.create_user('test_user2',
+                                                  'test_password')
+                self.assertEqual(write.call_count, 0)
+            self.assertEqual(write.call_count, 1)
+
+    def test_batch_rollback(self):
+        password = self.user_manager.get_user('test_user').get_password()
+        with self.assertRaises(RuntimeError):
+            with self.user_manager.batch():
+                self.user_manager.create_user('test_user2', 'test_password')
+                self.user_manager.update_user_password('test_user', 'new')
+                self.user_manager.update_user_username('test_user',
+                                                       'renamed')
+                raise RuntimeError()
+        self.assertEqual([user.get_username() for user in
+                          self.user_manager.get_users()], ['test_user'])
+        self.assertEqual(self.user_manager.get_user('test_user').
+                         get_password(), password)
+        self.assertEqual(self.user_manager.has_user('renamed'), False)
+        self.assertEqual(len(UserManager().get_users()), 1)
+        UserManager().read_users()
+        self.user_manager.update_user_password('test_user', 'new')
+        self.assertEqual(completion.is_marked_stale('users.yaml.names'),
+                         False)
+
+    # Search tests.
+    def test_search_users(self):
+        for username in ('bob', 'alice', 'albert'):
+            self.user_manager.create_user(username, 'test_password')
+        self.assertEqual([user.get_username() for user in
+                          self.user_manager.search_users()],
+                         ['albert', 'alice', 'bob', 'test_user'])
+        self.assertEqual([user.get_username() for user in
+                          self.user_manager.search_users('al', 1)],
+                         ['alice'])
+        self.assertEqual([user.get_username() for user in
+                          self.user_manager.search_users('*b*', 0, 2)],
+                         ['albert', 'bob'])
+
+    def test_search_users_follows_changes(self):
+        self.assertEqual(len(self.user_manager.search_users()), 1)
+        self.user_manager.create_user('test_user2', 'test_password')
+        self.user_manager.update_user_username('test_user', 'renamed_user')
+        self.user_manager.delete_user('test_user2')
+        self.assertEqual([user.get_username() for user in
+                          self.user_manager.search_users()],
+                         ['renamed_user'])
+        UserManager().create_user('other_user', 'test_password')
+        self.user_manager.reload()
+        self.assertEqual([user.get_username() for user in
+                          self.user_manager.search_users()],
+                         ['other_user', 'renamed_user'])
+
+    # Verify tests.
+    def test_verify_password(self):
+        self.assertEqual(self.user_manager.verify_password(
+            'test_user', 'test_password'), True)
+        self.assertEqual(self.user_manager.verify_password(
+            'test_user', 'wrong_password'), False)
+        self.assertEqual(self.user_manager.verify_password(
+            'missing_user', 'test_password'), False)
+
+    def test_verify_password_cached(self):
+        user_manager = UserManager(verify_cache=VerificationCache())
+        for _ in range(3):
+            self.assertEqual(user_manager.verify_password(
+                'test_user', 'test_password'), True)
+        self.assertEqual(user_manager.verify_password(
+            'test_user', 'wrong_password'), False)
+        self.assertEqual(user_manager.verify_cache.hits, 2)
+        self.assertEqual(user_manager.verify_cache.misses, 2)
+
+    def test_verify_password_cache_invalidated(self):
+        user_manager = UserManager(verify_cache=VerificationCache())
+        user_manager.verify_password('test_user', 'test_password')
+        user_manager.update_user_password('test_user', 'new_password')
+        self.assertEqual(len(user_manager.verify_cache), 0)
+        self.assertEqual(user_manager.verify_password(
+            'test_user', 'test_password'), False)
+        user_manager.verify_password('test_user', 'new_password')
+        user_manager.update_user_username('test_user', 'renamed_user')
+        self.assertEqual(len(user_manager.verify_cache), 0)
+        user_manager.verify_password('renamed_user', 'new_password')
+        user_manager.delete_user('renamed_user')
+        self.assertEqual(len(user_manager.verify_cache), 0)
+        self.assertEqual(user_manager.verify_password(
+            'renamed_user', 'new_password'), False)
+
+    def test_verify_password_cache_invalidated_on_reload(self):
+        user_manager = UserManager(verify_cache=VerificationCache())
+        user_manager.verify_password('test_user', 'test_password')
+        UserManager().update_user_password('test_user', 'new_password')
+        user_manager.reload()
+        self.assertEqual(user_manager.verify_password(
+            'test_user', 'test_password'), False)
+        self.assertEqual(user_manager.verify_cache.hits, 0)
+
+    def test_verify_password_rehashes_outdated_hash(self):
+        hasher = PasswordHasher(MIN_ITERATIONS * 2)
+        user_manager = UserManager(hasher=hasher)
+        self.assertEqual(user_manager.verify_password(
+            'test_user', 'test_password'), True)
+        self.assertEqual(user_manager.has_rehashes(), True)
+        self.assertEqual(hasher.needs_rehash(
+            UserManager().get_user('test_user').get_password()), True)
+        self.assertEqual(user_manager.flush_rehashes(), True)
+        self.assertEqual(user_manager.flush_rehashes(), False)
+        password = UserManager().get_user('test_user').get_password()
+        self.assertEqual(hasher.needs_rehash(password), False)
+        self.assertEqual(UserManager().verify_password(
+            'test_user', 'test_password'), True)
+
+    def test_verify_password_rehashes_sha512(self):
+        self.user_manager.storage.write({'test_user': {
+            'password': hashlib.sha512(b'test_password').hexdigest()}})
+        user_manager = UserManager()
+        with mock.patch.object(user_manager.storage, 'commit',
+                               wraps=user_manager.storage.commit) as commit:
+            for _ in range(3):
+                self.assertEqual(user_manager.verify_password(
+                    'test_user', 'test_password'), True)
+            self.assertEqual(commit.call_count, 0)
+            user_manager.flush_rehashes()
+            self.assertEqual(commit.call_count, 1)
+        self.assertEqual(UserManager().get_user('test_user').get_password().
+                         startswith('pbkdf2_sha256$'), True)
+
+    def test_rehash_saved_with_next_change(self):
+        user_manager = UserManager(hasher=PasswordHasher(MIN_ITERATIONS * 2))
+        user_manager.verify_password('test_user', 'test_password')
+        user_manager.create_user('test_user2', 'test_password')
+        self.assertEqual(user_manager.has_rehashes(), False)
+        self.assertEqual(UserManager().get_user('test_user').get_password(),
+                         user_manager.get_user('test_user').get_password())
+
+    def test_rehash_does_not_undo_password_change(self):
+        user_manager = UserManager(hasher=PasswordHasher(MIN_ITERATIONS * 2))
+        user_manager.verify_password('test_user', 'test_password')
+        UserManager().update_user_password('test_user', 'new_password')
+        user_manager.flush_rehashes()
+        self.assertEqual(UserManager().verify_password(
+            'test_user', 'new_password'), True)
+        self.assertEqual(user_manager.verify_password(
+            'test_user', 'new_password'), True)
+
+    def test_rehash_keeps_password_changed_while_hashing(self):
+        user_manager = UserManager(hasher=PasswordHasher(MIN_ITERATIONS * 2))
+        hash_password = user_manager.hasher.hash
+
+        def change_password(password):
+            # Another thread changes the password while this one hashes.
+            user_manager.hasher.hash = hash_password
+            user_manager.update_user_password('test_user', 'new_password')
+            return hash_password(password)
+
+        user_manager.hasher.hash = change_password
+        self.assertEqual(user_manager.verify_password(
+            'test_user', 'test_password'), True)
+        self.assertEqual(user_manager.has_rehashes(), False)
+        self.assertEqual(user_manager.verify_password(
+            'test_user', 'new_password'), True)
+        self.assertEqual(UserManager().verify_password(
+            'test_user', 'new_password'), True)
+
+    # Reload tests.
+    def test_reload_not_loaded(self):
+        self.assertEqual(UserManager().reload(), set())
+
+    def test_reload_applies_differences(self):
+        user_manager = UserManager()
+        user_manager.create_user('kept_user', 'test_password')
+        user = user_manager.get_user('test_user')
+        kept_user = user_manager.get_user('kept_user')
+        other_manager = UserManager()
+        other_manager.update_user_password('test_user', 'new_password')
+        other_manager.create_user('new_user', 'test_password')
+        other_manager.delete_user('kept_user')
+        other_manager.create_user('kept_user', 'test_password')
+        other_manager.update_user_username('new_user', 'renamed_user')
+        self.assertEqual(user_manager.reload(),
+                         {'test_user', 'renamed_user', 'kept_user'})
+        self.assertIs(user_manager.get_user('test_user'), user)
+        self.assertIs(user_manager.get_user('kept_user'), kept_user)
+        self.assertEqual(user.get_password(),
+                         other_manager.get_user('test_user').get_password())
+        self.assertEqual([user.get_username() for user in user_manager.users],
+                         ['test_user', 'renamed_user', 'kept_user'])
+
+    def test_reload_removes_users(self):
+        user_manager = UserManager()
+        self.assertEqual(user_manager.has_user('test_user'), True)
+        UserManager().delete_user('test_user')
+        self.assertEqual(user_manager.reload(), {'test_user'})
+        self.assertEqual(user_manager.has_user('test_user'), False)
+        self.assertEqual(user_manager.users, [])
+
+    def test_reload_in_batch(self):
+        with self.user_manager.batch():
+            with self.assertRaises(RuntimeError):
+                self.user_manager.reload()
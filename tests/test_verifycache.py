@@ -0,0 +1,61 @@
+import unittest
+from LoginComponent.verifycache import VerificationCache
+
+
+class test_verifycache(unittest.TestCase):
+    """Unit tests for the cache of successful password checks"""
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = VerificationCache(size=2, ttl=10.0,
+                                       clock=lambda: self.now)
+
+    def test_check(self):
+        self.assertEqual(self.cache.check('test_user', 'secret', 'hash'),
+                         False)
+        self.cache.add('test_user', 'secret', 'hash')
+        self.assertEqual(self.cache.check('test_user', 'secret', 'hash'),
+                         True)
+        self.assertEqual(self.cache.check('test_user', 'wrong', 'hash'),
+                         False)
+        self.assertEqual(self.cache.check('test_user', 'secret',
+                                          'new_hash'), False)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+
+    def test_password_not_kept(self):
+        self.cache.add('test_user', 'secret', 'hash')
+        for entry in self.cache._entries.values():
+            self.assertNotIn('secret', entry)
+            self.assertNotIn(b'secret', entry[0])
+
+    def test_ttl(self):
+        self.cache.add('test_user', 'secret', 'hash')
+        self.now = 9.0
+        self.assertEqual(self.cache.check('test_user', 'secret', 'hash'),
+                         True)
+        self.now = 10.0
+        self.assertEqual(self.cache.check('test_user', 'secret', 'hash'),
+                         False)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_dropped(self):
+        self.cache.add('a', 'secret', 'hash')
+        self.cache.add('b', 'secret', 'hash')
+        self.cache.check('a', 'secret', 'hash')
+        self.cache.add('c', 'secret', 'hash')
+        self.assertEqual(self.cache.check('a', 'secret', 'hash'), True)
+        self.assertEqual(self.cache.check('b', 'secret', 'hash'), False)
+        self.assertEqual(self.cache.check('c', 'secret', 'hash'), True)
+
+    def test_invalidate(self):
+        self.cache.add('a', 'secret', 'hash')
+        self.cache.add('b', 'secret', 'hash')
+        self.cache.invalidate('a')
+        self.assertEqual(self.cache.check('a', 'secret', 'hash'), False)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_disabled(self):
+        cache = VerificationCache(size=0)
+        cache.add('a', 'secret', 'hash')
+        self.assertEqual(cache.check('a', 'secret', 'hash'), False)
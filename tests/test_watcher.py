@@ -0,0 +1,74 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from LoginComponent.watcher import FileWatcher
+
+TIMEOUT = 5
+
+
+class test_watcher(unittest.TestCase):
+    """Unit tests for the file watcher"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'users.yaml')
+        self.changes = []
+        self.changed = threading.Event()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def callback(self, paths):
+        self.changes.append(paths)
+        self.changed.set()
+
+    def write(self, content):
+        with open(self.path, 'w') as outfile:
+            outfile.write(content)
+
+    def test_check(self):
+        watcher = FileWatcher([self.path], self.callback)
+        self.assertEqual(watcher.check(), [])
+        self.write('test_user: {}\n')
+        self.assertEqual(watcher.check(), [self.path])
+        self.assertEqual(watcher.check(), [])
+        os.remove(self.path)
+        self.assertEqual(watcher.check(), [self.path])
+        self.assertEqual(self.changes, [[self.path], [self.path]])
+
+    def test_check_touched(self):
+        watcher = FileWatcher([self.path], self.callback)
+        self.assertEqual(watcher.check([self.path]), [self.path])
+
+    def watch(self, use_inotify):
+        watcher = FileWatcher([self.path], self.callback, interval=0.01,
+                              use_inotify=use_inotify)
+        watcher.start()
+        try:
+            self.write('test_user: {}\n')
+            self.assertEqual(self.changed.wait(TIMEOUT), True)
+        finally:
+            watcher.stop()
+        self.assertEqual(self.changes[0], [self.path])
+        return watcher
+
+    def test_polling(self):
+        self.assertEqual(self.watch(False).uses_inotify(), False)
+
+    def test_inotify(self):
+        watcher = FileWatcher([self.path], self.callback)
+        if not watcher.uses_inotify():
+            self.skipTest('inotify is not available')
+        self.watch(True)
+
+    def test_ignores_other_files(self):
+        watcher = FileWatcher([self.path], self.callback, interval=0.01)
+        watcher.start()
+        try:
+            with open(os.path.join(self.directory, 'other.yaml'), 'w'):
+                pass
+            self.assertEqual(self.changed.wait(0.2), False)
+        finally:
+            watcher.stop()
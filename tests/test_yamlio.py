@@ -0,0 +1,90 @@
+import unittest
+import os
+from unittest import mock
+import yaml
+from LoginComponent import yamlio
+
+
+class test_yamlio(unittest.TestCase):
+    """Unit tests for the yaml reading and writing helpers"""
+
+    def setUp(self):
+        self.data = {'test_user': {'password': 'secret'},
+                     'test_group': {'users': ['a', 'b'], 'groups': []}}
+
+    def tearDown(self):
+        for path in ('test.yaml', 'test.yaml.cache'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_write_and_read_yaml_file(self):
+        yamlio.write_yaml_file('test.yaml', self.data)
+        self.assertEqual(yamlio.read_yaml_file('test.yaml'), self.data)
+
+    def test_read_yaml_file_not_existing(self):
+        self.assertIsNone(yamlio.read_yaml_file('test.yaml'))
+
+    def test_dump_yaml_block_style(self):
+        self.assertEqual(yamlio.dump_yaml({'a': ['b']}), 'a:\n- b\n')
+
+    def test_pure_python_matches_default(self):
+        dumped = yamlio.dump_yaml(self.data, yaml.SafeDumper)
+        self.assertEqual(dumped, yamlio.dump_yaml(self.data))
+        self.assertEqual(yamlio.load_yaml(dumped, yaml.SafeLoader),
+                         yamlio.load_yaml(dumped))
+
+    def test_load_yaml_is_safe(self):
+        with self.assertRaises(yaml.YAMLError):
+            yamlio.load_yaml('!!python/object/apply:os.getcwd []')
+
+    def test_write_yaml_file_creates_cache(self):
+        yamlio.write_yaml_file('test.yaml', self.data)
+        self.assertEqual(os.path.exists('test.yaml.cache'), True)
+        with mock.patch.object(yamlio, 'load_yaml') as load_yaml:
+            self.assertEqual(yamlio.read_yaml_file('test.yaml'), self.data)
+            self.assertEqual(load_yaml.call_count, 0)
+
+    def test_read_yaml_file_creates_cache(self):
+        with open('test.yaml', 'w') as outfile:
+            outfile.write(yamlio.dump_yaml(self.data))
+        self.assertEqual(yamlio.read_yaml_file('test.yaml'), self.data)
+        with mock.patch.object(yamlio, 'load_yaml') as load_yaml:
+            self.assertEqual(yamlio.read_yaml_file('test.yaml'), self.data)
+            self.assertEqual(load_yaml.call_count, 0)
+
+    def test_stale_cache_is_ignored(self):
+        yamlio.write_yaml_file('test.yaml', self.data)
+        stat = os.stat('test.yaml')
+        with open('test.yaml', 'w') as outfile:
+            outfile.write(yamlio.dump_yaml({'test_user': {'password': 'x'}}))
+        os.utime('test.yaml', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(yamlio.read_yaml_file('test.yaml'),
+                         {'test_user': {'password': 'x'}})
+
+    def test_damaged_cache_is_ignored(self):
+        yamlio.write_yaml_file('test.yaml', self.data)
+        with open('test.yaml.cache', 'wb') as outfile:
+            outfile.write(b'damaged')
+        self.assertEqual(yamlio.read_yaml_file('test.yaml'), self.data)
+
+    def test_read_yaml_file_without_cache(self):
+        yamlio.write_yaml_file('test.yaml', self.data, cache=False)
+        self.assertEqual(yamlio.read_yaml_file('test.yaml', cache=False),
+                         self.data)
+        self.assertEqual(os.path.exists('test.yaml.cache'), False)
+
+    def test_failed_write_keeps_file(self):
+        yamlio.write_yaml_file('test.yaml', self.data)
+        with mock.patch('os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                yamlio.write_yaml_file('test.yaml', {'other': 'data'})
+        self.assertEqual(yamlio.read_yaml_file('test.yaml', cache=False),
+                         self.data)
+        self.assertEqual([name for name in os.listdir('.')
+                          if name.endswith('.tmp')], [])
+
+    def test_write_keeps_file_mode(self):
+        yamlio.write_yaml_file('test.yaml', self.data)
+        os.chmod('test.yaml', 0o640)
+        yamlio.write_yaml_file('test.yaml', {'other': 'data'})
+        self.assertEqual(os.stat('test.yaml').st_mode & 0o777, 0o640)